@@ -0,0 +1,179 @@
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
+
+from aiohttp import web
+from dotenv import load_dotenv
+from opensearchpy import AIOHttpConnection, AsyncOpenSearch
+from prometheus_client import CONTENT_TYPE_LATEST
+
+from bootstrap import check_config
+from config import Config
+from core.controller.async_search import AsyncSearchController
+from core.service.async_opensearch_service import AsyncOpensearchService
+from core.service.llama_index_service import LlamaIndexService
+from core.service.search_cache import InMemorySearchCache
+from core.usecase.vectorizer import AsyncVectorizerUsecase, VectorizerUsecase
+from core.utils import metrics, startup
+from core.utils.logger import logger
+
+load_dotenv()
+
+# Async serving mode for the search routes: the OpenSearch round trips are awaited on the
+# event loop and only the query embedding runs on threads, so concurrent searches are not
+# capped by a thread count. Run with
+#   gunicorn async_main:build_app --worker-class aiohttp.GunicornWebWorker
+# or `python async_main.py`. Vectorization stays on the sync app in main.py.
+
+CONTROLLER = web.AppKey("controller", AsyncSearchController)
+SERVICES = web.AppKey("services", dict)
+
+
+def build_app() -> web.Application:
+    """
+    Builds the async search app, the models are warmed up and the clients closed by its
+    startup and cleanup hooks.
+
+    Returns:
+        web.Application: the aiohttp application
+    """
+    cfg = Config()
+    check_config(cfg)
+    timer = startup.StartupTimer(logger)
+
+    with timer.stage("opensearch_client"):
+        opensearch_client = AsyncOpenSearch(
+            hosts=[{"host": cfg.OPENSEARCH_HOST, "port": int(cfg.OPENSEARCH_PORT)}],
+            http_auth=(cfg.OPENSEARCH_USER, cfg.OPENSEARCH_PASS),
+            use_ssl=True,
+            verify_certs=True,
+            connection_class=AIOHttpConnection,
+            maxsize=cfg.ASYNC_OPENSEARCH_POOL_SIZE,
+            timeout=cfg.OPENSEARCH_SEARCH_TIMEOUT,
+        )
+    opensearch_service = AsyncOpensearchService(
+        opensearch_client, cfg.OPENSEARCH_INDEX, logger
+    )
+
+    # only used to embed queries, documents are indexed by the sync app
+    llama_service = LlamaIndexService(
+        None,
+        logger,
+        query_cache_size=cfg.QUERY_CACHE_SIZE,
+        query_cache_ttl=cfg.QUERY_CACHE_TTL,
+        embed_dispatch_max_batch=cfg.EMBED_DISPATCH_MAX_BATCH,
+        embed_dispatch_max_wait_ms=cfg.EMBED_DISPATCH_MAX_WAIT_MS,
+    )
+    if cfg.PRELOAD_MODELS:
+        with timer.stage("load_models"):
+            llama_service.load_models()
+    search_cache = None
+    if cfg.SEARCH_CACHE_SIZE > 0:
+        search_cache = InMemorySearchCache(
+            logger, maxsize=cfg.SEARCH_CACHE_SIZE, ttl=cfg.SEARCH_CACHE_TTL
+        )
+    # plans, fuses, rescores and caches the searches, it sends no request itself
+    search_usecase = VectorizerUsecase(
+        None,
+        llama_service,
+        None,
+        logger,
+        search_mode=cfg.SEARCH_MODE,
+        ef_search=cfg.KNN_QUERY_EF_SEARCH,
+        search_cache=search_cache,
+        vector_data_type=cfg.KNN_DATA_TYPE,
+        rescore_oversample=cfg.RESCORE_OVERSAMPLE,
+        hybrid_fusion=cfg.HYBRID_FUSION,
+        hybrid_rrf_k=cfg.HYBRID_RRF_K,
+        hybrid_lexical_weight=cfg.HYBRID_LEXICAL_WEIGHT,
+        hybrid_vector_weight=cfg.HYBRID_VECTOR_WEIGHT,
+    )
+    executor = ThreadPoolExecutor(
+        max_workers=cfg.ASYNC_EMBED_WORKERS, thread_name_prefix="embed"
+    )
+    usecase = AsyncVectorizerUsecase(
+        search_usecase, opensearch_service, logger, executor
+    )
+
+    app = web.Application()
+    app[CONTROLLER] = AsyncSearchController(
+        usecase, logger, max_batch_queries=cfg.SEARCH_BATCH_MAX_QUERIES
+    )
+    app[SERVICES] = {
+        "timer": timer,
+        "llama_service": llama_service,
+        "opensearch_service": opensearch_service,
+        "executor": executor,
+    }
+    app.router.add_post("/v1/api/search", search)
+    app.router.add_post("/v1/api/search/batch", search_batch)
+    app.router.add_get("/health", health)
+    app.router.add_get("/ready", ready)
+    app.router.add_get("/metrics", prometheus_metrics)
+    app.on_startup.append(warm_up)
+    app.on_cleanup.append(close)
+    return app
+
+
+async def warm_up(app: web.Application) -> None:
+    """
+    Runs a first inference on the executor, logs the startup timings and marks the service as ready.
+    """
+    services = app[SERVICES]
+    timer = services["timer"]
+    with timer.stage("warm_up"):
+        await asyncio.get_running_loop().run_in_executor(
+            services["executor"], services["llama_service"].warm_up
+        )
+    timer.log_summary()
+    startup.ready.set()
+
+
+async def close(app: web.Application) -> None:
+    """
+    Closes the OpenSearch connections and stops the embedding threads.
+    """
+    services = app[SERVICES]
+    await services["opensearch_service"].close()
+    services["executor"].shutdown(wait=False)
+
+
+async def search(request: web.Request) -> web.Response:
+    try:
+        request_data = await request.json()
+    except Exception as e:
+        return web.json_response(
+            {"error": "Failed to decode JSON object: " + str(e)}, status=400
+        )
+    body, status = await request.app[CONTROLLER].search(request_data)
+    return web.json_response(body, status=status)
+
+
+async def search_batch(request: web.Request) -> web.Response:
+    try:
+        request_data = await request.json()
+    except Exception as e:
+        return web.json_response(
+            {"error": "Failed to decode JSON object: " + str(e)}, status=400
+        )
+    body, status = await request.app[CONTROLLER].search_batch(request_data)
+    return web.json_response(body, status=status)
+
+
+async def health(request: web.Request) -> web.Response:
+    return web.json_response({"status": "healthy"}, status=200)
+
+
+async def ready(request: web.Request) -> web.Response:
+    if not startup.ready.is_set():
+        return web.json_response({"status": "starting"}, status=503)
+    return web.json_response({"status": "ready"}, status=200)
+
+
+async def prometheus_metrics(request: web.Request) -> web.Response:
+    return web.Response(
+        body=metrics.render(), headers={"Content-Type": CONTENT_TYPE_LATEST}
+    )
+
+
+if __name__ == "__main__":
+    web.run_app(build_app(), port=8080)
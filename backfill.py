@@ -0,0 +1,316 @@
+"""
+Backfills the objects of a bucket, or of a prefix of it, through the same vectorize and index
+path as `POST /v1/api/vectorize`, without going through the HTTP API.
+
+Objects are listed page by page and vectorized by a pool of worker threads, with at most twice
+as many objects in flight as workers. Progress is checkpointed to a JSON file after every
+object, so running the same command again after an interruption resumes where the previous run
+stopped and retries the objects that failed. Throughput is logged as the run goes. Set S3_URL to
+run against localstack, e.g. S3_URL=http://localhost:4566.
+
+    python backfill.py clone-ingestion-messages --prefix uuid-val/ --workers 8
+"""
+
+import argparse
+import json
+import os
+import re
+import sys
+import time
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from itertools import chain
+from logging import Logger
+
+from dotenv import load_dotenv
+
+from bootstrap import build_usecase
+from config import Config
+from core.abstracts.services import AbstractS3Service
+from core.abstracts.usescases import AbstractVectorizeUsecase
+from core.utils import startup
+from core.utils.logger import logger
+
+
+class Checkpoint:
+    """
+    Progress of a backfill, saved as JSON. Keys are listed in order, so everything up to the
+    `watermark` key is done and only the keys completed past it, while an earlier one was still
+    in flight, are kept individually.
+    """
+
+    def __init__(self, path: str, bucket_name: str, prefix: str):
+        """
+        Initialize Checkpoint, loading the progress saved by a previous run of the same backfill.
+
+        Args:
+            path (str): Checkpoint file, created on the first save.
+            bucket_name (str): Name of the S3 bucket.
+            prefix (str): Prefix of the backfilled keys.
+
+        Raises:
+            ValueError: If the file holds the checkpoint of another bucket or prefix.
+        """
+        self.path = path
+        self.bucket_name = bucket_name
+        self.prefix = prefix
+        self.watermark = None
+        self.done = set()
+        self.failed = {}
+        self.objects = 0
+        self.bytes = 0
+        # listed keys past the watermark, in order, with whether they are done
+        self._listed = {}
+        if os.path.exists(path):
+            with open(path) as checkpoint_file:
+                state = json.load(checkpoint_file)
+            if (state["bucket"], state["prefix"]) != (bucket_name, prefix):
+                raise ValueError(
+                    f"{path} is the checkpoint of s3://{state['bucket']}/{state['prefix']}"
+                )
+            self.watermark = state["watermark"]
+            self.done = set(state["done"])
+            self.failed = state["failed"]
+            self.objects = state["objects"]
+            self.bytes = state["bytes"]
+
+    def retries(self) -> list:
+        """
+        Returns the objects that failed in previous runs, to process them again.
+        """
+        return [
+            {"Key": key, "Size": failure["size"], "retry": True}
+            for key, failure in self.failed.items()
+        ]
+
+    def start(self, s3_object: dict) -> None:
+        """
+        Records that a listed object is in flight.
+        """
+        if not s3_object.get("retry"):
+            self._listed[s3_object["Key"]] = False
+
+    def finish(self, s3_object: dict, error: str = None) -> None:
+        """
+        Records the outcome of an object and moves the watermark past the leading done keys.
+        """
+        key = s3_object["Key"]
+        if error is None:
+            self.failed.pop(key, None)
+            self.objects += 1
+            self.bytes += s3_object["Size"]
+        else:
+            self.failed[key] = {"size": s3_object["Size"], "error": error}
+        if s3_object.get("retry"):
+            return
+        self._listed[key] = True
+        self.done.add(key)
+        # dicts keep insertion order, which is the listing order
+        for listed_key, finished in list(self._listed.items()):
+            if not finished:
+                break
+            del self._listed[listed_key]
+            self.watermark = listed_key
+        if self.watermark is not None:
+            self.done = {
+                done_key for done_key in self.done if done_key > self.watermark
+            }
+
+    def save(self) -> None:
+        """
+        Atomically writes the checkpoint file.
+        """
+        state = {
+            "bucket": self.bucket_name,
+            "prefix": self.prefix,
+            "watermark": self.watermark,
+            "done": sorted(self.done),
+            "failed": self.failed,
+            "objects": self.objects,
+            "bytes": self.bytes,
+        }
+        tmp_path = f"{self.path}.tmp"
+        with open(tmp_path, "w") as checkpoint_file:
+            json.dump(state, checkpoint_file)
+        os.replace(tmp_path, self.path)
+
+
+class ThroughputReporter:
+    """
+    Logs the objects and bytes processed per second, at most once per interval.
+    """
+
+    def __init__(self, logger: Logger, interval: float = 10):
+        """
+        Initialize ThroughputReporter.
+
+        Args:
+            logger (Logger): Logger instance.
+            interval (float, optional): Seconds between two reports. Defaults to 10.
+        """
+        self.logger = logger
+        self.interval = interval
+        self.objects = 0
+        self.failed = 0
+        self.bytes = 0
+        self.started_at = time.perf_counter()
+        self._reported_at = self.started_at
+
+    def add(self, size: int, failed: bool) -> None:
+        """
+        Counts a processed object and reports when the interval has elapsed.
+        """
+        self.objects += 1
+        self.failed += int(failed)
+        self.bytes += size
+        if time.perf_counter() - self._reported_at >= self.interval:
+            self.report()
+
+    def report(self) -> dict:
+        """
+        Logs and returns the throughput since the start of the run.
+        """
+        self._reported_at = time.perf_counter()
+        elapsed = self._reported_at - self.started_at
+        summary = {
+            "objects": self.objects,
+            "failed": self.failed,
+            "bytes": self.bytes,
+            "seconds": round(elapsed, 3),
+            "objects_per_second": round(self.objects / elapsed, 3) if elapsed else 0,
+            "mb_per_second": round(self.bytes / 1e6 / elapsed, 3) if elapsed else 0,
+        }
+        self.logger.info(
+            f"Backfilled {self.objects} objects ({self.failed} failed) in {elapsed:.1f}s: "
+            f"{summary['objects_per_second']} objects/s, {summary['mb_per_second']} MB/s"
+        )
+        return summary
+
+
+def backfill(
+    usecase: AbstractVectorizeUsecase,
+    s3_service: AbstractS3Service,
+    bucket_name: str,
+    prefix: str,
+    checkpoint: Checkpoint,
+    logger: Logger,
+    workers: int = 4,
+    page_size: int = 1000,
+    report_interval: float = 10,
+) -> dict:
+    """
+    Vectorizes and indexes every object of a bucket prefix not done yet according to the checkpoint.
+
+    Args:
+        usecase (AbstractVectorizeUsecase): Usecase vectorizing and indexing the objects.
+        s3_service (AbstractS3Service): Service listing the bucket.
+        bucket_name (str): Name of the S3 bucket.
+        prefix (str): Prefix of the backfilled keys.
+        checkpoint (Checkpoint): Progress of the backfill, saved after every object.
+        logger (Logger): Logger instance.
+        workers (int, optional): Objects vectorized concurrently. Defaults to 4.
+        page_size (int, optional): Keys listed per request. Defaults to 1000.
+        report_interval (float, optional): Seconds between two throughput reports. Defaults to 10.
+
+    Returns:
+        dict: The throughput summary of the run.
+    """
+    listed = s3_service.list_objects(
+        bucket_name, prefix, start_after=checkpoint.watermark, page_size=page_size
+    )
+    s3_objects = chain(checkpoint.retries(), listed)
+    reporter = ThroughputReporter(logger, report_interval)
+    in_flight = {}
+
+    def collect(futures: set) -> None:
+        for future in futures:
+            s3_object = in_flight.pop(future)
+            error = None
+            try:
+                future.result()
+            except Exception as e:
+                error = str(e)
+                logger.error(f"Failed to backfill {s3_object['Key']}: {error}")
+            checkpoint.finish(s3_object, error)
+            checkpoint.save()
+            reporter.add(s3_object["Size"], error is not None)
+
+    executor = ThreadPoolExecutor(max_workers=workers)
+    try:
+        for s3_object in s3_objects:
+            if s3_object["Key"] in checkpoint.done and not s3_object.get("retry"):
+                continue
+            # bounds the objects in flight, and the listing, to what the workers can take
+            while len(in_flight) >= workers * 2:
+                collect(wait(in_flight, return_when=FIRST_COMPLETED).done)
+            checkpoint.start(s3_object)
+            future = executor.submit(
+                usecase.vectorize_and_index, bucket_name, s3_object["Key"]
+            )
+            in_flight[future] = s3_object
+        while in_flight:
+            collect(wait(in_flight, return_when=FIRST_COMPLETED).done)
+    finally:
+        # objects still in flight when interrupted are processed again on the next run
+        executor.shutdown(wait=False, cancel_futures=True)
+    return reporter.report()
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("bucket", help="bucket to backfill")
+    parser.add_argument("--prefix", default="", help="only backfill the keys under it")
+    parser.add_argument(
+        "--workers",
+        type=int,
+        help="objects vectorized concurrently, defaults to VECTORIZE_MAX_WORKERS",
+    )
+    parser.add_argument(
+        "--checkpoint",
+        help="checkpoint file, defaults to backfill-<bucket>-<prefix>.json",
+    )
+    parser.add_argument("--page-size", type=int, default=1000)
+    parser.add_argument(
+        "--report-interval",
+        type=float,
+        default=10,
+        help="seconds between two throughput reports",
+    )
+    args = parser.parse_args()
+
+    load_dotenv()
+    cfg = Config()
+    checkpoint_path = args.checkpoint or (
+        "backfill-"
+        + re.sub(r"[^A-Za-z0-9_.-]", "_", f"{args.bucket}-{args.prefix}".rstrip("-"))
+        + ".json"
+    )
+    checkpoint = Checkpoint(checkpoint_path, args.bucket, args.prefix)
+    if checkpoint.watermark or checkpoint.failed:
+        logger.info(
+            f"Resuming from {checkpoint_path}: {checkpoint.objects} objects done, "
+            f"{len(checkpoint.failed)} to retry"
+        )
+
+    timer = startup.StartupTimer(logger)
+    usecase, _, _ = build_usecase(cfg, timer)
+    timer.log_summary()
+
+    summary = backfill(
+        usecase,
+        usecase.s3_service,
+        args.bucket,
+        args.prefix,
+        checkpoint,
+        logger,
+        workers=args.workers or cfg.VECTORIZE_MAX_WORKERS,
+        page_size=args.page_size,
+        report_interval=args.report_interval,
+    )
+    summary["failed_objects"] = checkpoint.failed
+    print(json.dumps(summary, indent=2))
+    if checkpoint.failed:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
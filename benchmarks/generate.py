@@ -0,0 +1,112 @@
+"""
+Synthetic Slack message files in the shape of localstack/2023-03-30.json.
+
+    python -m benchmarks.generate --messages 100000 --output /tmp/messages.json
+"""
+
+import argparse
+import json
+import random
+from datetime import datetime, timedelta, timezone
+from typing import IO, Iterator
+
+WORDS = (
+    "deploy release pipeline staging production rollback incident alert dashboard metrics "
+    "latency throughput database migration schema index query cache cluster node shard "
+    "replica backup restore salesforce integration api endpoint webhook token auth login "
+    "customer ticket escalation priority sprint planning retro standup demo review merge "
+    "branch commit build test coverage flaky fix bug feature request design mockup "
+    "kudos thanks welcome onboarding meeting calendar lunch holiday offsite team project "
+    "budget invoice contract vendor roadmap quarter goal okr launch announcement update"
+).split()
+FIRST_NAMES = (
+    "Ana Luis Fer Sofia Diego Carla Jorge Elena Pablo Lucia Mateo Valeria".split()
+)
+LAST_NAMES = (
+    "Garcia Lopez Martinez Sanchez Perez Gomez Diaz Torres Ramirez Flores".split()
+)
+# share of messages repeated verbatim, like join notices and deleted messages
+REPEATED_TEXTS = ("This message was deleted.", "has joined the channel")
+REPEATED_RATE = 0.03
+# files of each size preset, from a smoke run to a large backfill
+SIZES = {"small": 1_000, "medium": 20_000, "large": 200_000, "xlarge": 1_000_000}
+
+
+def generate_messages(
+    count: int, seed: int = 0, users: int = 50, start: datetime = None
+) -> Iterator[dict]:
+    """
+    Generates messages with the text, user_id, user_name and created_at of exported Slack
+    messages, in chronological order
+    Args:
+        count (int): number of messages
+        seed (int, optional): random seed, the same seed yields the same messages. Defaults to 0.
+        users (int, optional): number of distinct authors. Defaults to 50.
+        start (datetime, optional): timestamp of the first message. Defaults to 2023-01-01 UTC.
+
+    Returns:
+        Iterator[dict]: the messages
+    """
+    rng = random.Random(seed)
+    authors = [
+        (
+            f"U{rng.randrange(16**10):010X}",
+            f"{rng.choice(FIRST_NAMES)} {rng.choice(LAST_NAMES)}",
+        )
+        for _ in range(users)
+    ]
+    created_at = start or datetime(2023, 1, 1, tzinfo=timezone.utc)
+    for _ in range(count):
+        user_id, user_name = rng.choice(authors)
+        created_at += timedelta(seconds=rng.randint(1, 600))
+        if rng.random() < REPEATED_RATE:
+            text = rng.choice(REPEATED_TEXTS)
+        else:
+            length = min(80, max(3, int(rng.lognormvariate(2.3, 0.6))))
+            words = rng.choices(WORDS, k=length)
+            if rng.random() < 0.1:
+                words.insert(rng.randrange(length), f"TICKET-{rng.randint(1, 9999)}")
+            text = " ".join(words)
+            text = text[0].upper() + text[1:] + "."
+        yield {
+            "text": text,
+            "user_id": user_id,
+            "user_name": user_name,
+            "created_at": created_at.strftime("%Y-%m-%dT%H:%M:%SZ"),
+        }
+
+
+def write_messages(messages: Iterator[dict], output: IO) -> int:
+    """
+    Writes messages as a JSON array, one message at a time
+    Args:
+        messages (Iterator[dict]): the messages
+        output (IO): text file to write to
+
+    Returns:
+        int: the number of written messages
+    """
+    count = 0
+    output.write("[")
+    for message in messages:
+        output.write(",\n  " if count else "\n  ")
+        output.write(json.dumps(message, ensure_ascii=False))
+        count += 1
+    output.write("\n]\n")
+    return count
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--messages", type=int, default=SIZES["small"])
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--users", type=int, default=50)
+    parser.add_argument("--output", required=True)
+    args = parser.parse_args()
+
+    with open(args.output, "w", encoding="utf-8") as output:
+        write_messages(generate_messages(args.messages, args.seed, args.users), output)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,182 @@
+"""
+Recall vs memory report of the quantized embedding storage modes.
+
+Compares the exact top-k of full precision embeddings with the results of searching the
+quantized embeddings, with and without rescoring oversampled candidates, and estimates the
+HNSW memory footprint of each mode. Searches are brute force, so the recall loss is the one
+caused by quantization alone, on top of the approximation of the graph. Runs on synthetic unit vectors, or on real embeddings
+with --texts, a file with one text per line embedded with the service model.
+
+    python -m benchmarks.quantization_report --docs 50000 --queries 500 --k 10
+"""
+
+import argparse
+import json
+
+import numpy as np
+
+from core.utils.definitions import KNN_M
+from core.utils.quantization import (
+    DATA_TYPE_BYTE,
+    DATA_TYPE_FLOAT,
+    DATA_TYPE_FLOAT16,
+    candidates_count,
+    quantize_vector,
+)
+
+# bytes per dimension of each knn_vector data type
+BYTES_PER_DIMENSION = {DATA_TYPE_FLOAT: 4, DATA_TYPE_FLOAT16: 2, DATA_TYPE_BYTE: 1}
+OVERSAMPLES = (1, 2, 4, 8)
+
+
+def synthetic_embeddings(count: int, dimension: int, seed: int) -> np.ndarray:
+    """
+    Generates clustered unit vectors, closer to sentence embeddings than uniform noise
+    Args:
+        count (int): number of vectors
+        dimension (int): number of dimensions
+        seed (int): random seed
+
+    Returns:
+        np.ndarray: float32 matrix of unit length rows
+    """
+    rng = np.random.default_rng(seed)
+    centers = rng.standard_normal((max(1, count // 100), dimension))
+    vectors = centers[rng.integers(0, len(centers), count)]
+    vectors = vectors + 0.5 * rng.standard_normal((count, dimension))
+    return _normalize(vectors.astype(np.float32))
+
+
+def model_embeddings(path: str) -> np.ndarray:
+    """
+    Embeds the lines of a text file with the service embedding model
+    Args:
+        path (str): file with one text per line
+
+    Returns:
+        np.ndarray: float32 matrix of unit length rows
+    """
+    from llama_index.embeddings.huggingface import HuggingFaceEmbedding
+
+    from core.service.llama_index_service import EMBED_MODEL_NAME
+
+    with open(path) as texts_file:
+        texts = [line.strip() for line in texts_file if line.strip()]
+    model = HuggingFaceEmbedding(model_name=EMBED_MODEL_NAME)
+    vectors = np.asarray(model.get_text_embedding_batch(texts), dtype=np.float32)
+    return _normalize(vectors)
+
+
+def hnsw_memory(count: int, dimension: int, data_type: str, m: int) -> int:
+    """
+    Estimates the native memory of an HNSW graph, following the OpenSearch sizing guide:
+    1.1 * (bytes per dimension * dimension + 8 * m) bytes per vector
+    Args:
+        count (int): number of vectors
+        dimension (int): number of dimensions
+        data_type (str): the knn_vector data type
+        m (int): number of bidirectional links per graph node
+
+    Returns:
+        int: estimated bytes
+    """
+    return int(1.1 * (BYTES_PER_DIMENSION[data_type] * dimension + 8 * m) * count)
+
+
+def recall(found: np.ndarray, expected: np.ndarray) -> float:
+    """
+    Returns the mean fraction of the expected neighbours that were found
+    """
+    hits = [len(set(f) & set(e)) for f, e in zip(found, expected)]
+    return float(np.sum(hits) / expected.size)
+
+
+def report(docs: np.ndarray, queries: np.ndarray, k: int, m: int) -> dict:
+    """
+    Measures the recall@k of each storage mode against exact full precision search
+    Args:
+        docs (np.ndarray): document embeddings
+        queries (np.ndarray): query embeddings
+        k (int): number of results per query
+        m (int): HNSW m used for the memory estimate
+
+    Returns:
+        dict: recall and memory by data type
+    """
+    expected = _top(queries @ docs.T, k)
+    results = {}
+    for data_type in (DATA_TYPE_FLOAT, DATA_TYPE_FLOAT16, DATA_TYPE_BYTE):
+        quantized_docs = _quantize(docs, data_type)
+        quantized_queries = _quantize(queries, data_type)
+        # cosine similarity of the quantized vectors, as scored by the knn engine
+        scores = _normalize(quantized_queries) @ _normalize(quantized_docs).T
+        entry = {
+            "memory_bytes": hnsw_memory(len(docs), docs.shape[1], data_type, m),
+            "recall": {},
+        }
+        for oversample in OVERSAMPLES:
+            candidates = _top(scores, candidates_count(k, oversample))
+            # rescoring with the full precision embeddings, as VectorizerUsecase does
+            exact = np.einsum("qd,qcd->qc", queries, docs[candidates])
+            order = np.argsort(-exact, axis=1)[:, :k]
+            found = np.take_along_axis(candidates, order, axis=1)
+            entry["recall"][f"oversample_{oversample}"] = recall(found, expected)
+        results[data_type] = entry
+    float_memory = results[DATA_TYPE_FLOAT]["memory_bytes"]
+    for entry in results.values():
+        entry["memory_ratio"] = round(entry["memory_bytes"] / float_memory, 3)
+    return {"docs": len(docs), "queries": len(queries), "k": k, "m": m, **results}
+
+
+def _quantize(vectors: np.ndarray, data_type: str) -> np.ndarray:
+    """
+    Quantizes every row the way LlamaIndexService does at ingestion
+    """
+    return np.asarray(
+        [quantize_vector(vector, data_type) for vector in vectors], dtype=np.float32
+    )
+
+
+def _normalize(vectors: np.ndarray) -> np.ndarray:
+    """
+    Scales every row to unit length
+    """
+    norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+    return vectors / np.where(norms == 0, 1, norms)
+
+
+def _top(scores: np.ndarray, k: int) -> np.ndarray:
+    """
+    Returns the indices of the k highest scores of every row, best first
+    """
+    k = min(k, scores.shape[1])
+    top = np.argpartition(-scores, k - 1, axis=1)[:, :k]
+    order = np.argsort(-np.take_along_axis(scores, top, axis=1), axis=1)
+    return np.take_along_axis(top, order, axis=1)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--docs", type=int, default=20000)
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--k", type=int, default=10)
+    parser.add_argument("--dimension", type=int, default=384)
+    parser.add_argument("--m", type=int, default=KNN_M)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument(
+        "--texts", help="file with one text per line to embed instead of synthetic data"
+    )
+    args = parser.parse_args()
+
+    if args.texts:
+        vectors = model_embeddings(args.texts)
+    else:
+        vectors = synthetic_embeddings(
+            args.queries + args.docs, args.dimension, args.seed
+        )
+    queries, docs = vectors[: args.queries], vectors[args.queries :]
+    print(json.dumps(report(docs, queries, args.k, args.m), indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,300 @@
+"""
+Ingestion and search benchmark of VectorizerUsecase.
+
+Generates synthetic message files, uploads them to an in-memory S3 (moto), ingests them with
+`vectorize_and_index` into the in-process LocalVectorService standing in for OpenSearch, and
+then runs searches. The real spaCy and embedding models are used. Prints a JSON report with
+the time spent in each stage, the ingestion throughput, the search latency percentiles, the
+peak memory of the JSON parsers on a local message file and the peak RSS of the process, so
+that runs can be compared.
+
+    python -m benchmarks.run --size medium --output results.json
+"""
+
+import argparse
+import functools
+import json
+import os
+import platform
+import random
+import resource
+import tempfile
+import time
+import tracemalloc
+
+import boto3
+import numpy as np
+from moto import mock_aws
+
+from benchmarks.generate import SIZES, WORDS, generate_messages, write_messages
+from core.service.llama_index_service import INDEX_MODE_BULK, LlamaIndexService
+from core.service.local_vector_service import LocalVectorService
+from core.service.s3_service import S3Service
+from core.usecase.vectorizer import (
+    SEARCH_MODE_EXACT,
+    SEARCH_MODE_KNN,
+    VectorizerUsecase,
+)
+from core.utils import metrics, startup
+from core.utils.json_stream import iter_json_array
+from core.utils.logger import logger
+
+BUCKET = "clone-ingestion-messages"
+TWIN_ID = "bench-twin"
+SOURCE_NAME = "slack"
+PERCENTILES = (50, 95, 99)
+
+
+class StageTimer:
+    """
+    Measures the time spent in, and the calls to, the stages instrumented with `metrics.stage`
+    since the timer was created.
+    """
+
+    def __init__(self):
+        self._start = metrics.stage_totals()
+
+    def report(self) -> dict:
+        """
+        Returns the seconds and calls of every stage run since the timer was created
+        """
+        report = {}
+        for name, (seconds, calls) in sorted(metrics.stage_totals().items()):
+            start_seconds, start_calls = self._start.get(name, (0.0, 0))
+            if calls > start_calls:
+                report[name] = {
+                    "seconds": round(seconds - start_seconds, 6),
+                    "calls": calls - start_calls,
+                }
+        return report
+
+
+def upload_files(s3_client, messages: int, per_file: int, seed: int) -> list:
+    """
+    Uploads synthetic message files of at most `per_file` messages each
+
+    Returns:
+        list: the keys of the uploaded files
+    """
+    keys = []
+    with tempfile.TemporaryDirectory() as tmp:
+        for index, start in enumerate(range(0, messages, per_file)):
+            count = min(per_file, messages - start)
+            path = os.path.join(tmp, f"{index}.json")
+            with open(path, "w", encoding="utf-8") as output:
+                write_messages(generate_messages(count, seed + index), output)
+            key = f"{TWIN_ID}/{SOURCE_NAME}/channel-{index % 8}/file-{index:05d}.json"
+            s3_client.upload_file(path, BUCKET, key)
+            keys.append(key)
+    return keys
+
+
+def parser_memory(path: str, chunk_size: int) -> dict:
+    """
+    Traces the peak memory allocated while parsing a message file with json.load and with the
+    streaming parser fed `chunk_size` characters at a time. Unlike the RSS, it leaves out the
+    models and the objects held by the S3 mock.
+
+    Returns:
+        dict: the peak bytes of each parser
+    """
+
+    def load(message_file) -> None:
+        json.load(message_file)
+
+    def stream(message_file) -> None:
+        chunks = iter(functools.partial(message_file.read, chunk_size), "")
+        for _ in iter_json_array(chunks):
+            pass
+
+    peaks = {}
+    for name, parse in (("json_load", load), ("streaming", stream)):
+        with open(path, encoding="utf-8") as message_file:
+            tracemalloc.start()
+            try:
+                parse(message_file)
+                peaks[name] = tracemalloc.get_traced_memory()[1]
+            finally:
+                tracemalloc.stop()
+    return peaks
+
+
+def build_queries(count: int, seed: int) -> list:
+    """
+    Builds search texts of a few words drawn from the message vocabulary
+    """
+    rng = random.Random(seed)
+    return [" ".join(rng.sample(WORDS, rng.randint(2, 6))) for _ in range(count)]
+
+
+def latency_report(latencies: list) -> dict:
+    """
+    Returns the mean and percentiles of latencies given in seconds, in milliseconds
+    """
+    values = np.asarray(latencies) * 1000
+    report = {f"p{p}": round(float(np.percentile(values, p)), 3) for p in PERCENTILES}
+    report["mean"] = round(float(values.mean()), 3)
+    report["max"] = round(float(values.max()), 3)
+    return report
+
+
+def run(args: argparse.Namespace, workdir: str) -> dict:
+    """
+    Runs the ingestion and search benchmark
+
+    Returns:
+        dict: the benchmark report
+    """
+    messages = args.messages or SIZES[args.size]
+    s3_client = boto3.client("s3", region_name="us-east-1")
+    s3_client.create_bucket(Bucket=BUCKET)
+    start = time.perf_counter()
+    keys = upload_files(s3_client, messages, args.messages_per_file, args.seed)
+    generate_seconds = time.perf_counter() - start
+
+    startup_timer = startup.StartupTimer(logger)
+    opensearch_service = LocalVectorService(
+        os.path.join(workdir, "vectors"),
+        logger,
+        ivf_min_rows=args.ivf_min_rows,
+        ivf_probes=args.ivf_probes,
+    )
+    s3_service = S3Service(s3_client, logger)
+    llama_service = LlamaIndexService(
+        None,
+        logger,
+        embed_batch_size=args.embed_batch_size,
+        preprocess_batch_size=args.preprocess_batch_size,
+        query_cache_size=0,
+        index_mode=INDEX_MODE_BULK,
+        opensearch_service=opensearch_service,
+        ingest_batch_size=args.ingest_batch_size,
+    )
+    usecase = VectorizerUsecase(
+        s3_service,
+        llama_service,
+        opensearch_service,
+        logger,
+        search_mode=args.search_mode,
+        s3_streaming=args.s3_streaming,
+        s3_stream_chunk_size=args.stream_chunk_size,
+    )
+    with startup_timer.stage("load_models"):
+        llama_service.load_models()
+    with startup_timer.stage("warm_up"):
+        llama_service.warm_up()
+
+    # when streaming, reading the object is spread over the stages consuming it
+    ingestion = StageTimer()
+    file_latencies = []
+    start = time.perf_counter()
+    for key in keys:
+        file_start = time.perf_counter()
+        usecase.vectorize_and_index(BUCKET, key)
+        file_latencies.append(time.perf_counter() - file_start)
+    ingest_seconds = time.perf_counter() - start
+
+    search = StageTimer()
+    latencies = []
+    queries = build_queries(args.queries, args.seed)
+    start = time.perf_counter()
+    for query in queries:
+        query_start = time.perf_counter()
+        usecase.search(query, k=args.k, filters={"twin_id": TWIN_ID})
+        latencies.append(time.perf_counter() - query_start)
+    search_seconds = time.perf_counter() - start
+
+    parser_path = os.path.join(workdir, "parser.json")
+    with open(parser_path, "w", encoding="utf-8") as output:
+        write_messages(
+            generate_messages(min(args.messages_per_file, messages), args.seed), output
+        )
+
+    return {
+        "config": {
+            "messages": messages,
+            "files": len(keys),
+            "seed": args.seed,
+            "embed_batch_size": args.embed_batch_size,
+            "preprocess_batch_size": args.preprocess_batch_size,
+            "ingest_batch_size": args.ingest_batch_size,
+            "s3_streaming": args.s3_streaming,
+            "stream_chunk_size": args.stream_chunk_size,
+            "search_mode": args.search_mode,
+            "k": args.k,
+            "ivf_min_rows": args.ivf_min_rows,
+            "ivf_probes": args.ivf_probes,
+        },
+        "environment": {
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "cpus": os.cpu_count(),
+        },
+        "startup": {name: round(seconds, 6) for name, seconds in startup_timer.stages},
+        "generate_seconds": round(generate_seconds, 6),
+        "ingestion": {
+            "seconds": round(ingest_seconds, 6),
+            "messages_per_second": round(messages / ingest_seconds, 3),
+            "indexed_documents": opensearch_service.count(TWIN_ID),
+            "file_latency_ms": latency_report(file_latencies),
+            "stages": ingestion.report(),
+        },
+        "search": {
+            "queries": len(queries),
+            "seconds": round(search_seconds, 6),
+            "queries_per_second": round(len(queries) / search_seconds, 3),
+            "latency_ms": latency_report(latencies),
+            "stages": search.report(),
+        },
+        "parser": {
+            "file_bytes": os.path.getsize(parser_path),
+            "peak_bytes": parser_memory(parser_path, args.stream_chunk_size),
+        },
+        # kilobytes on Linux, includes the models and the objects held by the S3 mock
+        "peak_rss_bytes": resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024,
+    }
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--size", choices=list(SIZES), default="small")
+    parser.add_argument(
+        "--messages", type=int, help="number of messages, overrides --size"
+    )
+    parser.add_argument("--messages-per-file", type=int, default=10_000)
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--k", type=int, default=10)
+    parser.add_argument(
+        "--search-mode",
+        choices=[SEARCH_MODE_KNN, SEARCH_MODE_EXACT],
+        default=SEARCH_MODE_KNN,
+    )
+    parser.add_argument("--embed-batch-size", type=int, default=64)
+    parser.add_argument("--preprocess-batch-size", type=int, default=256)
+    parser.add_argument("--ingest-batch-size", type=int, default=1000)
+    parser.add_argument("--s3-streaming", action="store_true")
+    parser.add_argument("--stream-chunk-size", type=int, default=1024 * 1024)
+    parser.add_argument("--ivf-min-rows", type=int, default=50_000)
+    parser.add_argument("--ivf-probes", type=int, default=8)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument(
+        "--output", help="file to write the report to, stdout if omitted"
+    )
+    args = parser.parse_args()
+
+    # moto accepts any credentials, but boto3 refuses to sign without them
+    os.environ.setdefault("AWS_ACCESS_KEY_ID", "testing")
+    os.environ.setdefault("AWS_SECRET_ACCESS_KEY", "testing")
+    with mock_aws(), tempfile.TemporaryDirectory() as workdir:
+        report = run(args, workdir)
+
+    output = json.dumps(report, indent=2)
+    if args.output:
+        with open(args.output, "w") as output_file:
+            output_file.write(output + "\n")
+    else:
+        print(output)
+
+
+if __name__ == "__main__":
+    main()
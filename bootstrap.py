@@ -0,0 +1,272 @@
+import boto3
+from botocore.client import BaseClient
+from llama_index.vector_stores.opensearch import (
+    OpensearchVectorClient,
+    OpensearchVectorStore,
+)
+from opensearchpy import RequestsHttpConnection
+
+from config import Config
+from core.service.embedding_store import EmbeddingStore
+from core.service.llama_index_service import (
+    EMBED_MODEL_NAME,
+    INDEX_MODE_BULK,
+    LlamaIndexService,
+)
+from core.service.local_vector_service import LocalVectorService
+from core.service.manifest_store import OpensearchManifestStore
+from core.service.opensearch_service import OpensearchService
+from core.service.opensearch_transport import build_opensearch_client
+from core.service.routing_opensearch_service import RoutingOpensearchService
+from core.service.s3_service import S3Service
+from core.service.search_cache import InMemorySearchCache
+from core.usecase.vectorizer import VectorizerUsecase
+from core.utils import startup
+from core.utils.definitions import (
+    JOBS_MAPPINGS,
+    MANIFEST_MAPPINGS,
+    build_knn_method,
+    build_mappings,
+    check_knn_settings,
+    knn_settings_drift,
+)
+from core.utils.logger import logger
+
+# Composition of the services behind VectorizerUsecase, shared by the Flask app in main.py
+# and the backfill command. Importing it has no side effect, nothing is built until called.
+
+
+def build_s3_client(cfg: Config) -> BaseClient:
+    """
+    Builds the S3 client, pointed at S3_URL when set, e.g. a localstack endpoint.
+
+    Args:
+        cfg (Config): Configuration.
+
+    Returns:
+        BaseClient: the boto3 S3 client
+    """
+    return boto3.client("s3", endpoint_url=cfg.S3_URL or None)
+
+
+def check_config(cfg: Config) -> None:
+    """
+    Fails fast on a configuration the services cannot start with.
+
+    Args:
+        cfg (Config): Configuration.
+
+    Raises:
+        ValueError: If OPENSEARCH_INDEX, which the jobs and manifests indices are named
+            after, is not set.
+    """
+    if not cfg.OPENSEARCH_INDEX:
+        raise ValueError("OPENSEARCH_INDEX is not set")
+
+
+def build_usecase(cfg: Config, timer: startup.StartupTimer) -> tuple:
+    """
+    Builds the vectorizer usecase and the services it depends on, creating the OpenSearch
+    indices when missing.
+
+    Args:
+        cfg (Config): Configuration.
+        timer (startup.StartupTimer): Measures the duration of each stage.
+
+    Returns:
+        tuple: the VectorizerUsecase, the LlamaIndexService, to warm its models up, and the
+            OpenSearch client
+    """
+    check_config(cfg)
+    with timer.stage("s3_client"):
+        s3_client = build_s3_client(cfg)
+        s3_service = S3Service(s3_client, logger)
+
+    knn_method = build_knn_method(
+        cfg.KNN_ENGINE,
+        cfg.KNN_SPACE_TYPE,
+        cfg.KNN_M,
+        cfg.KNN_EF_CONSTRUCTION,
+        cfg.KNN_DATA_TYPE,
+    )
+
+    # Opensearch initialization
+    with timer.stage("opensearch_index"):
+        try:
+            opensearch_client = build_opensearch_client(
+                cfg.OPENSEARCH_HOST,
+                cfg.OPENSEARCH_PORT,
+                (cfg.OPENSEARCH_USER, cfg.OPENSEARCH_PASS),
+                pool_maxsize=cfg.OPENSEARCH_POOL_MAXSIZE,
+                keepalive_idle=cfg.OPENSEARCH_KEEPALIVE_IDLE,
+                compress_bulk=cfg.OPENSEARCH_COMPRESS_BULK,
+                search_timeout=cfg.OPENSEARCH_SEARCH_TIMEOUT,
+                bulk_timeout=cfg.OPENSEARCH_BULK_TIMEOUT,
+                retries=cfg.OPENSEARCH_RETRIES,
+                retry_backoff=cfg.OPENSEARCH_RETRY_BACKOFF,
+                breaker_threshold=cfg.OPENSEARCH_BREAKER_THRESHOLD,
+                breaker_reset=cfg.OPENSEARCH_BREAKER_RESET,
+            )
+            for warning in check_knn_settings(
+                cfg.KNN_ENGINE,
+                cfg.KNN_SPACE_TYPE,
+                cfg.KNN_EF_SEARCH,
+                cfg.KNN_QUERY_EF_SEARCH,
+                opensearch_client.info()["version"]["number"],
+            ):
+                logger.warning(warning)
+            mappings = build_mappings(
+                cfg.KNN_ENGINE,
+                cfg.KNN_SPACE_TYPE,
+                cfg.KNN_M,
+                cfg.KNN_EF_CONSTRUCTION,
+                cfg.KNN_EF_SEARCH,
+                cfg.KNN_DATA_TYPE,
+            )
+            if not opensearch_client.indices.exists(index=cfg.OPENSEARCH_INDEX):
+                opensearch_client.indices.create(
+                    index=cfg.OPENSEARCH_INDEX, body=mappings
+                )
+            else:
+                index = opensearch_client.indices.get(index=cfg.OPENSEARCH_INDEX)
+                drift = knn_settings_drift(index[cfg.OPENSEARCH_INDEX], mappings)
+                if drift:
+                    # the HNSW method is fixed at index creation, see "Changing the knn settings"
+                    logger.warning(
+                        f"{cfg.OPENSEARCH_INDEX} was created with other knn settings, "
+                        f"they only apply after a reindex: {', '.join(drift)}"
+                    )
+            if cfg.DELTA_INGESTION and not opensearch_client.indices.exists(
+                index=cfg.MANIFEST_INDEX
+            ):
+                opensearch_client.indices.create(
+                    index=cfg.MANIFEST_INDEX, body=MANIFEST_MAPPINGS
+                )
+            if (
+                cfg.JOBS_BACKEND == "opensearch"
+                and not opensearch_client.indices.exists(index=cfg.JOBS_INDEX)
+            ):
+                opensearch_client.indices.create(
+                    index=cfg.JOBS_INDEX, body=JOBS_MAPPINGS
+                )
+        except Exception as e:
+            logger.error(f"Failed to connect to OpenSearch: {e}")
+            raise
+
+    opensearch_service = OpensearchService(
+        opensearch_client,
+        cfg.OPENSEARCH_INDEX,
+        logger,
+        bulk_chunk_size=cfg.BULK_CHUNK_SIZE,
+        bulk_thread_count=cfg.BULK_THREAD_COUNT,
+        bulk_max_chunk_bytes=cfg.BULK_MAX_CHUNK_BYTES,
+        bulk_max_retries=cfg.BULK_MAX_RETRIES,
+        bulk_initial_backoff=cfg.BULK_INITIAL_BACKOFF,
+    )
+    if cfg.LOCAL_VECTOR_PATH and cfg.LOCAL_VECTOR_TWINS:
+        if cfg.INDEX_MODE != INDEX_MODE_BULK:
+            # llama_index writes straight to OpenSearch, the local engine would miss them
+            raise ValueError(
+                f'LOCAL_VECTOR_TWINS requires INDEX_MODE="{INDEX_MODE_BULK}"'
+            )
+        local_vector_service = LocalVectorService(
+            cfg.LOCAL_VECTOR_PATH,
+            logger,
+            ivf_min_rows=cfg.LOCAL_VECTOR_IVF_MIN_ROWS,
+            ivf_probes=cfg.LOCAL_VECTOR_IVF_PROBES,
+        )
+        opensearch_service = RoutingOpensearchService(
+            opensearch_service,
+            local_vector_service,
+            cfg.LOCAL_VECTOR_TWINS,
+            logger,
+            sync_max_age=cfg.LOCAL_VECTOR_SYNC_MAX_AGE,
+        )
+        with timer.stage("local_vector_sync"):
+            opensearch_service.sync()
+
+    text_field = "content"
+    embedding_field = "embedding"
+    with timer.stage("opensearch_vector_client"):
+        try:
+            os_vector_client = OpensearchVectorClient(
+                [{"host": cfg.OPENSEARCH_HOST, "port": cfg.OPENSEARCH_PORT}],
+                cfg.OPENSEARCH_INDEX,
+                384,
+                embedding_field=embedding_field,
+                text_field=text_field,
+                method=knn_method,
+                http_auth=(cfg.OPENSEARCH_USER, cfg.OPENSEARCH_PASS),
+                use_ssl=True,
+                verify_certs=True,
+                connection_class=RequestsHttpConnection,
+                timeout=cfg.OPENSEARCH_SEARCH_TIMEOUT,
+            )
+            # the client built by llama_index only checks the index exists, its requests
+            # go through the shared pooled client from then on. _os_client is private to
+            # OpensearchVectorClient, which is why llama-index-vector-stores-opensearch is
+            # pinned in requirements.txt: check it still exists before upgrading it
+            os_vector_client._os_client.close()
+            os_vector_client._os_client = opensearch_client
+            vector_store = OpensearchVectorStore(os_vector_client)
+        except Exception as e:
+            logger.error(f"Failed to initialize OpensearchVectorClient: {e}")
+            raise
+
+    embedding_store = None
+    if cfg.EMBEDDING_STORE_PATH:
+        embedding_store = EmbeddingStore(
+            cfg.EMBEDDING_STORE_PATH,
+            EMBED_MODEL_NAME,
+            logger,
+            max_rows=cfg.EMBEDDING_STORE_MAX_ROWS,
+        )
+    llama_service = LlamaIndexService(
+        vector_store,
+        logger,
+        embed_batch_size=cfg.EMBED_BATCH_SIZE,
+        preprocess_batch_size=cfg.PREPROCESS_BATCH_SIZE,
+        preprocess_n_process=cfg.PREPROCESS_N_PROCESS,
+        query_cache_size=cfg.QUERY_CACHE_SIZE,
+        query_cache_ttl=cfg.QUERY_CACHE_TTL,
+        embed_dispatch_max_batch=cfg.EMBED_DISPATCH_MAX_BATCH,
+        embed_dispatch_max_wait_ms=cfg.EMBED_DISPATCH_MAX_WAIT_MS,
+        index_mode=cfg.INDEX_MODE,
+        opensearch_service=opensearch_service,
+        ingest_batch_size=cfg.INGEST_BATCH_SIZE,
+        embedding_store=embedding_store,
+        vector_data_type=cfg.KNN_DATA_TYPE,
+    )
+    if cfg.PRELOAD_MODELS:
+        with timer.stage("load_models"):
+            llama_service.load_models()
+    search_cache = None
+    if cfg.SEARCH_CACHE_SIZE > 0:
+        search_cache = InMemorySearchCache(
+            logger, maxsize=cfg.SEARCH_CACHE_SIZE, ttl=cfg.SEARCH_CACHE_TTL
+        )
+    manifest_store = None
+    if cfg.DELTA_INGESTION:
+        manifest_store = OpensearchManifestStore(
+            opensearch_client, cfg.MANIFEST_INDEX, logger
+        )
+    usecase = VectorizerUsecase(
+        s3_service,
+        llama_service,
+        opensearch_service,
+        logger,
+        search_mode=cfg.SEARCH_MODE,
+        ef_search=cfg.KNN_QUERY_EF_SEARCH,
+        search_cache=search_cache,
+        s3_streaming=cfg.S3_STREAMING,
+        s3_stream_chunk_size=cfg.S3_STREAM_CHUNK_SIZE,
+        vector_data_type=cfg.KNN_DATA_TYPE,
+        rescore_oversample=cfg.RESCORE_OVERSAMPLE,
+        hybrid_fusion=cfg.HYBRID_FUSION,
+        hybrid_rrf_k=cfg.HYBRID_RRF_K,
+        hybrid_lexical_weight=cfg.HYBRID_LEXICAL_WEIGHT,
+        hybrid_vector_weight=cfg.HYBRID_VECTOR_WEIGHT,
+        manifest_store=manifest_store,
+    )
+
+    return usecase, llama_service, opensearch_client
@@ -22,6 +22,101 @@ class Config:
     OPENSEARCH_USE_SSL = environ.get("OPENSEARCH_USE_SSL")
     OPENSEARCH_VERIFY_CERTS = environ.get("OPENSEARCH_VERIFY_CERTS")
     S3_URL = environ.get("S3_URL")
+    # connection layer shared by every OpenSearch client of the process
+    OPENSEARCH_POOL_MAXSIZE = int(environ.get("OPENSEARCH_POOL_MAXSIZE") or "32")
+    OPENSEARCH_KEEPALIVE_IDLE = int(environ.get("OPENSEARCH_KEEPALIVE_IDLE") or "60")
+    OPENSEARCH_COMPRESS_BULK = (
+        environ.get("OPENSEARCH_COMPRESS_BULK") or "true"
+    ).lower() == "true"
+    OPENSEARCH_SEARCH_TIMEOUT = float(environ.get("OPENSEARCH_SEARCH_TIMEOUT") or "10")
+    OPENSEARCH_BULK_TIMEOUT = float(environ.get("OPENSEARCH_BULK_TIMEOUT") or "60")
+    OPENSEARCH_RETRIES = int(environ.get("OPENSEARCH_RETRIES") or "3")
+    OPENSEARCH_RETRY_BACKOFF = float(environ.get("OPENSEARCH_RETRY_BACKOFF") or "0.5")
+    OPENSEARCH_BREAKER_THRESHOLD = int(
+        environ.get("OPENSEARCH_BREAKER_THRESHOLD") or "5"
+    )
+    OPENSEARCH_BREAKER_RESET = float(environ.get("OPENSEARCH_BREAKER_RESET") or "30")
+    PRELOAD_MODELS = (environ.get("PRELOAD_MODELS") or "true").lower() == "true"
+    # "import" warms the models up when the app is loaded, "post_fork" leaves it to each
+    # forked worker of a preloading server
+    WARM_UP = environ.get("WARM_UP") or "import"
+    EMBED_BATCH_SIZE = int(environ.get("EMBED_BATCH_SIZE") or "64")
+    PREPROCESS_BATCH_SIZE = int(environ.get("PREPROCESS_BATCH_SIZE") or "256")
+    PREPROCESS_N_PROCESS = int(environ.get("PREPROCESS_N_PROCESS") or "1")
+    VECTORIZE_MAX_WORKERS = int(environ.get("VECTORIZE_MAX_WORKERS") or "4")
+    JOBS_WORKERS = int(environ.get("JOBS_WORKERS") or "2")
+    JOBS_QUEUE_SIZE = int(environ.get("JOBS_QUEUE_SIZE") or "100")
+    JOBS_HISTORY_SIZE = int(environ.get("JOBS_HISTORY_SIZE") or "1000")
+    # "memory" requires a single worker, "opensearch" shares the jobs between worker processes
+    JOBS_BACKEND = environ.get("JOBS_BACKEND") or "memory"
+    # derived from OPENSEARCH_INDEX, which is checked on startup by bootstrap.check_config
+    JOBS_INDEX = environ.get("JOBS_INDEX") or (
+        f"{OPENSEARCH_INDEX}-jobs" if OPENSEARCH_INDEX else None
+    )
+    JOBS_LEASE_SECONDS = float(environ.get("JOBS_LEASE_SECONDS") or "60")
+    JOBS_POLL_INTERVAL = float(environ.get("JOBS_POLL_INTERVAL") or "1")
+    JOBS_MAX_ATTEMPTS = int(environ.get("JOBS_MAX_ATTEMPTS") or "3")
+    S3_STREAMING = (environ.get("S3_STREAMING") or "false").lower() == "true"
+    S3_STREAM_CHUNK_SIZE = int(environ.get("S3_STREAM_CHUNK_SIZE") or "1048576")
+    INGEST_BATCH_SIZE = int(environ.get("INGEST_BATCH_SIZE") or "1000")
+    # re-ingest only the messages added to or removed from an object since its last ingestion
+    DELTA_INGESTION = (environ.get("DELTA_INGESTION") or "false").lower() == "true"
+    MANIFEST_INDEX = environ.get("MANIFEST_INDEX") or (
+        f"{OPENSEARCH_INDEX}-manifests" if OPENSEARCH_INDEX else None
+    )
+    EMBEDDING_STORE_PATH = environ.get("EMBEDDING_STORE_PATH")
+    EMBEDDING_STORE_MAX_ROWS = int(environ.get("EMBEDDING_STORE_MAX_ROWS") or "1000000")
+    INDEX_MODE = environ.get("INDEX_MODE") or "llama_index"
+    BULK_CHUNK_SIZE = int(environ.get("BULK_CHUNK_SIZE") or "500")
+    BULK_THREAD_COUNT = int(environ.get("BULK_THREAD_COUNT") or "4")
+    BULK_MAX_CHUNK_BYTES = int(environ.get("BULK_MAX_CHUNK_BYTES") or "10485760")
+    BULK_MAX_RETRIES = int(environ.get("BULK_MAX_RETRIES") or "3")
+    BULK_INITIAL_BACKOFF = float(environ.get("BULK_INITIAL_BACKOFF") or "2")
+    QUERY_CACHE_SIZE = int(environ.get("QUERY_CACHE_SIZE") or "1024")
+    QUERY_CACHE_TTL = (
+        float(environ["QUERY_CACHE_TTL"]) if environ.get("QUERY_CACHE_TTL") else None
+    )
+    EMBED_DISPATCH_MAX_BATCH = int(environ.get("EMBED_DISPATCH_MAX_BATCH") or "16")
+    EMBED_DISPATCH_MAX_WAIT_MS = float(environ.get("EMBED_DISPATCH_MAX_WAIT_MS") or "5")
+    SEARCH_CACHE_SIZE = int(environ.get("SEARCH_CACHE_SIZE") or "1024")
+    # invalidation only reaches the cache of the process that indexed, 0 never expires
+    SEARCH_CACHE_TTL = float(environ.get("SEARCH_CACHE_TTL") or "30")
+    # hot twins served by the in-process vector engine, comma separated
+    LOCAL_VECTOR_PATH = environ.get("LOCAL_VECTOR_PATH")
+    LOCAL_VECTOR_TWINS = [
+        twin_id.strip()
+        for twin_id in (environ.get("LOCAL_VECTOR_TWINS") or "").split(",")
+        if twin_id.strip()
+    ]
+    LOCAL_VECTOR_IVF_MIN_ROWS = int(environ.get("LOCAL_VECTOR_IVF_MIN_ROWS") or "50000")
+    LOCAL_VECTOR_IVF_PROBES = int(environ.get("LOCAL_VECTOR_IVF_PROBES") or "8")
+    # seconds before a twin synced by a process of the host is synced again on startup
+    LOCAL_VECTOR_SYNC_MAX_AGE = float(
+        environ.get("LOCAL_VECTOR_SYNC_MAX_AGE") or "3600"
+    )
+    SEARCH_BATCH_MAX_QUERIES = int(environ.get("SEARCH_BATCH_MAX_QUERIES") or "100")
+    # threads running the query embedding of the async app, and its OpenSearch connections
+    ASYNC_EMBED_WORKERS = int(environ.get("ASYNC_EMBED_WORKERS") or "4")
+    ASYNC_OPENSEARCH_POOL_SIZE = int(environ.get("ASYNC_OPENSEARCH_POOL_SIZE") or "100")
+    SEARCH_MODE = environ.get("SEARCH_MODE") or "knn"
+    HYBRID_FUSION = environ.get("HYBRID_FUSION") or "rrf"
+    HYBRID_RRF_K = int(environ.get("HYBRID_RRF_K") or "60")
+    HYBRID_LEXICAL_WEIGHT = float(environ.get("HYBRID_LEXICAL_WEIGHT") or "1")
+    HYBRID_VECTOR_WEIGHT = float(environ.get("HYBRID_VECTOR_WEIGHT") or "1")
+    KNN_ENGINE = environ.get("KNN_ENGINE") or "lucene"
+    KNN_SPACE_TYPE = environ.get("KNN_SPACE_TYPE") or "cosinesimil"
+    KNN_M = int(environ.get("KNN_M") or "16")
+    KNN_EF_CONSTRUCTION = int(environ.get("KNN_EF_CONSTRUCTION") or "128")
+    KNN_EF_SEARCH = int(environ.get("KNN_EF_SEARCH") or "100")
+    # "float", "float16" (faiss engine) or "byte" (lucene engine), quantized types need INDEX_MODE=bulk
+    KNN_DATA_TYPE = environ.get("KNN_DATA_TYPE") or "float"
+    RESCORE_OVERSAMPLE = float(environ.get("RESCORE_OVERSAMPLE") or "4")
+    # per query ef_search override, requires OpenSearch 2.16 or newer
+    KNN_QUERY_EF_SEARCH = (
+        int(environ["KNN_QUERY_EF_SEARCH"])
+        if environ.get("KNN_QUERY_EF_SEARCH")
+        else None
+    )
 
 
 class DevelopmentConfig(Config):
@@ -31,6 +126,8 @@ class DevelopmentConfig(Config):
 
     LOG_LEVEL = "DEBUG"
     OPENSEARCH_INDEX = "clone-vector-index"
+    JOBS_INDEX = "clone-vector-index-jobs"
+    MANIFEST_INDEX = "clone-vector-index-manifests"
     OPENSEARCH_HOST = "host.docker.internal"
     OPENSEARCH_PORT = "9200"
     OPENSEARCH_USER = ""
@@ -8,12 +8,15 @@ class AbstractVectorController(ABC):
     """
 
     @abstractmethod
-    def vectoring(self, request: Dict[str, Any]) -> Tuple[Dict[str, str], int]:
+    def vectoring(
+        self, request: Dict[str, Any], asynchronous: bool = False
+    ) -> Tuple[Dict[str, str], int]:
         """
         Abstract method to handle vectorization requests.
 
         Args:
             request (Dict[str, Any]): Request body.
+            asynchronous (bool, optional): Run the vectorization as a background job. Defaults to False.
 
         Returns:
             Tuple[Dict[str, str], int]: Tuple containing a JSON response indicating success or failure of the vectorization process and an HTTP status code.
@@ -1,4 +1,5 @@
 from abc import ABC, abstractmethod
+from typing import Callable, Iterable, Iterator
 
 
 # Abstract base class for S3 service
@@ -8,19 +9,80 @@ class AbstractS3Service(ABC):
     """
 
     @abstractmethod
-    def get_object(self, bucket_name: str, object_key: str) -> list:
+    def get_object(
+        self, bucket_name: str, object_key: str, if_match: str = None
+    ) -> list:
         """
         Abstract method to get an object from S3.
 
         Args:
             bucket_name (str): Name of the S3 bucket.
             object_key (str): Key of the object in the S3 bucket.
+            if_match (str, optional): Fail unless the object still has this ETag. Defaults to any ETag.
 
         Returns:
             dict: Dictionary containing the loaded JSON content of the S3 object.
         """
         pass
 
+    @abstractmethod
+    def stream_object(
+        self,
+        bucket_name: str,
+        object_key: str,
+        chunk_size: int = 1024 * 1024,
+        if_match: str = None,
+    ) -> Iterator[dict]:
+        """
+        Abstract method to stream the items of a JSON array object from S3.
+
+        Args:
+            bucket_name (str): Name of the S3 bucket.
+            object_key (str): Key of the object in the S3 bucket.
+            chunk_size (int, optional): Bytes read from the body at a time. Defaults to 1MB.
+            if_match (str, optional): Fail unless the object still has this ETag. Defaults to any ETag.
+
+        Returns:
+            Iterator[dict]: The items of the JSON array, in order.
+        """
+        pass
+
+    @abstractmethod
+    def get_etag(self, bucket_name: str, object_key: str) -> str:
+        """
+        Abstract method to get the ETag of an object without downloading it.
+
+        Args:
+            bucket_name (str): Name of the S3 bucket.
+            object_key (str): Key of the object in the S3 bucket.
+
+        Returns:
+            str: The ETag of the object, it changes whenever the object is rewritten.
+        """
+        pass
+
+    @abstractmethod
+    def list_objects(
+        self,
+        bucket_name: str,
+        prefix: str = "",
+        start_after: str = None,
+        page_size: int = 1000,
+    ) -> Iterator[dict]:
+        """
+        Abstract method to list the objects of a bucket, page by page.
+
+        Args:
+            bucket_name (str): Name of the S3 bucket.
+            prefix (str, optional): Only list the keys starting with it. Defaults to every key.
+            start_after (str, optional): Only list the keys after it. Defaults to the first key.
+            page_size (int, optional): Keys requested per page. Defaults to 1000.
+
+        Returns:
+            Iterator[dict]: The "Key" and "Size" of each object, in key order.
+        """
+        pass
+
 
 class AbstractLlamaIndexService(ABC):
     """
@@ -34,7 +96,7 @@ class AbstractLlamaIndexService(ABC):
         source_name: str,
         channelId: str,
         file_uuid: str,
-        documents: list,
+        documents: Iterable[dict],
     ) -> str:
         """
         Abstract method to indexing documents and store vectors in OpenSearch.
@@ -44,7 +106,7 @@ class AbstractLlamaIndexService(ABC):
             source_name (str): Name of the data source.
             channelId (str): Channel identifier.
             file_uuid (str): UUID of the file containing the documents.
-            documents (list): List of dictionaries representing documents.
+            documents (Iterable[dict]): Dictionaries representing documents, a list or a stream.
 
         Returns:
             str: Index summary
@@ -64,6 +126,62 @@ class AbstractLlamaIndexService(ABC):
         """
         pass
 
+    @abstractmethod
+    def load_models(self) -> None:
+        """
+        Abstract method to load the models used for vectorization.
+        """
+        pass
+
+    @abstractmethod
+    def warm_up(self) -> None:
+        """
+        Abstract method to run a first inference before serving requests.
+        """
+        pass
+
+    @abstractmethod
+    def vectorize_strings(self, text_inputs: list) -> list:
+        """
+        Abstract method to vectorize several strings in a single batch.
+
+        Args:
+            text_inputs (list): strings to vectorize
+
+        Returns:
+            list: a vector for each string, in order
+        """
+        pass
+
+
+class AbstractEmbeddingStore(ABC):
+    """
+    Abstract class for embedding caches keyed by text.
+    """
+
+    @abstractmethod
+    def get_many(self, texts: list) -> dict:
+        """
+        Abstract method to get the cached embeddings of texts.
+
+        Args:
+            texts (list): Texts to look up.
+
+        Returns:
+            dict: The cached embeddings by text, texts without a cached embedding are left out.
+        """
+        pass
+
+    @abstractmethod
+    def put_many(self, embeddings: dict) -> None:
+        """
+        Abstract method to cache embeddings.
+
+        Args:
+            embeddings (dict): Embeddings by text.
+        """
+        pass
+
 
 class AbstractOpensearchService(ABC):
     """
@@ -82,3 +200,235 @@ class AbstractOpensearchService(ABC):
             list: a list of results
         """
         pass
+
+    @abstractmethod
+    def msearch(self, queries: list) -> list:
+        """
+        Abstract method to run several queries in a single request
+
+        Args:
+            queries (list): Opensearch queries
+
+        Returns:
+            list: a list of results for each query, in order
+        """
+        pass
+
+    @abstractmethod
+    def existing_ids(self, ids: list) -> set:
+        """
+        Abstract method to find which documents are already indexed
+
+        Args:
+            ids (list): document ids to look up
+
+        Returns:
+            set: the ids of the documents already present in the index
+        """
+        pass
+
+    @abstractmethod
+    def bulk_index(self, documents: list) -> int:
+        """
+        Abstract method to write documents to an opensearch index in bulk
+
+        Args:
+            documents (list): documents to index, each one with its "_id"
+
+        Returns:
+            int: the number of indexed documents
+        """
+        pass
+
+    @abstractmethod
+    def scan(self, query: dict) -> Iterator[dict]:
+        """
+        Abstract method to iterate over every document matching a query
+
+        Args:
+            query (dict): Opensearch query
+
+        Returns:
+            Iterator[dict]: the matching documents, with their "_id" and "_source"
+        """
+        pass
+
+    @abstractmethod
+    def delete_ids(self, ids: list) -> int:
+        """
+        Abstract method to delete documents from an opensearch index
+
+        Args:
+            ids (list): document ids to delete
+
+        Returns:
+            int: the number of deleted documents
+        """
+        pass
+
+
+class AbstractAsyncOpensearchService(ABC):
+    """
+    Abstract class for Opensearch services with non-blocking I/O, used by the async search app
+    """
+
+    @abstractmethod
+    async def search(self, query: dict) -> list:
+        """
+        Abstract method to query an opensearch index
+
+        Args:
+            query (dict): Opensearch query string
+
+        Returns:
+            list: a list of results
+        """
+        pass
+
+    @abstractmethod
+    async def msearch(self, queries: list) -> list:
+        """
+        Abstract method to run several queries in a single request
+
+        Args:
+            queries (list): Opensearch queries
+
+        Returns:
+            list: a list of results for each query, in order
+        """
+        pass
+
+    @abstractmethod
+    async def close(self) -> None:
+        """
+        Abstract method to release the connections of the service
+        """
+        pass
+
+
+class AbstractSearchCache(ABC):
+    """
+    Abstract class for search result caches. Implementations backed by a shared store
+    allow several replicas to share cached results and invalidations.
+    """
+
+    @abstractmethod
+    def get(self, key: str) -> list:
+        """
+        Abstract method to get cached search results.
+
+        Args:
+            key (str): Key identifying the search (query, k, filters)
+
+        Returns:
+            list: the cached results, or None when the search is not cached
+        """
+        pass
+
+    @abstractmethod
+    def set(self, key: str, results: list, scope: dict) -> None:
+        """
+        Abstract method to cache search results.
+
+        Args:
+            key (str): Key identifying the search (query, k, filters)
+            results (list): the search results
+            scope (dict): the twin_id and source_name filters of the search, used for invalidation
+        """
+        pass
+
+    @abstractmethod
+    def invalidate(self, twin_id: str, source_name: str) -> None:
+        """
+        Abstract method to drop every cached search that may include documents of a twin source.
+
+        Args:
+            twin_id (str): Identifier for the twin.
+            source_name (str): Name of the data source.
+        """
+        pass
+
+
+class AbstractManifestStore(ABC):
+    """
+    Abstract class for the manifests of ingested S3 objects, used to re-ingest only what
+    changed in an object since its previous ingestion.
+    """
+
+    @abstractmethod
+    def get(self, key: str) -> dict:
+        """
+        Abstract method to get the manifest of an object.
+
+        Args:
+            key (str): Bucket and key of the object
+
+        Returns:
+            dict: the "etag" and "doc_ids" of the object when it was last ingested, or None
+        """
+        pass
+
+    @abstractmethod
+    def put(self, key: str, manifest: dict) -> None:
+        """
+        Abstract method to save the manifest of an object.
+
+        Args:
+            key (str): Bucket and key of the object
+            manifest (dict): the "etag" and "doc_ids" of the ingested object
+        """
+        pass
+
+
+class QueueFullError(Exception):
+    """
+    Raised when a job queue is at capacity and cannot accept more jobs.
+    """
+
+
+class AbstractJobQueue(ABC):
+    """
+    Abstract class for background job queues.
+    """
+
+    @abstractmethod
+    def start(self) -> None:
+        """
+        Abstract method to start running queued jobs in the current process. Called once the
+        process serving requests is forked, it is a no-op when already started.
+        """
+        pass
+
+    @abstractmethod
+    def submit(self, payload: dict, total: int) -> str:
+        """
+        Abstract method to enqueue a job.
+
+        Args:
+            payload (dict): JSON serializable job arguments, passed to the job handler.
+            total (int): Number of work items in the job, used to report progress.
+
+        Returns:
+            str: The job id.
+
+        Raises:
+            QueueFullError: If the queue cannot accept more jobs.
+        """
+        pass
+
+    @abstractmethod
+    def get(self, job_id: str) -> dict:
+        """
+        Abstract method to get the state of a job.
+
+        Args:
+            job_id (str): The job id.
+
+        Returns:
+            dict: The job status, progress and errors, or None if the job is unknown.
+        """
+        pass
+
+
+# Signature of the functions that run jobs: handler(payload, report_progress)
+JobHandler = Callable[[dict, Callable[[int, str], None]], None]
@@ -1,5 +1,5 @@
 from abc import ABC, abstractmethod
-from typing import Any
+from typing import Any, Callable
 
 
 class AbstractVectorizeUsecase(ABC):
@@ -23,14 +23,142 @@ class AbstractVectorizeUsecase(ABC):
         pass
 
     @abstractmethod
-    def search(self, query: str) -> list[dict[str, Any]]:
+    def vectorize_objects(
+        self, payload: dict, report_progress: Callable[[int, str], None]
+    ) -> None:
+        """
+        Abstract method to vectorize and index several S3 objects as a background job.
+
+        Args:
+            payload (dict): Job payload with an "objects" list of {"bucket", "key"} dictionaries.
+            report_progress (Callable[[int, str], None]): Called with (1, error or None) after each object.
+        """
+        pass
+
+    @abstractmethod
+    def search(
+        self,
+        query: str,
+        k: int = 10,
+        mode: str = None,
+        filters: dict = None,
+        hybrid: dict = None,
+        fields: list = None,
+        cursor: str = None,
+    ) -> list[dict[str, Any]]:
         """
         Abstract method to search for indexed documents.
 
         Args:
             query (str): The text to search documents containing the query text.
+            k (int, optional): The number of results to return. Defaults to 10.
+            mode (str, optional): The search mode. Defaults to the configured search mode.
+            filters (dict, optional): Metadata filters restricting the searched documents.
+            hybrid (dict, optional): Per leg k and weights and fusion of a hybrid search.
+            fields (list, optional): Metadata fields of each result. Defaults to the raw text, source name and file uuid.
+            cursor (str, optional): Cursor of the page, returned with the previous page. Defaults to the first page.
+
+        Returns:
+            list[dict[str, Any]]: The list of results
+        """
+        pass
+
+    @abstractmethod
+    def search_page(
+        self,
+        query: str,
+        k: int = 10,
+        mode: str = None,
+        filters: dict = None,
+        hybrid: dict = None,
+        fields: list = None,
+        cursor: str = None,
+    ) -> dict[str, Any]:
+        """
+        Abstract method to search for a page of indexed documents, with the arguments of `search`.
+
+        Returns:
+            dict[str, Any]: The list of results under "results" and the cursor of the next page under "next_cursor", None on the last page.
+        """
+        pass
+
+    @abstractmethod
+    def search_batch(self, searches: list[dict[str, Any]]) -> list[dict[str, Any]]:
+        """
+        Abstract method to run several searches at once.
+
+        Args:
+            searches (list[dict[str, Any]]): The searches, each one with its "q" text and optional "k", "mode", "filters", "hybrid", "fields" and "cursor".
+
+        Returns:
+            list[dict[str, Any]]: The page of each search, as returned by `search_page`, in order
+        """
+        pass
+
+
+class AbstractAsyncVectorizeUsecase(ABC):
+    """
+    Abstract class for search use cases served from an event loop.
+    """
+
+    @abstractmethod
+    async def search(
+        self,
+        query: str,
+        k: int = 10,
+        mode: str = None,
+        filters: dict = None,
+        hybrid: dict = None,
+        fields: list = None,
+        cursor: str = None,
+    ) -> list[dict[str, Any]]:
+        """
+        Abstract method to search for indexed documents without blocking the event loop.
+
+        Args:
+            query (str): The text to search documents containing the query text.
+            k (int, optional): The number of results to return. Defaults to 10.
+            mode (str, optional): The search mode. Defaults to the configured search mode.
+            filters (dict, optional): Metadata filters restricting the searched documents.
+            hybrid (dict, optional): Per leg k and weights and fusion of a hybrid search.
+            fields (list, optional): Metadata fields of each result. Defaults to the raw text, source name and file uuid.
+            cursor (str, optional): Cursor of the page, returned with the previous page. Defaults to the first page.
 
         Returns:
             list[dict[str, Any]]: The list of results
         """
         pass
+
+    @abstractmethod
+    async def search_page(
+        self,
+        query: str,
+        k: int = 10,
+        mode: str = None,
+        filters: dict = None,
+        hybrid: dict = None,
+        fields: list = None,
+        cursor: str = None,
+    ) -> dict[str, Any]:
+        """
+        Abstract method to search for a page of indexed documents, with the arguments of `search`.
+
+        Returns:
+            dict[str, Any]: The list of results under "results" and the cursor of the next page under "next_cursor", None on the last page.
+        """
+        pass
+
+    @abstractmethod
+    async def search_batch(
+        self, searches: list[dict[str, Any]]
+    ) -> list[dict[str, Any]]:
+        """
+        Abstract method to run several searches at once without blocking the event loop.
+
+        Args:
+            searches (list[dict[str, Any]]): The searches, each one with its "q" text and optional "k", "mode", "filters", "hybrid", "fields" and "cursor".
+
+        Returns:
+            list[dict[str, Any]]: The page of each search, as returned by `search_page`, in order
+        """
+        pass
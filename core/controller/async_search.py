@@ -0,0 +1,76 @@
+from http import HTTPStatus
+from logging import Logger
+from typing import Any, Dict, Tuple
+
+from core.abstracts.usescases import AbstractAsyncVectorizeUsecase
+from core.controller.search_params import parse_search_batch, parse_search_request
+from core.utils.metrics import instrumented
+
+
+class AsyncSearchController:
+    """
+    Controller for the search operations of the async app. Responses are returned as
+    dictionaries and rendered by the web framework.
+    """
+
+    def __init__(
+        self,
+        usecase: AbstractAsyncVectorizeUsecase,
+        logger: Logger,
+        max_batch_queries: int = 100,
+    ):
+        """
+        Initialize the Controller.
+
+        Args:
+            usecase (AbstractAsyncVectorizeUsecase): An instance of a class implementing the AbstractAsyncVectorizeUsecase interface.
+            logger (Logger): Logger instance.
+            max_batch_queries (int, optional): Maximum number of queries in a batch search. Defaults to 100.
+        """
+        self.usecase = usecase
+        self.logger = logger
+        self.max_batch_queries = max_batch_queries
+
+    @instrumented("search")
+    async def search(self, request: Dict[str, Any]) -> Tuple[Dict[str, Any], int]:
+        """
+        Handle search requests, with the same body as the search route of the sync app.
+
+        Args:
+            request (Dict[str, Any]): Request body.
+
+        Returns:
+            Tuple[Dict[str, Any], int]: Tuple containing the results or the error and an HTTP status code.
+        """
+        try:
+            query, params = parse_search_request(request)
+        except ValueError as e:
+            return {"error": str(e)}, HTTPStatus.BAD_REQUEST
+
+        try:
+            page = await self.usecase.search_page(query, **params)
+            return page, HTTPStatus.OK
+        except Exception as e:
+            return {"error": str(e)}, HTTPStatus.INTERNAL_SERVER_ERROR
+
+    @instrumented("search_batch")
+    async def search_batch(self, request: Dict[str, Any]) -> Tuple[Dict[str, Any], int]:
+        """
+        Handle batch search requests, with the same body as the batch search route of the sync app.
+
+        Args:
+            request (Dict[str, Any]): Request body.
+
+        Returns:
+            Tuple[Dict[str, Any], int]: Tuple containing the results of each query or the error and an HTTP status code.
+        """
+        try:
+            searches = parse_search_batch(request, self.max_batch_queries)
+        except ValueError as e:
+            return {"error": str(e)}, HTTPStatus.BAD_REQUEST
+
+        try:
+            pages = await self.usecase.search_batch(searches)
+            return {"results": pages}, HTTPStatus.OK
+        except Exception as e:
+            return {"error": str(e)}, HTTPStatus.INTERNAL_SERVER_ERROR
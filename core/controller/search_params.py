@@ -0,0 +1,162 @@
+from typing import Any, Dict, List, Tuple
+
+from core.usecase.vectorizer import (
+    DATE_FILTER_FIELD,
+    DATE_RANGE_OPERATORS,
+    FILTER_FIELDS,
+    FUSIONS,
+    HYBRID_PARAMS,
+    RESULT_FIELDS,
+    SEARCH_MODE_HYBRID,
+    SEARCH_MODES,
+    decode_cursor,
+)
+
+
+def parse_search_request(request: Dict[str, Any]) -> Tuple[str, Dict[str, Any]]:
+    """
+    Validates a search request body, shared by the sync and async controllers.
+
+    Args:
+        request (Dict[str, Any]): Request body.
+
+    Returns:
+        Tuple[str, Dict[str, Any]]: The query text and the keyword arguments for the usecase search.
+
+    Raises:
+        ValueError: If any of the request params is invalid.
+    """
+    query = request.get("q")
+    if not isinstance(query, str) or query.strip() == "":
+        raise ValueError('query param "q" is required')
+
+    k = request.get("k", 10)
+    if not isinstance(k, int) or isinstance(k, bool) or k <= 0:
+        raise ValueError('param "k" must be a positive integer')
+
+    mode = request.get("mode")
+    if mode is not None and mode not in SEARCH_MODES:
+        raise ValueError(f'param "mode" must be one of {list(SEARCH_MODES)}')
+
+    filters = request.get("filters") or {}
+    if not isinstance(filters, dict):
+        raise ValueError('param "filters" must be an object')
+    for field, value in filters.items():
+        if field == DATE_FILTER_FIELD:
+            if not isinstance(value, dict) or not set(value) <= set(
+                DATE_RANGE_OPERATORS
+            ):
+                raise ValueError(
+                    f'filter "{field}" must be an object with any of {list(DATE_RANGE_OPERATORS)}'
+                )
+        elif field in FILTER_FIELDS:
+            values = value if isinstance(value, list) else [value]
+            if not values or not all(isinstance(v, str) for v in values):
+                raise ValueError(
+                    f'filter "{field}" must be a string or a list of strings'
+                )
+        else:
+            raise ValueError(
+                f'unsupported filter "{field}", expected any of {list(FILTER_FIELDS) + [DATE_FILTER_FIELD]}'
+            )
+
+    hybrid = request.get("hybrid")
+    if hybrid is not None:
+        _validate_hybrid(hybrid, mode)
+        # hybrid settings ask for a hybrid search, whatever the configured mode is
+        mode = SEARCH_MODE_HYBRID
+
+    fields = request.get("fields")
+    if fields is not None:
+        if (
+            not isinstance(fields, list)
+            or not fields
+            or not all(field in RESULT_FIELDS for field in fields)
+        ):
+            raise ValueError(
+                f'param "fields" must be a non empty list of any of {list(RESULT_FIELDS)}'
+            )
+
+    cursor = request.get("cursor")
+    if cursor is not None:
+        if not isinstance(cursor, str):
+            raise ValueError('param "cursor" must be a string')
+        decode_cursor(cursor)
+
+    return query, {
+        "k": k,
+        "mode": mode,
+        "filters": filters,
+        "hybrid": hybrid,
+        "fields": fields,
+        "cursor": cursor,
+    }
+
+
+def _validate_hybrid(hybrid: Any, mode: str) -> None:
+    """
+    Validates the hybrid settings of a search request.
+
+    Args:
+        hybrid (Any): The "hybrid" param of the request.
+        mode (str): The requested search mode, None for the configured one.
+
+    Raises:
+        ValueError: If any of the settings is invalid.
+    """
+    if mode is not None and mode != SEARCH_MODE_HYBRID:
+        raise ValueError(f'param "hybrid" requires mode "{SEARCH_MODE_HYBRID}"')
+    if not isinstance(hybrid, dict):
+        raise ValueError('param "hybrid" must be an object')
+    for field, value in hybrid.items():
+        if field in ("lexical_k", "vector_k"):
+            if not isinstance(value, int) or isinstance(value, bool) or value <= 0:
+                raise ValueError(f'hybrid "{field}" must be a positive integer')
+        elif field in ("lexical_weight", "vector_weight"):
+            if (
+                not isinstance(value, (int, float))
+                or isinstance(value, bool)
+                or value < 0
+            ):
+                raise ValueError(f'hybrid "{field}" must be a non negative number')
+        elif field == "fusion":
+            if value not in FUSIONS:
+                raise ValueError(f'hybrid "fusion" must be one of {list(FUSIONS)}')
+        else:
+            raise ValueError(
+                f'unsupported hybrid param "{field}", expected any of {list(HYBRID_PARAMS)}'
+            )
+
+
+def parse_search_batch(
+    request: Dict[str, Any], max_queries: int
+) -> List[Dict[str, Any]]:
+    """
+    Validates a batch search request body, with a "queries" list of search request bodies.
+
+    Args:
+        request (Dict[str, Any]): Request body.
+        max_queries (int): Maximum number of queries in the batch.
+
+    Returns:
+        List[Dict[str, Any]]: The searches for the usecase batch search, each one with its "q" text and params.
+
+    Raises:
+        ValueError: If the batch or any of its queries is invalid.
+    """
+    queries = request.get("queries")
+    if not isinstance(queries, list) or not queries:
+        raise ValueError('param "queries" must be a non empty list')
+    if len(queries) > max_queries:
+        raise ValueError(f"at most {max_queries} queries per request")
+
+    searches = []
+    for i, item in enumerate(queries):
+        if not isinstance(item, dict):
+            raise ValueError(f"queries[{i}]: must be an object")
+        try:
+            query, params = parse_search_request(item)
+        except ValueError as e:
+            raise ValueError(f"queries[{i}]: {e}")
+        searches.append({"q": query, **params})
+    return searches
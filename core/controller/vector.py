@@ -1,3 +1,4 @@
+from concurrent.futures import ThreadPoolExecutor
 from http import HTTPStatus
 from logging import Logger
 from typing import Any, Dict, Tuple
@@ -5,7 +6,10 @@ from typing import Any, Dict, Tuple
 from flask import Response, jsonify
 
 from core.abstracts.controller import AbstractVectorController
+from core.abstracts.services import AbstractJobQueue, QueueFullError
 from core.abstracts.usescases import AbstractVectorizeUsecase
+from core.controller.search_params import parse_search_batch, parse_search_request
+from core.utils.metrics import instrumented
 
 
 class VectorController(AbstractVectorController):
@@ -13,53 +17,228 @@ class VectorController(AbstractVectorController):
     Controller for vectorization operations.
     """
 
-    def __init__(self, usecase: AbstractVectorizeUsecase, logger: Logger):
+    def __init__(
+        self,
+        usecase: AbstractVectorizeUsecase,
+        logger: Logger,
+        max_workers: int = 4,
+        job_queue: AbstractJobQueue = None,
+        max_batch_queries: int = 100,
+    ):
         """
         Initialize the Controller.
 
         Args:
             usecase (AbstractUsecase): An instance of a class implementing the AbstractUsecase interface.
+            max_workers (int, optional): Maximum number of objects vectorized concurrently. Defaults to 4.
+            job_queue (AbstractJobQueue, optional): Queue running asynchronous vectorization jobs.
+            max_batch_queries (int, optional): Maximum number of queries in a batch search. Defaults to 100.
         """
         self.usecase = usecase
         self.logger = logger
+        self.max_workers = max_workers
+        self.job_queue = job_queue
+        self.max_batch_queries = max_batch_queries
 
-    def vectoring(self, request: Dict[str, Any]) -> Tuple[Response, int]:
+    @instrumented("vectorize")
+    def vectoring(
+        self, request: Dict[str, Any], asynchronous: bool = False
+    ) -> Tuple[Response, int]:
         """
         Handle vectorization requests.
 
-        This method expects a POST request with JSON data containing S3 bucket and object key information.
-        It delegates vectorization and indexing tasks to the use case, and returns appropriate responses.
+        This method expects a POST request with an S3 event notification. Every record of the notification is
+        delegated to the use case, up to `max_workers` objects at a time, and the response reports the outcome
+        of each record: 200 when all succeed, 207 when some fail and 500 when all fail.
+
+        When `asynchronous` is set, the records are enqueued as a background job instead and a 202 response
+        with the job id is returned right away, or a 503 if the job queue is full.
 
         Args:
             request (Dict[str, Any]): Request body.
+            asynchronous (bool, optional): Run the vectorization as a background job. Defaults to False.
 
         Returns:
             Tuple[Dict[str, str], int]: Tuple containing a JSON response indicating success or failure of the vectorization process and an HTTP status code.
         """
-        record = request["Records"][0]["s3"]
-        s3_bucket = record["bucket"]["name"]
-        s3_object_key = record["object"]["key"]
+        records = request["Records"]
+        if not records:
+            return (
+                jsonify({"error": "no records to vectorize"}),
+                HTTPStatus.BAD_REQUEST,
+            )
 
-        try:
-            self.usecase.vectorize_and_index(s3_bucket, s3_object_key)
+        if asynchronous:
+            return self._enqueue(records)
+
+        workers = min(self.max_workers, len(records))
+        with ThreadPoolExecutor(max_workers=workers) as executor:
+            results = list(executor.map(self._vectorize_record, records))
+
+        failed = [result for result in results if result["status"] == "failed"]
+        if not failed:
             return (
-                jsonify({"message": "Object vectorization succeeded!"}),
+                jsonify(
+                    {"message": "Object vectorization succeeded!", "results": results}
+                ),
                 HTTPStatus.OK,
             )
-        except Exception as e:
-            self.logger.error(f"Failed to vectorize object {s3_object_key}")
-            return jsonify({"error": str(e)}), HTTPStatus.INTERNAL_SERVER_ERROR
+        if len(failed) == len(results):
+            return (
+                jsonify({"error": failed[0]["error"], "results": results}),
+                HTTPStatus.INTERNAL_SERVER_ERROR,
+            )
+        return (
+            jsonify(
+                {
+                    "message": "Object vectorization partially succeeded",
+                    "results": results,
+                }
+            ),
+            HTTPStatus.MULTI_STATUS,
+        )
 
-    def search(self, request: Dict[str, Any]) -> Tuple[Response, int]:
-        query = request["q"]
-        if query is None or query.strip() == "":
+    def _enqueue(self, records: list) -> Tuple[Response, int]:
+        """
+        Enqueue the objects of S3 event records as a background vectorization job.
+
+        Args:
+            records (list): S3 event notification records.
+
+        Returns:
+            Tuple[Response, int]: Tuple containing a JSON response with the job id and the malformed records
+                left out of the job, and an HTTP status code.
+        """
+        if self.job_queue is None:
+            return (
+                jsonify({"error": "asynchronous vectorization is not enabled"}),
+                HTTPStatus.BAD_REQUEST,
+            )
+        objects = []
+        rejected = []
+        for index, record in enumerate(records):
+            try:
+                bucket, key = _record_object(record)
+            except ValueError as e:
+                rejected.append({"record": index, "status": "failed", "error": str(e)})
+                continue
+            objects.append({"bucket": bucket, "key": key})
+        if not objects:
             return (
-                jsonify({"error": 'query param "q" is required'}),
+                jsonify({"error": rejected[0]["error"], "rejected": rejected}),
                 HTTPStatus.BAD_REQUEST,
             )
+        try:
+            job_id = self.job_queue.submit({"objects": objects}, total=len(objects))
+        except QueueFullError as e:
+            return jsonify({"error": str(e)}), HTTPStatus.SERVICE_UNAVAILABLE
+        return (
+            jsonify(
+                {
+                    "job_id": job_id,
+                    "status_url": f"/v1/api/jobs/{job_id}",
+                    "rejected": rejected,
+                }
+            ),
+            HTTPStatus.ACCEPTED,
+        )
+
+    def job_status(self, job_id: str) -> Tuple[Response, int]:
+        """
+        Report the status, progress and errors of a background vectorization job.
+
+        Args:
+            job_id (str): The job id.
+
+        Returns:
+            Tuple[Response, int]: Tuple containing a JSON response with the job state and an HTTP status code.
+        """
+        job = self.job_queue.get(job_id) if self.job_queue is not None else None
+        if job is None:
+            return jsonify({"error": f"job {job_id} not found"}), HTTPStatus.NOT_FOUND
+        return jsonify(job), HTTPStatus.OK
+
+    def _vectorize_record(self, record: Dict[str, Any]) -> Dict[str, str]:
+        """
+        Vectorize and index the object of a single S3 event record.
+
+        Args:
+            record (Dict[str, Any]): S3 event notification record.
+
+        Returns:
+            Dict[str, str]: The bucket and key of the object, None for a malformed record, the status of the
+                vectorization and the error if it failed.
+        """
+        result = {"bucket": None, "key": None}
+        s3_object_key = None
+        try:
+            s3_bucket, s3_object_key = _record_object(record)
+            result.update(bucket=s3_bucket, key=s3_object_key)
+            self.usecase.vectorize_and_index(s3_bucket, s3_object_key)
+            result["status"] = "succeeded"
+        except Exception as e:
+            self.logger.error(f"Failed to vectorize object {s3_object_key}: {e}")
+            result["status"] = "failed"
+            result["error"] = str(e)
+        return result
+
+    @instrumented("search")
+    def search(self, request: Dict[str, Any]) -> Tuple[Response, int]:
+        try:
+            query, params = parse_search_request(request)
+        except ValueError as e:
+            return jsonify({"error": str(e)}), HTTPStatus.BAD_REQUEST
 
         try:
-            result = self.usecase.search(query)
-            return jsonify({"results": result}), HTTPStatus.OK
+            page = self.usecase.search_page(query, **params)
+            return jsonify(page), HTTPStatus.OK
         except Exception as e:
             return jsonify({"error": str(e)}), HTTPStatus.INTERNAL_SERVER_ERROR
+
+    @instrumented("search_batch")
+    def search_batch(self, request: Dict[str, Any]) -> Tuple[Response, int]:
+        """
+        Handle batch search requests, the body holds a "queries" list of search requests
+        accepted by `search`. The results are returned in the same order as the queries.
+
+        Args:
+            request (Dict[str, Any]): Request body.
+
+        Returns:
+            Tuple[Response, int]: Tuple containing a JSON response with the results of each query and an HTTP status code.
+        """
+        try:
+            searches = parse_search_batch(request, self.max_batch_queries)
+        except ValueError as e:
+            return jsonify({"error": str(e)}), HTTPStatus.BAD_REQUEST
+
+        try:
+            pages = self.usecase.search_batch(searches)
+            return jsonify({"results": pages}), HTTPStatus.OK
+        except Exception as e:
+            return jsonify({"error": str(e)}), HTTPStatus.INTERNAL_SERVER_ERROR
+
+
+def _record_object(record: Dict[str, Any]) -> Tuple[str, str]:
+    """
+    Returns the bucket and key of the object of an S3 event record.
+
+    Args:
+        record (Dict[str, Any]): S3 event notification record.
+
+    Returns:
+        Tuple[str, str]: the bucket name and the object key
+
+    Raises:
+        ValueError: If the record has no bucket name or object key.
+    """
+    try:
+        bucket = record["s3"]["bucket"]["name"]
+        key = record["s3"]["object"]["key"]
+    except (KeyError, TypeError):
+        bucket = key = None
+    if not isinstance(bucket, str) or not isinstance(key, str):
+        raise ValueError(
+            "Malformed S3 event record, s3.bucket.name and s3.object.key are required"
+        )
+    return bucket, key
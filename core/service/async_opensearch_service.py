@@ -0,0 +1,74 @@
+from logging import Logger
+
+from opensearchpy import AsyncOpenSearch
+
+from core.abstracts.services import AbstractAsyncOpensearchService
+from core.service.opensearch_service import build_msearch_body, msearch_hits
+from core.utils import metrics
+
+_SEARCH_SECONDS = metrics.stage("opensearch_search")
+_MSEARCH_SECONDS = metrics.stage("opensearch_msearch")
+
+
+class AsyncOpensearchService(AbstractAsyncOpensearchService):
+    """
+    Service class for Opensearch searches over non-blocking connections. A request waiting on
+    OpenSearch only holds a pooled connection, not a thread.
+    """
+
+    def __init__(self, opensearch_client: AsyncOpenSearch, index: str, logger: Logger):
+        """
+        Initialize AsyncOpensearchService.
+
+        Args:
+            opensearch_client (AsyncOpenSearch): Async Opensearch client
+            index (str): the index to query
+            logger (Logger): Logger instance.
+        """
+        self.client = opensearch_client
+        self.index = index
+        self.logger = logger
+
+    async def search(self, query: dict) -> list:
+        """
+        Performs a query to the configured index
+
+        Args:
+            query (dict): the query to perform
+        Returns:
+            list: a list of dictionaries with the opensearch query document results
+        """
+        try:
+            with _SEARCH_SECONDS.time():
+                response = await self.client.search(index=self.index, body=query)
+            return response["hits"]["hits"]
+        except Exception as e:
+            error_message = f"Error while searching in OpenSearch: {str(e)}"
+            self.logger.error(error_message)
+            raise Exception(error_message)
+
+    async def msearch(self, queries: list) -> list:
+        """
+        Performs several queries to the configured index in a single multi search request
+
+        Args:
+            queries (list): the queries to perform
+        Returns:
+            list: the document results of each query, in order
+        """
+        try:
+            with _MSEARCH_SECONDS.time():
+                response = await self.client.msearch(
+                    body=build_msearch_body(self.index, queries)
+                )
+            return msearch_hits(response)
+        except Exception as e:
+            error_message = f"Error while searching in OpenSearch: {str(e)}"
+            self.logger.error(error_message)
+            raise Exception(error_message)
+
+    async def close(self) -> None:
+        """
+        Closes the pooled connections of the client
+        """
+        await self.client.close()
@@ -0,0 +1,126 @@
+import queue
+import threading
+import time
+from concurrent.futures import Future
+from logging import Logger
+from typing import Callable
+
+from core.utils import metrics
+
+_BATCH_SIZE = metrics.EMBED_DISPATCH_BATCH_SIZE
+_QUEUE_DEPTH = metrics.EMBED_DISPATCH_QUEUE_DEPTH
+
+
+class EmbeddingDispatcher:
+    """
+    Coalesces concurrent embedding requests into batched forward passes. Requests are
+    collected until `max_batch_size` texts are waiting or the oldest one has waited
+    `max_wait_ms`, embedded together and the vectors fanned back out to the callers.
+    """
+
+    def __init__(
+        self,
+        embed_batch: Callable[[list], list],
+        logger: Logger,
+        max_batch_size: int = 32,
+        max_wait_ms: float = 5,
+    ):
+        """
+        Initialize EmbeddingDispatcher.
+
+        Args:
+            embed_batch (Callable[[list], list]): Function embedding a list of texts in a single forward pass.
+            logger (Logger): Logger instance.
+            max_batch_size (int, optional): Maximum number of texts per forward pass. Defaults to 32.
+            max_wait_ms (float, optional): Maximum milliseconds a request waits for others to join its batch. Defaults to 5.
+        """
+        self.embed_batch = embed_batch
+        self.logger = logger
+        self.max_batch_size = max_batch_size
+        self.max_wait = max_wait_ms / 1000
+        self.batches = 0
+        self.items = 0
+        self.batch_sizes = {}
+        self._queue = queue.Queue()
+        self._lock = threading.Lock()
+        self._thread = None
+
+    def embed(self, text: str) -> list:
+        """
+        Embeds a text as part of the next batch, blocking until its vector is ready.
+
+        Args:
+            text (str): Text to vectorize
+
+        Returns:
+            list: a list of float values representing the text vector
+        """
+        self._start()
+        future = Future()
+        _QUEUE_DEPTH.inc()
+        self._queue.put((text, future))
+        return future.result()
+
+    def stats(self) -> dict:
+        """
+        Returns the dispatcher metrics.
+
+        Returns:
+            dict: current queue depth, number of batches and texts embedded, and the number of batches of each size
+        """
+        with self._lock:
+            return {
+                "queue_depth": self._queue.qsize(),
+                "batches": self.batches,
+                "items": self.items,
+                "batch_sizes": dict(self.batch_sizes),
+            }
+
+    def _start(self) -> None:
+        """
+        Starts the dispatching thread on first use, so that it is created in the process
+        serving requests and not in a parent that forks it.
+        """
+        if self._thread is not None:
+            return
+        with self._lock:
+            if self._thread is None:
+                self._thread = threading.Thread(
+                    target=self._run, name="embedding-dispatcher", daemon=True
+                )
+                self._thread.start()
+
+    def _run(self) -> None:
+        """
+        Collects and embeds batches of requests until the process exits.
+        """
+        while True:
+            batch = [self._queue.get()]
+            deadline = time.monotonic() + self.max_wait
+            while len(batch) < self.max_batch_size:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                try:
+                    batch.append(self._queue.get(timeout=remaining))
+                except queue.Empty:
+                    break
+            _QUEUE_DEPTH.dec(len(batch))
+
+            # identical concurrent queries are embedded once
+            texts = list(dict.fromkeys(text for text, _ in batch))
+            try:
+                vectors = dict(zip(texts, self.embed_batch(texts)))
+            except Exception as e:
+                self.logger.error(f"Error while embedding a batch of queries: {e}")
+                for _, future in batch:
+                    future.set_exception(e)
+                continue
+            for text, future in batch:
+                future.set_result(vectors[text])
+
+            _BATCH_SIZE.observe(len(texts))
+            with self._lock:
+                self.batches += 1
+                self.items += len(texts)
+                self.batch_sizes[len(texts)] = self.batch_sizes.get(len(texts), 0) + 1
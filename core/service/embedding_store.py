@@ -0,0 +1,228 @@
+import fcntl
+import hashlib
+import os
+import re
+import threading
+from contextlib import contextmanager
+from logging import Logger
+
+import numpy as np
+
+from core.abstracts.services import AbstractEmbeddingStore
+
+# rows are indexed by the SHA-256 digest of the text
+DIGEST_SIZE = 32
+
+
+class EmbeddingStore(AbstractEmbeddingStore):
+    """
+    Local on-disk embedding cache shared by every process of the node.
+
+    Each model has an append-only `.vec` file of fixed size float32 rows and an append-only
+    `.idx` file with the digest of the text of each row, in the same order. Writers append
+    under an exclusive file lock, vectors first and digests last, so readers never see a
+    digest whose vector is not fully written and can read without locking through a
+    memory map. Rows left by a writer that failed between the two appends are truncated by
+    the next writer. When the store grows over `max_rows`, the newest half of the rows is copied
+    into a new generation of files and the previous generation is removed.
+    """
+
+    def __init__(
+        self,
+        path: str,
+        model_name: str,
+        logger: Logger,
+        dimension: int = 384,
+        max_rows: int = 1_000_000,
+    ):
+        """
+        Initialize EmbeddingStore.
+
+        Args:
+            path (str): Directory holding the store files, created if missing.
+            model_name (str): Name of the embedding model, each model has its own files.
+            logger (Logger): Logger instance.
+            dimension (int, optional): Number of floats per embedding. Defaults to 384.
+            max_rows (int, optional): Number of rows that triggers a compaction. Defaults to 1,000,000.
+        """
+        os.makedirs(path, exist_ok=True)
+        self.prefix = os.path.join(path, re.sub(r"[^A-Za-z0-9_.-]", "_", model_name))
+        self.logger = logger
+        self.dimension = dimension
+        self.max_rows = max_rows
+        self._lock = threading.Lock()
+        self._generation = None
+        self._rows = {}
+        self._vectors = None
+
+    def get_many(self, texts: list) -> dict:
+        """
+        Get the cached embeddings of texts.
+
+        Args:
+            texts (list): Texts to look up.
+
+        Returns:
+            dict: The cached embeddings by text, texts without a cached embedding are left out.
+        """
+        digests = {text: _digest(text) for text in texts}
+        with self._lock:
+            # picks up the rows other processes appended since the last lookup
+            self._refresh()
+            return {
+                text: self._vectors[self._rows[digest]].tolist()
+                for text, digest in digests.items()
+                if digest in self._rows
+            }
+
+    def put_many(self, embeddings: dict) -> None:
+        """
+        Append embeddings to the store.
+
+        Args:
+            embeddings (dict): Embeddings by text.
+        """
+        if not embeddings:
+            return
+        with self._lock, self._file_lock():
+            self._refresh()
+            pending = {}
+            for text, vector in embeddings.items():
+                digest = _digest(text)
+                if digest not in self._rows:
+                    pending[digest] = vector
+            if not pending:
+                return
+            vectors = np.asarray(list(pending.values()), dtype=np.float32)
+            if vectors.shape[1] != self.dimension:
+                raise ValueError(
+                    f"Expected embeddings of dimension {self.dimension}, got {vectors.shape[1]}"
+                )
+            vec_path, idx_path = self._paths(self._generation)
+            # drops the vectors, or the partial digest, of an append that failed half way,
+            # the row of each digest is its position in the .idx file
+            _truncate(vec_path, len(self._rows) * self.dimension * 4)
+            _truncate(idx_path, len(self._rows) * DIGEST_SIZE)
+            # vectors are made durable before their digests become visible to readers
+            with open(vec_path, "ab") as vec_file:
+                vec_file.write(vectors.tobytes())
+                vec_file.flush()
+                os.fsync(vec_file.fileno())
+            with open(idx_path, "ab") as idx_file:
+                idx_file.write(b"".join(pending))
+            self._refresh()
+            if len(self._rows) > self.max_rows:
+                self._compact()
+
+    def _refresh(self) -> None:
+        """
+        Loads the digests appended since the last refresh and remaps the vectors file. Everything
+        is reloaded when another process compacted the store into a new generation.
+        """
+        generation = self._read_generation()
+        if generation != self._generation:
+            self._generation = generation
+            self._rows = {}
+            self._vectors = None
+        vec_path, idx_path = self._paths(self._generation)
+        try:
+            with open(idx_path, "rb") as idx_file:
+                idx_file.seek(len(self._rows) * DIGEST_SIZE)
+                data = idx_file.read()
+        except FileNotFoundError:
+            # nothing written yet, or compacted away since the generation was read
+            return
+        data = data[: len(data) - len(data) % DIGEST_SIZE]
+        if not data:
+            return
+        start = len(self._rows)
+        for i in range(len(data) // DIGEST_SIZE):
+            self._rows[data[i * DIGEST_SIZE : (i + 1) * DIGEST_SIZE]] = start + i
+        self._vectors = np.memmap(
+            vec_path,
+            dtype=np.float32,
+            mode="r",
+            shape=(len(self._rows), self.dimension),
+        )
+
+    def _compact(self) -> None:
+        """
+        Keeps the newest half of the rows in a new generation of files. Must be called with the
+        file lock held.
+        """
+        keep = self.max_rows // 2
+        digests = sorted(self._rows, key=self._rows.get)[-keep:]
+        rows = [self._rows[digest] for digest in digests]
+        generation = self._generation + 1
+        vec_path, idx_path = self._paths(generation)
+        with open(vec_path, "wb") as vec_file:
+            vec_file.write(np.ascontiguousarray(self._vectors[rows]).tobytes())
+            vec_file.flush()
+            os.fsync(vec_file.fileno())
+        with open(idx_path, "wb") as idx_file:
+            idx_file.write(b"".join(digests))
+            idx_file.flush()
+            os.fsync(idx_file.fileno())
+        self._write_generation(generation)
+        # readers still mapping the previous files keep them alive until they refresh
+        for path in self._paths(generation - 1):
+            os.remove(path)
+        self.logger.info(
+            f"Compacted embedding store {self.prefix} from {len(self._rows)} to {len(digests)} rows"
+        )
+        self._refresh()
+
+    def _paths(self, generation: int) -> tuple:
+        """
+        Returns the vectors and digests file paths of a generation.
+        """
+        return f"{self.prefix}.{generation}.vec", f"{self.prefix}.{generation}.idx"
+
+    def _read_generation(self) -> int:
+        """
+        Returns the current generation of the store files.
+        """
+        try:
+            with open(f"{self.prefix}.generation") as generation_file:
+                return int(generation_file.read())
+        except FileNotFoundError:
+            return 0
+
+    def _write_generation(self, generation: int) -> None:
+        """
+        Atomically switches readers to a new generation of the store files.
+        """
+        tmp_path = f"{self.prefix}.generation.tmp"
+        with open(tmp_path, "w") as generation_file:
+            generation_file.write(str(generation))
+        os.replace(tmp_path, f"{self.prefix}.generation")
+
+    @contextmanager
+    def _file_lock(self):
+        """
+        Holds an exclusive lock shared with the other processes writing to the store.
+        """
+        with open(f"{self.prefix}.lock", "a") as lock_file:
+            fcntl.flock(lock_file, fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+
+def _truncate(path: str, size: int) -> None:
+    """
+    Truncates a file to `size` bytes when it is larger
+    """
+    try:
+        if os.path.getsize(path) > size:
+            os.truncate(path, size)
+    except FileNotFoundError:
+        pass
+
+
+def _digest(text: str) -> bytes:
+    """
+    Returns the key of a text in the store
+    """
+    return hashlib.sha256(text.encode("utf-8")).digest()
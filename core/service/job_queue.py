@@ -0,0 +1,439 @@
+import os
+import queue
+import socket
+import threading
+import time
+import uuid
+from collections import deque
+from logging import Logger
+
+from opensearchpy import ConflictError, NotFoundError, OpenSearch
+
+from core.abstracts.services import AbstractJobQueue, JobHandler, QueueFullError
+
+JOB_QUEUED = "queued"
+JOB_RUNNING = "running"
+JOB_SUCCEEDED = "succeeded"
+JOB_FAILED = "failed"
+
+# fields of a job returned by status requests
+_JOB_FIELDS = (
+    "status",
+    "progress",
+    "errors",
+    "created_at",
+    "started_at",
+    "finished_at",
+)
+
+
+class InMemoryJobQueue(AbstractJobQueue):
+    """
+    Bounded job queue served by a pool of background threads of the current process. Jobs and
+    their state are lost on restart and only visible to the process that queued them, so it is
+    only suited to a single worker process.
+    """
+
+    def __init__(
+        self,
+        handler: JobHandler,
+        logger: Logger,
+        workers: int = 2,
+        maxsize: int = 100,
+        history_size: int = 1000,
+    ):
+        """
+        Initialize InMemoryJobQueue.
+
+        Args:
+            handler (JobHandler): Function running a job, called as handler(payload, report_progress).
+                report_progress(done, error) counts one finished work item and its error, if any.
+            logger (Logger): Logger instance.
+            workers (int, optional): Number of jobs run concurrently. Defaults to 2.
+            maxsize (int, optional): Maximum number of jobs waiting to run. Defaults to 100.
+            history_size (int, optional): Number of finished jobs kept for status requests. Defaults to 1000.
+        """
+        self.handler = handler
+        self.logger = logger
+        self.workers = workers
+        self.history_size = history_size
+        self._queue = queue.Queue(maxsize=maxsize)
+        self._jobs = {}
+        self._finished = deque()
+        self._lock = threading.Lock()
+        self._threads = []
+
+    def submit(self, payload: dict, total: int) -> str:
+        """
+        Enqueue a job without blocking.
+
+        Args:
+            payload (dict): JSON serializable job arguments, passed to the job handler.
+            total (int): Number of work items in the job, used to report progress.
+
+        Returns:
+            str: The job id.
+
+        Raises:
+            QueueFullError: If `maxsize` jobs are already waiting.
+        """
+        self.start()
+        job_id = str(uuid.uuid4())
+        job = {
+            "id": job_id,
+            "status": JOB_QUEUED,
+            "progress": {"done": 0, "total": total},
+            "errors": [],
+            "created_at": time.time(),
+            "started_at": None,
+            "finished_at": None,
+        }
+        with self._lock:
+            self._jobs[job_id] = job
+        try:
+            self._queue.put_nowait((job_id, payload))
+        except queue.Full:
+            with self._lock:
+                del self._jobs[job_id]
+            raise QueueFullError("The job queue is full, retry later")
+        return job_id
+
+    def get(self, job_id: str) -> dict:
+        """
+        Get the state of a job.
+
+        Args:
+            job_id (str): The job id.
+
+        Returns:
+            dict: The job status, progress and errors, or None if the job is unknown.
+        """
+        with self._lock:
+            job = self._jobs.get(job_id)
+            if job is None:
+                return None
+            return {
+                **job,
+                "progress": dict(job["progress"]),
+                "errors": list(job["errors"]),
+            }
+
+    def start(self) -> None:
+        """
+        Starts the worker threads, at the latest on first use, so that they are created in the
+        process serving requests and not in a parent that forks it.
+        """
+        with self._lock:
+            if self._threads:
+                return
+            for i in range(self.workers):
+                thread = threading.Thread(
+                    target=self._work, name=f"job-worker-{i}", daemon=True
+                )
+                thread.start()
+                self._threads.append(thread)
+
+    def _work(self) -> None:
+        """
+        Runs queued jobs until the process exits.
+        """
+        while True:
+            job_id, payload = self._queue.get()
+            with self._lock:
+                job = self._jobs[job_id]
+                job["status"] = JOB_RUNNING
+                job["started_at"] = time.time()
+
+            def report_progress(done: int, error: str = None) -> None:
+                with self._lock:
+                    job["progress"]["done"] += done
+                    if error is not None:
+                        job["errors"].append(error)
+
+            try:
+                self.handler(payload, report_progress)
+            except Exception as e:
+                self.logger.error(f"Job {job_id} failed: {e}")
+                report_progress(0, str(e))
+            finally:
+                self._queue.task_done()
+
+            with self._lock:
+                job["status"] = JOB_FAILED if job["errors"] else JOB_SUCCEEDED
+                job["finished_at"] = time.time()
+                self._finished.append(job_id)
+                while len(self._finished) > self.history_size:
+                    self._jobs.pop(self._finished.popleft(), None)
+
+
+class OpensearchJobQueue(AbstractJobQueue):
+    """
+    Job queue stored in an OpenSearch index with a document per job, so that every worker process
+    and replica of the service can run the jobs queued by the others and report their status.
+
+    Jobs are claimed with optimistic concurrency control (if_seq_no and if_primary_term), so a job
+    is only run by the worker which claimed it first. Running jobs send a heartbeat; a job whose
+    heartbeat is older than `lease` seconds, e.g. because its process was restarted, is claimed
+    again and run from the start, up to `max_attempts` times.
+
+    The `maxsize` bound is approximate: submit counts the queued jobs with a count request, which
+    only sees the jobs created before the last refresh of the index and races with the submits of
+    other processes, so a burst of submits can queue a few more jobs than `maxsize`.
+    """
+
+    def __init__(
+        self,
+        handler: JobHandler,
+        opensearch_client: OpenSearch,
+        index: str,
+        logger: Logger,
+        workers: int = 2,
+        maxsize: int = 100,
+        lease: float = 60,
+        poll_interval: float = 1,
+        max_attempts: int = 3,
+    ):
+        """
+        Initialize OpensearchJobQueue.
+
+        Args:
+            handler (JobHandler): Function running a job, called as handler(payload, report_progress).
+                report_progress(done, error) counts one finished work item and its error, if any.
+            opensearch_client (OpenSearch): Opensearch client
+            index (str): the index holding the jobs
+            logger (Logger): Logger instance.
+            workers (int, optional): Number of jobs run concurrently by this process. Defaults to 2.
+            maxsize (int, optional): Approximate maximum number of jobs waiting to run. Defaults to 100.
+            lease (float, optional): Seconds without heartbeat after which a running job is claimed again. Defaults to 60.
+            poll_interval (float, optional): Seconds between two polls of an idle worker. Defaults to 1.
+            max_attempts (int, optional): Number of times a job is claimed before it is failed. Defaults to 3.
+        """
+        self.handler = handler
+        self.client = opensearch_client
+        self.index = index
+        self.logger = logger
+        self.workers = workers
+        self.maxsize = maxsize
+        self.lease = lease
+        self.poll_interval = poll_interval
+        self.max_attempts = max_attempts
+        self.owner = f"{socket.gethostname()}:{os.getpid()}"
+        self._lock = threading.Lock()
+        self._threads = []
+
+    def submit(self, payload: dict, total: int) -> str:
+        """
+        Enqueue a job without blocking.
+
+        Args:
+            payload (dict): JSON serializable job arguments, passed to the job handler.
+            total (int): Number of work items in the job, used to report progress.
+
+        Returns:
+            str: The job id.
+
+        Raises:
+            QueueFullError: If `maxsize` jobs are already waiting, as far as the last refresh of
+                the index tells.
+        """
+        self.start()
+        # not atomic with the create below, concurrent submits can all pass the check
+        queued = self.client.count(
+            index=self.index, body={"query": {"term": {"status": JOB_QUEUED}}}
+        )["count"]
+        if queued >= self.maxsize:
+            raise QueueFullError("The job queue is full, retry later")
+        job_id = str(uuid.uuid4())
+        job = {
+            "status": JOB_QUEUED,
+            "payload": payload,
+            "progress": {"done": 0, "total": total},
+            "errors": [],
+            "attempts": 0,
+            "owner": None,
+            "created_at": time.time(),
+            "started_at": None,
+            "heartbeat_at": None,
+            "finished_at": None,
+        }
+        self.client.create(index=self.index, id=job_id, body=job)
+        return job_id
+
+    def get(self, job_id: str) -> dict:
+        """
+        Get the state of a job.
+
+        Args:
+            job_id (str): The job id.
+
+        Returns:
+            dict: The job status, progress and errors, or None if the job is unknown.
+        """
+        try:
+            job = self.client.get(index=self.index, id=job_id)["_source"]
+        except NotFoundError:
+            return None
+        return {"id": job_id, **{field: job[field] for field in _JOB_FIELDS}}
+
+    def start(self) -> None:
+        """
+        Starts the worker threads polling the index, at the latest on first use, so that they are
+        created in the process serving requests and not in a parent that forks it.
+        """
+        with self._lock:
+            if self._threads:
+                return
+            for i in range(self.workers):
+                thread = threading.Thread(
+                    target=self._work, name=f"job-worker-{i}", daemon=True
+                )
+                thread.start()
+                self._threads.append(thread)
+
+    def _work(self) -> None:
+        """
+        Claims and runs jobs until the process exits.
+        """
+        while True:
+            try:
+                claimed = self._claim()
+            except Exception as e:
+                self.logger.error(f"Failed to claim a job: {e}")
+                claimed = None
+            if claimed is None:
+                time.sleep(self.poll_interval)
+                continue
+            self._run(*claimed)
+
+    def _claim(self) -> tuple:
+        """
+        Claims the oldest job waiting to run, or running without heartbeat for `lease` seconds.
+
+        Returns:
+            tuple: the job id, its document and its version (seq_no, primary_term), or None
+        """
+        stale = time.time() - self.lease
+        response = self.client.search(
+            index=self.index,
+            body={
+                "query": {
+                    "bool": {
+                        "should": [
+                            {"term": {"status": JOB_QUEUED}},
+                            {
+                                "bool": {
+                                    "filter": [
+                                        {"term": {"status": JOB_RUNNING}},
+                                        {"range": {"heartbeat_at": {"lt": stale}}},
+                                    ]
+                                }
+                            },
+                        ],
+                        "minimum_should_match": 1,
+                    }
+                },
+                "sort": [{"created_at": "asc"}],
+                "size": self.workers * 2,
+                "seq_no_primary_term": True,
+            },
+        )
+        for hit in response["hits"]["hits"]:
+            job = hit["_source"]
+            version = (hit["_seq_no"], hit["_primary_term"])
+            now = time.time()
+            if job["attempts"] >= self.max_attempts:
+                job["errors"] = job["errors"] + [
+                    f"Abandoned after {job['attempts']} attempts"
+                ]
+                job.update(status=JOB_FAILED, finished_at=now)
+                self._save(hit["_id"], job, version)
+                continue
+            if job["status"] == JOB_RUNNING:
+                self.logger.warning(
+                    f"Job {hit['_id']} of {job['owner']} has no heartbeat, running it again"
+                )
+            # the job starts over, the progress of a previous attempt is dropped
+            job.update(
+                status=JOB_RUNNING,
+                progress={"done": 0, "total": job["progress"]["total"]},
+                errors=[],
+                attempts=job["attempts"] + 1,
+                owner=self.owner,
+                started_at=now,
+                heartbeat_at=now,
+            )
+            version = self._save(hit["_id"], job, version)
+            if version is not None:
+                return hit["_id"], job, version
+        return None
+
+    def _save(self, job_id: str, job: dict, version: tuple) -> tuple:
+        """
+        Writes a job if it was not changed since it was read at `version`.
+
+        Returns:
+            tuple: the new version of the job, or None when another worker changed it
+        """
+        try:
+            response = self.client.index(
+                index=self.index,
+                id=job_id,
+                body=job,
+                if_seq_no=version[0],
+                if_primary_term=version[1],
+            )
+        except ConflictError:
+            return None
+        return response["_seq_no"], response["_primary_term"]
+
+    def _run(self, job_id: str, job: dict, version: tuple) -> None:
+        """
+        Runs a claimed job, saving its progress and a heartbeat until it finishes.
+        """
+        state = {"version": version}
+        job_lock = threading.Lock()
+        finished = threading.Event()
+
+        def save() -> None:
+            with job_lock:
+                if state["version"] is None:
+                    return
+                job["heartbeat_at"] = time.time()
+                try:
+                    state["version"] = self._save(job_id, job, state["version"])
+                except Exception as e:
+                    # retried with the next heartbeat, the job is only claimed again after the lease
+                    self.logger.error(f"Failed to save job {job_id}: {e}")
+                    return
+                if state["version"] is None:
+                    self.logger.warning(f"Job {job_id} was claimed by another worker")
+
+        def heartbeat() -> None:
+            while not finished.wait(self.lease / 3):
+                save()
+
+        def report_progress(done: int, error: str = None) -> None:
+            with job_lock:
+                job["progress"]["done"] += done
+                if error is not None:
+                    job["errors"].append(error)
+            save()
+
+        heartbeat_thread = threading.Thread(
+            target=heartbeat, name=f"job-heartbeat-{job_id}", daemon=True
+        )
+        heartbeat_thread.start()
+        try:
+            self.handler(job["payload"], report_progress)
+        except Exception as e:
+            self.logger.error(f"Job {job_id} failed: {e}")
+            with job_lock:
+                job["errors"].append(str(e))
+        finally:
+            finished.set()
+            heartbeat_thread.join()
+
+        with job_lock:
+            job["status"] = JOB_FAILED if job["errors"] else JOB_SUCCEEDED
+            job["finished_at"] = time.time()
+        save()
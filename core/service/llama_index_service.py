@@ -1,16 +1,45 @@
+import threading
 from logging import Logger
+from typing import Iterable
 
 from llama_index.core import Document, StorageContext, VectorStoreIndex
 from llama_index.embeddings.huggingface import HuggingFaceEmbedding
 from llama_index.vector_stores.opensearch import OpensearchVectorStore
 
-from core.abstracts.services import AbstractLlamaIndexService
-from core.utils import utils
+from core.abstracts.services import (
+    AbstractEmbeddingStore,
+    AbstractLlamaIndexService,
+    AbstractOpensearchService,
+)
+from core.service.embedding_dispatcher import EmbeddingDispatcher
+from core.utils import metrics, utils
+from core.utils.cache import LRUCache
+from core.utils.quantization import (
+    DATA_TYPE_FLOAT,
+    DATA_TYPES,
+    EMBEDDING_FULL_FIELD,
+    quantize_vector,
+)
 
 # OpenSearchVectorClient stores text in this field by default
 TEXT_FIELD = "content"
 # OpenSearchVectorClient stores embeddings in this field by default
 EMBEDDING_FIELD = "embedding"
+# HuggingFace model used for both documents and queries
+EMBED_MODEL_NAME = "BAAI/bge-small-en-v1.5"
+# documents are written through VectorStoreIndex.from_documents
+INDEX_MODE_LLAMA_INDEX = "llama_index"
+# documents are written straight to OpenSearch with the bulk API
+INDEX_MODE_BULK = "bulk"
+INDEX_MODES = (INDEX_MODE_LLAMA_INDEX, INDEX_MODE_BULK)
+
+_EMBED_SECONDS = metrics.stage("embed")
+_INDEX_SECONDS = metrics.stage("index")
+_QUERY_EMBED_SECONDS = metrics.stage("query_embed")
+_EMBEDDED_TEXTS = metrics.TEXTS.labels(operation="embed")
+_READ_DOCUMENTS = metrics.DOCUMENTS.labels(outcome="read")
+_SKIPPED_DOCUMENTS = metrics.DOCUMENTS.labels(outcome="skipped")
+_INDEXED_DOCUMENTS = metrics.DOCUMENTS.labels(outcome="indexed")
 
 
 class LlamaIndexService(AbstractLlamaIndexService):
@@ -22,6 +51,18 @@ class LlamaIndexService(AbstractLlamaIndexService):
         self,
         vector_store: OpensearchVectorStore,
         logger: Logger,
+        embed_batch_size: int = 64,
+        preprocess_batch_size: int = 256,
+        preprocess_n_process: int = 1,
+        query_cache_size: int = 1024,
+        query_cache_ttl: float = None,
+        index_mode: str = INDEX_MODE_LLAMA_INDEX,
+        opensearch_service: AbstractOpensearchService = None,
+        ingest_batch_size: int = 1000,
+        embedding_store: AbstractEmbeddingStore = None,
+        embed_dispatch_max_batch: int = 1,
+        embed_dispatch_max_wait_ms: float = 5,
+        vector_data_type: str = DATA_TYPE_FLOAT,
     ):
         """
         Initialize the LlamaIndexService.
@@ -29,12 +70,80 @@ class LlamaIndexService(AbstractLlamaIndexService):
         Args:
             vector_store (OpensearchVectorStore): Elasticsearch/Opensearch vector store instance
             logger (Logger): Logger instance.
+            embed_batch_size (int, optional): Number of texts per embedding forward pass. Defaults to 64.
+            preprocess_batch_size (int, optional): Number of texts per SpaCy pipe batch. Defaults to 256.
+            preprocess_n_process (int, optional): Number of SpaCy worker processes. Defaults to 1.
+            query_cache_size (int, optional): Number of query embeddings kept in memory, 0 disables the cache. Defaults to 1024.
+            query_cache_ttl (float, optional): Seconds a cached query embedding stays valid. Defaults to no expiration.
+            index_mode (str, optional): "llama_index" or "bulk". Defaults to "llama_index".
+            opensearch_service (AbstractOpensearchService, optional): Service used to write documents in "bulk" mode.
+            ingest_batch_size (int, optional): Number of documents preprocessed, embedded and written together. Defaults to 1000.
+            embedding_store (AbstractEmbeddingStore, optional): Persistent cache consulted before embedding documents.
+            embed_dispatch_max_batch (int, optional): Maximum number of concurrent query embeddings coalesced into one forward pass, 1 disables coalescing. Defaults to 1.
+            embed_dispatch_max_wait_ms (float, optional): Maximum milliseconds a query embedding waits for others to join its batch. Defaults to 5.
+            vector_data_type (str, optional): Precision of the indexed embeddings, "float", "float16" or "byte". Quantized embeddings require "bulk" mode. Defaults to "float".
         """
+        if index_mode not in INDEX_MODES:
+            raise ValueError(f"Unsupported index mode: {index_mode}")
+        if index_mode == INDEX_MODE_BULK and opensearch_service is None:
+            raise ValueError("An opensearch service is required in bulk index mode")
+        if vector_data_type not in DATA_TYPES:
+            raise ValueError(f"Unsupported vector data type: {vector_data_type}")
+        if vector_data_type != DATA_TYPE_FLOAT and index_mode != INDEX_MODE_BULK:
+            # llama_index writes the embeddings as they come out of the model
+            raise ValueError("Quantized embeddings require the bulk index mode")
         self.logger = logger
 
         self.logger.info("Initializing LlamaIndexService...")
         self.storage_context = StorageContext.from_defaults(vector_store=vector_store)
-        self.embed_model = HuggingFaceEmbedding(model_name="BAAI/bge-small-en-v1.5")
+        self.embed_batch_size = embed_batch_size
+        self._embed_model = None
+        self._embed_model_lock = threading.Lock()
+        self.preprocess_batch_size = preprocess_batch_size
+        self.preprocess_n_process = preprocess_n_process
+        self.index_mode = index_mode
+        self.opensearch_service = opensearch_service
+        self.ingest_batch_size = ingest_batch_size
+        self.embedding_store = embedding_store
+        self.vector_data_type = vector_data_type
+        self.query_cache = LRUCache(maxsize=query_cache_size, ttl=query_cache_ttl)
+        self.embed_dispatcher = None
+        if embed_dispatch_max_batch > 1:
+            self.embed_dispatcher = EmbeddingDispatcher(
+                lambda texts: self.embed_model.get_text_embedding_batch(texts),
+                logger,
+                max_batch_size=embed_dispatch_max_batch,
+                max_wait_ms=embed_dispatch_max_wait_ms,
+            )
+
+    @property
+    def embed_model(self) -> HuggingFaceEmbedding:
+        """
+        The HuggingFace embedding model, loaded on first use.
+        """
+        if self._embed_model is None:
+            with self._embed_model_lock:
+                if self._embed_model is None:
+                    self._embed_model = HuggingFaceEmbedding(
+                        model_name=EMBED_MODEL_NAME,
+                        embed_batch_size=self.embed_batch_size,
+                    )
+        return self._embed_model
+
+    def load_models(self) -> None:
+        """
+        Loads the embedding model and the SpaCy pipeline without running them, so that a
+        preloading parent process can share them copy-on-write with forked workers.
+        """
+        utils.get_nlp()
+        self.embed_model
+
+    def warm_up(self) -> None:
+        """
+        Runs a preprocessing and an embedding inference so that the first request does not
+        pay for lazy initializations.
+        """
+        self.embed_model.get_text_embedding(utils.preprocess_text("warm up"))
 
     def vector_store_index(
         self,
@@ -42,59 +151,219 @@ class LlamaIndexService(AbstractLlamaIndexService):
         source_name: str,
         channelId: str,
         file_uuid: str,
-        documents: list,
+        documents: Iterable[dict],
     ) -> str:
         """
-        Index documents and store vectors in OpenSearch.
+        Index documents and store vectors in OpenSearch. Documents are preprocessed, embedded and
+        written in batches of `ingest_batch_size`, so only one batch is held in memory at a time.
 
         Args:
             twin_id (str): Identifier for the twin.
             source_name (str): Name of the data source.
             channelId (str): Identifier for the channel.
             file_uuid (str): UUID of the file containing the documents.
-            documents (list): list of dictionary representing documents.
+            documents (Iterable[dict]): dictionaries representing documents, a list or a stream.
 
         Returns:
             str: Index summary
         """
-        docs = []
-        for message in documents:
-            # tokenization, lower-casing, and removal of stopwords and punctuation before generating embeddings
-            processed_text = utils.preprocess_text(message["text"])
-            processed_user = utils.preprocess_text(message["user_name"])
-            embed_value = self.embed_model.get_text_embedding(processed_text)
-            docs.append(
-                Document(
-                    text=processed_text,
-                    id=message["created_at"],
-                    metadata={
-                        "raw_text": message["text"],
-                        "user_name": message["user_name"],
-                        "user_id": message["user_id"],
-                        "processed_user": processed_user,
-                        "twin_id": twin_id,
-                        "source_name": source_name,
-                        "file_uuid": file_uuid,
-                        "channelId": channelId,
-                    },
-                    metadata_seperator=":",
-                    embedding=embed_value,
+        indexed = 0
+        skipped = 0
+        # ids of the documents of this file seen in previous batches
+        seen_ids = set()
+        for batch in utils.batched(documents, self.ingest_batch_size):
+            _READ_DOCUMENTS.inc(len(batch))
+            pending = {}
+            for message in batch:
+                doc_id = utils.document_id(
+                    twin_id, source_name, channelId, file_uuid, message
                 )
+                if doc_id not in seen_ids and doc_id not in pending:
+                    pending[doc_id] = message
+            seen_ids.update(pending)
+            skipped += len(batch) - len(pending)
+            if pending and self.opensearch_service is not None:
+                # documents already indexed by a previous delivery of the same object
+                for doc_id in self.opensearch_service.existing_ids(list(pending)):
+                    del pending[doc_id]
+                    skipped += 1
+            if not pending:
+                continue
+
+            records = self._build_records(
+                twin_id, source_name, channelId, file_uuid, pending
             )
-        try:
-            index = VectorStoreIndex.from_documents(
-                documents=docs,
-                storage_context=self.storage_context,
-                embed_model=self.embed_model,
-            )
-            self.logger.info(
-                f"Indexing documents for {twin_id}/{source_name}/{channelId}/{file_uuid}"
+            try:
+                with _INDEX_SECONDS.time():
+                    if self.index_mode == INDEX_MODE_BULK:
+                        written = self._bulk_index(records)
+                    else:
+                        written = self._llama_index(records)
+                indexed += written
+                _INDEXED_DOCUMENTS.inc(written)
+            except Exception as e:
+                message_error = f"Error while indexing documents for {twin_id}/{source_name}/{channelId}/{file_uuid}"
+                self.logger.error(e)
+                raise ValueError(message_error)
+        _SKIPPED_DOCUMENTS.inc(skipped)
+        self.logger.info(
+            f"Indexing documents for {twin_id}/{source_name}/{channelId}/{file_uuid}"
+        )
+        return f"Indexed {indexed} documents, skipped {skipped} duplicated or already indexed for {twin_id}/{source_name}/{channelId}/{file_uuid}"
+
+    def _build_records(
+        self,
+        twin_id: str,
+        source_name: str,
+        channelId: str,
+        file_uuid: str,
+        documents: dict,
+    ) -> list:
+        """
+        Preprocesses and embeds a batch of documents.
+
+        Args:
+            twin_id (str): Identifier for the twin.
+            source_name (str): Name of the data source.
+            channelId (str): Identifier for the channel.
+            file_uuid (str): UUID of the file containing the documents.
+            documents (dict): dictionaries representing documents, by document id.
+
+        Returns:
+            list: (document id, processed text, metadata, embedding) tuples
+        """
+        doc_ids = list(documents)
+        documents = list(documents.values())
+        records = []
+        # tokenization, lower-casing, and removal of stopwords and punctuation before generating embeddings
+        processed_texts = self._preprocess([message["text"] for message in documents])
+        # user names repeat across the whole batch, so each one is processed only once
+        user_names = list({message["user_name"] for message in documents})
+        processed_users = dict(zip(user_names, self._preprocess(user_names)))
+
+        embeddings = self._embed_texts(processed_texts)
+        for doc_id, message, processed_text, embed_value in zip(
+            doc_ids, documents, processed_texts, embeddings
+        ):
+            processed_user = processed_users[message["user_name"]]
+            metadata = {
+                "raw_text": message["text"],
+                "user_name": message["user_name"],
+                "user_id": message["user_id"],
+                "processed_user": processed_user,
+                "twin_id": twin_id,
+                "source_name": source_name,
+                "file_uuid": file_uuid,
+                "channelId": channelId,
+                "created_at": message["created_at"],
+            }
+            records.append((doc_id, processed_text, metadata, embed_value))
+        return records
+
+    def _llama_index(self, records: list) -> int:
+        """
+        Writes the documents through llama_index's vector store.
+
+        Args:
+            records (list): (document id, processed text, metadata, embedding) tuples
+
+        Returns:
+            int: the number of indexed documents
+        """
+        docs = [
+            Document(
+                doc_id=doc_id,
+                text=text,
+                metadata=metadata,
+                metadata_seperator=":",
+                embedding=embedding,
             )
-            return index.summary
-        except Exception as e:
-            message_error = f"Error while indexing documents for {twin_id}/{source_name}/{channelId}/{file_uuid}"
-            self.logger.error(e)
-            raise ValueError(message_error)
+            for doc_id, text, metadata, embedding in records
+        ]
+        VectorStoreIndex.from_documents(
+            documents=docs,
+            storage_context=self.storage_context,
+            embed_model=self.embed_model,
+        )
+        return len(docs)
+
+    def _bulk_index(self, records: list) -> int:
+        """
+        Writes the documents straight to OpenSearch with the same shape llama_index's
+        OpensearchVectorClient produces, skipping node parsing and llama_index's write path.
+        Quantized embeddings are written along with their full precision values.
+
+        Args:
+            records (list): (document id, processed text, metadata, embedding) tuples
+
+        Returns:
+            int: the number of indexed documents
+        """
+        documents = []
+        for doc_id, text, metadata, embedding in records:
+            document = {
+                "_id": doc_id,
+                TEXT_FIELD: text,
+                EMBEDDING_FIELD: quantize_vector(embedding, self.vector_data_type),
+                "metadata": {
+                    **metadata,
+                    "doc_id": doc_id,
+                    "document_id": doc_id,
+                    "ref_doc_id": doc_id,
+                },
+            }
+            if self.vector_data_type != DATA_TYPE_FLOAT:
+                document[EMBEDDING_FULL_FIELD] = embedding
+            documents.append(document)
+        return self.opensearch_service.bulk_index(documents)
+
+    def _preprocess(self, texts: list) -> list:
+        """
+        Preprocesses texts in bulk through the SpaCy pipeline.
+
+        Args:
+            texts (list): Raw texts
+
+        Returns:
+            list: the preprocessed texts, in the same order as `texts`
+        """
+        # identical texts are common (e.g. "This message was deleted."), process each one once
+        unique = list(dict.fromkeys(texts))
+        processed = utils.preprocess_texts(
+            unique,
+            batch_size=self.preprocess_batch_size,
+            n_process=self.preprocess_n_process,
+        )
+        by_text = dict(zip(unique, processed))
+        return [by_text[text] for text in texts]
+
+    def _embed_texts(self, texts: list) -> list:
+        """
+        Embeds texts in batches of `embed_batch_size`, each distinct text only once. Texts found
+        in the embedding store are not embedded again. Texts are sorted by length before batching
+        so that short messages are not padded to the longest one in the batch.
+
+        Args:
+            texts (list): Texts to vectorize
+
+        Returns:
+            list: a list of vectors, in the same order as `texts`
+        """
+        by_text = {}
+        if self.embedding_store is not None:
+            by_text = self.embedding_store.get_many(list(set(texts)))
+        missing = sorted(set(texts) - by_text.keys(), key=len)
+        embedded = {}
+        with _EMBED_SECONDS.time():
+            for start in range(0, len(missing), self.embed_batch_size):
+                batch = missing[start : start + self.embed_batch_size]
+                vectors = self.embed_model.get_text_embedding_batch(batch)
+                embedded.update(zip(batch, vectors))
+        _EMBEDDED_TEXTS.inc(len(missing))
+        if self.embedding_store is not None:
+            self.embedding_store.put_many(embedded)
+        by_text.update(embedded)
+        return [by_text[text] for text in texts]
 
     def vectorize_string(self, text_input: str) -> list:
         """
@@ -106,4 +375,48 @@ class LlamaIndexService(AbstractLlamaIndexService):
         Returns:
             list: a list of float values representing the text_input vector
         """
-        return self.embed_model.get_text_embedding(text_input)
+        # the model is uncased, so queries differing only in case or spacing share an embedding
+        normalized = _normalize_query(text_input)
+        key = (EMBED_MODEL_NAME, normalized)
+        embedding = self.query_cache.get(key)
+        if embedding is None:
+            with _QUERY_EMBED_SECONDS.time():
+                if self.embed_dispatcher is not None:
+                    embedding = self.embed_dispatcher.embed(normalized)
+                else:
+                    embedding = self.embed_model.get_text_embedding(normalized)
+            self.query_cache.set(key, embedding)
+        return embedding
+
+    def vectorize_strings(self, text_inputs: list) -> list:
+        """
+        Retrieves the embedded values (vectors) of several strings, the strings missing from the
+        query cache are embedded in a single batched forward pass
+
+        Args:
+            text_inputs (list): Texts to vectorize
+
+        Returns:
+            list: a vector for each text, in order
+        """
+        normalized = [_normalize_query(text) for text in text_inputs]
+        embeddings = {}
+        for text in normalized:
+            embedding = self.query_cache.get((EMBED_MODEL_NAME, text))
+            if embedding is not None:
+                embeddings[text] = embedding
+        missing = sorted(set(normalized) - embeddings.keys(), key=len)
+        if missing:
+            with _QUERY_EMBED_SECONDS.time():
+                vectors = self.embed_model.get_text_embedding_batch(missing)
+            for text, embedding in zip(missing, vectors):
+                self.query_cache.set((EMBED_MODEL_NAME, text), embedding)
+                embeddings[text] = embedding
+        return [embeddings[text] for text in normalized]
+
+
+def _normalize_query(text: str) -> str:
+    """
+    Collapses whitespace and lower-cases a query
+    """
+    return " ".join(text.split()).lower()
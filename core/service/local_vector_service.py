@@ -0,0 +1,742 @@
+import fcntl
+import json
+import os
+import re
+import threading
+from contextlib import contextmanager
+from logging import Logger
+from typing import Iterator
+
+import numpy as np
+
+from core.abstracts.services import AbstractOpensearchService
+from core.utils import metrics
+from core.utils.quantization import EMBEDDING_FULL_FIELD
+
+# knn_vector field written by LlamaIndexService
+EMBEDDING_FIELD = "embedding"
+# number of IVF lists per square root of the number of rows
+IVF_LISTS_FACTOR = 1
+# spherical k-means iterations when building the IVF lists
+IVF_ITERATIONS = 10
+# the IVF lists are rebuilt once the rows appended since the last build reach this ratio
+IVF_REBUILD_RATIO = 0.5
+
+_SEARCH_SECONDS = metrics.stage("local_search")
+_EXISTING_IDS_SECONDS = metrics.stage("local_existing_ids")
+_BULK_INDEX_SECONDS = metrics.stage("local_bulk_index")
+
+
+class LocalVectorService(AbstractOpensearchService):
+    """
+    In-process vector engine answering the queries built by VectorizerUsecase without a network
+    round trip, for hot twins and for local runs without an OpenSearch cluster.
+
+    The documents of each twin are kept in a directory with a `vectors.f32` file of normalized
+    float32 rows, memory mapped for searching, and a `docs.jsonl` file with the id and _source of
+    each row in the same order. Writers append under an exclusive file lock, vectors first and
+    documents last, so readers in other processes only load fully written rows, and truncate
+    whatever a writer that failed half way left past the last complete document. Deleting
+    documents appends their row numbers to a `deleted.txt` file and leaves the rows in place,
+    masked out of every search and scan. Searches score
+    every candidate with a single matrix product and select the top k with argpartition. Twins
+    with more than `ivf_min_rows` rows are partitioned with k-means, and only the `ivf_probes`
+    lists closest to the query are scored. Paged queries are sorted like in OpenSearch, by score
+    then doc_id, and the following pages are answered here too with their `search_after`.
+    """
+
+    def __init__(
+        self,
+        path: str,
+        logger: Logger,
+        dimension: int = 384,
+        ivf_min_rows: int = 50_000,
+        ivf_probes: int = 8,
+    ):
+        """
+        Initialize LocalVectorService.
+
+        Args:
+            path (str): Directory holding a subdirectory per twin, created if missing.
+            logger (Logger): Logger instance.
+            dimension (int, optional): Number of floats per embedding. Defaults to 384.
+            ivf_min_rows (int, optional): Rows of a twin above which searches go through IVF lists, 0 disables IVF. Defaults to 50,000.
+            ivf_probes (int, optional): IVF lists scored per search. Defaults to 8.
+        """
+        os.makedirs(path, exist_ok=True)
+        self.path = path
+        self.logger = logger
+        self.dimension = dimension
+        self.ivf_min_rows = ivf_min_rows
+        self.ivf_probes = ivf_probes
+        self._lock = threading.Lock()
+        self._shards = {}
+
+    def search(self, query: dict) -> list:
+        """
+        Runs a knn or script_score query built by VectorizerUsecase
+
+        Args:
+            query (dict): the query to perform
+        Returns:
+            list: the hits, best first, shaped like OpenSearch hits
+        """
+        with _SEARCH_SECONDS.time():
+            vector, k, filters, exact = _parse_vector_query(query)
+            vector = np.asarray(vector, dtype=np.float32)
+            vector /= np.linalg.norm(vector) or 1.0
+            size = query.get("size", k)
+            sort = "sort" in query
+
+            candidates = []
+            for shard in self._select_shards(filters):
+                candidates.extend(
+                    shard.search(
+                        vector,
+                        size,
+                        filters,
+                        self.ivf_probes,
+                        exact=exact,
+                        sort=sort,
+                        after=query.get("search_after"),
+                    )
+                )
+            if sort:
+                # the order of the paged queries, the doc_id breaks score ties
+                candidates.sort(
+                    key=lambda candidate: (-candidate[0], _candidate_doc_id(candidate))
+                )
+            else:
+                candidates.sort(key=lambda candidate: candidate[0], reverse=True)
+
+            source_filter = query.get("_source", {})
+            hits = []
+            for cosine, shard, row in candidates[:size]:
+                source = _project_source(
+                    shard.sources[row],
+                    source_filter.get("includes"),
+                    source_filter.get("excludes", []),
+                )
+                score = _score(cosine, exact)
+                hit = {"_id": shard.ids[row], "_score": score, "_source": source}
+                if sort:
+                    hit["sort"] = [score, _candidate_doc_id((cosine, shard, row))]
+                hits.append(hit)
+            return hits
+
+    def msearch(self, queries: list) -> list:
+        """
+        Runs several queries one after the other
+
+        Args:
+            queries (list): the queries to perform
+        Returns:
+            list: the hits of each query, in order
+        """
+        return [self.search(query) for query in queries]
+
+    def existing_ids(self, ids: list) -> set:
+        """
+        Finds which documents are already indexed in any twin
+
+        Args:
+            ids (list): document ids to look up
+        Returns:
+            set: the ids of the documents already present
+        """
+        with _EXISTING_IDS_SECONDS.time():
+            found = set()
+            for shard in self._all_shards():
+                shard.refresh()
+                found.update(doc_id for doc_id in ids if doc_id in shard.rows)
+            return found
+
+    def bulk_index(self, documents: list) -> int:
+        """
+        Appends documents to the files of their twin. Document ids are content hashes, so
+        documents already present are skipped instead of overwritten.
+
+        Args:
+            documents (list): documents to index, each one with its "_id", embedding and metadata.twin_id
+        Returns:
+            int: the number of documents received
+        """
+        with _BULK_INDEX_SECONDS.time():
+            by_twin = {}
+            for document in documents:
+                by_twin.setdefault(document["metadata"]["twin_id"], []).append(document)
+            for twin_id, twin_documents in by_twin.items():
+                self._shard(twin_id).append(twin_documents)
+            return len(documents)
+
+    def scan(self, query: dict) -> Iterator[dict]:
+        """
+        Iterates over every document matching the filter clauses of a bool query
+
+        Args:
+            query (dict): a query with an optional {"bool": {"filter": [...]}} clause
+        Returns:
+            Iterator[dict]: the matching hits, without their embedding
+        """
+        filters = query.get("query", {}).get("bool", {}).get("filter", [])
+        for shard in self._select_shards(filters):
+            for row in shard.matching_rows(filters):
+                yield {"_id": shard.ids[row], "_source": shard.sources[row]}
+
+    def count(self, twin_id: str) -> int:
+        """
+        Returns the number of documents indexed for a twin
+
+        Args:
+            twin_id (str): Identifier for the twin.
+        Returns:
+            int: the number of documents
+        """
+        shard = self._shard(twin_id)
+        shard.refresh()
+        return len(shard.rows)
+
+    def delete_ids(self, ids: list) -> int:
+        """
+        Deletes documents from every twin, matched on their metadata.doc_id like in OpenSearch
+
+        Args:
+            ids (list): document ids to delete
+        Returns:
+            int: the number of deleted documents
+        """
+        return sum(shard.delete(ids) for shard in self._all_shards())
+
+    def _select_shards(self, filters: list) -> list:
+        """
+        Returns the refreshed shards of the twins a query is restricted to, every twin otherwise
+        """
+        twin_ids = filter_values(filters, "twin_id")
+        shards = (
+            self._all_shards()
+            if twin_ids is None
+            else [self._shard(twin_id) for twin_id in twin_ids]
+        )
+        for shard in shards:
+            shard.refresh()
+        return shards
+
+    def _all_shards(self) -> list:
+        """
+        Returns the shards of every twin written to the directory, by any process
+        """
+        names = [
+            name
+            for name in os.listdir(self.path)
+            if os.path.isdir(os.path.join(self.path, name))
+        ]
+        with self._lock:
+            return [self._shard_by_name(name) for name in names]
+
+    def _shard(self, twin_id: str) -> "_Shard":
+        """
+        Returns the shard of a twin
+        """
+        with self._lock:
+            return self._shard_by_name(re.sub(r"[^A-Za-z0-9_.-]", "_", twin_id))
+
+    def _shard_by_name(self, name: str) -> "_Shard":
+        """
+        Returns the shard stored in a subdirectory, must be called with the lock held
+        """
+        shard = self._shards.get(name)
+        if shard is None:
+            shard = _Shard(
+                os.path.join(self.path, name),
+                self.dimension,
+                self.ivf_min_rows,
+                self.logger,
+            )
+            self._shards[name] = shard
+        return shard
+
+
+class _Shard:
+    """
+    Documents and normalized embeddings of a single twin.
+    """
+
+    def __init__(self, path: str, dimension: int, ivf_min_rows: int, logger: Logger):
+        self.path = path
+        self.dimension = dimension
+        self.ivf_min_rows = ivf_min_rows
+        self.logger = logger
+        self.ids = []
+        self.rows = {}
+        self.sources = []
+        self.vectors = np.empty((0, dimension), dtype=np.float32)
+        self._docs_offset = 0
+        self._deleted_offset = 0
+        self._deleted = set()
+        self._live = None
+        self._columns = {}
+        self._ivf = None
+        self._lock = threading.Lock()
+
+    @property
+    def vectors_path(self) -> str:
+        return os.path.join(self.path, "vectors.f32")
+
+    @property
+    def docs_path(self) -> str:
+        return os.path.join(self.path, "docs.jsonl")
+
+    @property
+    def deleted_path(self) -> str:
+        return os.path.join(self.path, "deleted.txt")
+
+    def refresh(self) -> None:
+        """
+        Loads the documents appended since the last refresh, by this or another process
+        """
+        with self._lock:
+            self._refresh()
+
+    def _refresh(self) -> None:
+        # deletions are read first, they only refer to rows written before them
+        deleted, self._deleted_offset = _read_lines(
+            self.deleted_path, self._deleted_offset
+        )
+        lines, self._docs_offset = _read_lines(self.docs_path, self._docs_offset)
+        for line in lines:
+            document = json.loads(line)
+            self.rows[document["_id"]] = len(self.ids)
+            self.ids.append(document["_id"])
+            self.sources.append(document["_source"])
+        for line in deleted:
+            row = int(line)
+            self._deleted.add(row)
+            if self.rows.get(self.ids[row]) == row:
+                del self.rows[self.ids[row]]
+        if lines or deleted:
+            self._columns = {}
+            self._live = None
+        if lines:
+            self.vectors = np.memmap(
+                self.vectors_path,
+                dtype=np.float32,
+                mode="r",
+                shape=(len(self.ids), self.dimension),
+            )
+
+    def append(self, documents: list) -> None:
+        """
+        Appends the documents missing from the shard
+        """
+        os.makedirs(self.path, exist_ok=True)
+        with self._lock, self._file_lock():
+            self._refresh()
+            pending = {}
+            for document in documents:
+                if document["_id"] not in self.rows:
+                    pending[document["_id"]] = document
+            if not pending:
+                return
+            vectors = np.asarray(
+                [
+                    # quantized documents keep their full precision embedding aside
+                    document.get(EMBEDDING_FULL_FIELD, document.get(EMBEDDING_FIELD))
+                    for document in pending.values()
+                ],
+                dtype=np.float32,
+            )
+            if vectors.shape[1] != self.dimension:
+                raise ValueError(
+                    f"Expected embeddings of dimension {self.dimension}, got {vectors.shape[1]}"
+                )
+            norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+            vectors /= np.where(norms == 0, 1, norms)
+            lines = []
+            for doc_id, document in pending.items():
+                source = {
+                    key: value
+                    for key, value in document.items()
+                    if key not in ("_id", EMBEDDING_FIELD, EMBEDDING_FULL_FIELD)
+                }
+                lines.append(json.dumps({"_id": doc_id, "_source": source}) + "\n")
+            # a row only exists once its line of docs.jsonl is complete: the vectors, or the
+            # partial line, of an append that failed half way would shift the following rows
+            _truncate(self.vectors_path, len(self.ids) * self.dimension * 4)
+            _truncate(self.docs_path, self._docs_offset)
+            with open(self.vectors_path, "ab") as vectors_file:
+                vectors_file.write(vectors.tobytes())
+                vectors_file.flush()
+                os.fsync(vectors_file.fileno())
+            with open(self.docs_path, "a") as docs_file:
+                docs_file.write("".join(lines))
+            self._refresh()
+
+    def delete(self, ids: list) -> int:
+        """
+        Marks the rows of the documents whose metadata.doc_id is in ids as deleted
+        """
+        with self._lock, self._file_lock():
+            self._refresh()
+            if not self.ids:
+                return 0
+            matches = np.isin(self._column("doc_id"), list(ids))
+            live = self._live_mask()
+            if live is not None:
+                matches &= live
+            rows = np.flatnonzero(matches).tolist()
+            if rows:
+                with open(self.deleted_path, "a") as deleted_file:
+                    deleted_file.write("".join(f"{row}\n" for row in rows))
+                self._refresh()
+            return len(rows)
+
+    def search(
+        self,
+        vector: np.ndarray,
+        k: int,
+        filters: list,
+        probes: int,
+        exact: bool = False,
+        sort: bool = False,
+        after: list = None,
+    ) -> list:
+        """
+        Returns the k best (cosine, shard, row) candidates of the shard. When `sort` is set,
+        score ties at the k-th candidate are broken by doc_id, and `after` restricts the
+        candidates to those ranked after the [score, doc_id] sort values of a previous page.
+        """
+        with self._lock:
+            vectors = self.vectors
+            mask = self._filter_mask(filters)
+            rows = self._ivf_rows(vector, probes)
+            sort_ids = self._sort_ids() if sort or after is not None else None
+        if rows is None:
+            scores = vectors @ vector
+            rows = np.arange(len(scores))
+        else:
+            if mask is not None:
+                rows = rows[mask[rows]]
+                mask = None
+            scores = vectors[rows] @ vector
+        if after is not None:
+            after_score, after_id = after
+            row_scores = _score(scores.astype(np.float64), exact)
+            later = (row_scores < after_score) | (
+                (row_scores == after_score) & (sort_ids[rows] > after_id)
+            )
+            mask = later if mask is None else mask & later
+        if mask is not None:
+            scores = np.where(mask, scores, -np.inf)
+        if len(rows) == 0:
+            return []
+        k = min(k, len(rows))
+        top = np.argpartition(-scores, k - 1)[:k]
+        if sort:
+            boundary = scores[top].min()
+            if boundary != -np.inf:
+                # every candidate tied with the k-th one competes on its doc_id
+                top = np.flatnonzero(scores >= boundary)
+            top = sorted(top, key=lambda i: (-scores[i], sort_ids[rows[i]]))[:k]
+        return [
+            (float(scores[i]), self, int(rows[i])) for i in top if scores[i] != -np.inf
+        ]
+
+    def matching_rows(self, filters: list) -> list:
+        """
+        Returns the rows matching the filter clauses
+        """
+        with self._lock:
+            mask = self._filter_mask(filters)
+            if mask is None:
+                return list(range(len(self.ids)))
+            return np.flatnonzero(mask).tolist()
+
+    def _filter_mask(self, filters: list) -> np.ndarray:
+        """
+        Evaluates the term, terms, range and exists filter clauses over the rows of the shard,
+        deleted rows never match. Must be called with the lock held.
+
+        Returns:
+            np.ndarray: a boolean mask of the matching rows, None when nothing is filtered
+        """
+        mask = None
+        for clause in filters:
+            ((kind, condition),) = clause.items()
+            if kind == "exists":
+                path, value = condition["field"], None
+            else:
+                ((path, value),) = condition.items()
+            field = _metadata_field(path)
+            if kind in ("term", "terms") and field == "twin_id":
+                # shards are already selected by twin
+                continue
+            if kind == "term":
+                matches = self._column(field) == value
+            elif kind == "terms":
+                matches = np.isin(self._column(field), value)
+            elif kind == "range":
+                dates = self._column(field, dates=True)
+                matches = ~np.isnat(dates)
+                operators = {
+                    "gt": np.greater,
+                    "gte": np.greater_equal,
+                    "lt": np.less,
+                    "lte": np.less_equal,
+                }
+                for operator, bound in value.items():
+                    matches &= operators[operator](dates, _to_datetime([bound])[0])
+            elif kind == "exists":
+                matches = np.array(
+                    [value is not None for value in self._column(field)], dtype=bool
+                )
+            else:
+                raise ValueError(f"Unsupported filter clause: {kind}")
+            mask = matches if mask is None else mask & matches
+        live = self._live_mask()
+        if live is not None:
+            mask = live if mask is None else mask & live
+        return mask
+
+    def _live_mask(self) -> np.ndarray:
+        """
+        Returns a boolean mask of the rows not deleted, None when no row is deleted. Must be
+        called with the lock held.
+        """
+        if not self._deleted:
+            return None
+        if self._live is None:
+            self._live = np.ones(len(self.ids), dtype=bool)
+            self._live[list(self._deleted)] = False
+        return self._live
+
+    def _column(self, field: str, dates: bool = False) -> np.ndarray:
+        """
+        Returns the values of a metadata field for every row, parsed as datetimes when `dates` is
+        set. Must be called with the lock held.
+        """
+        column = self._columns.get((field, dates))
+        if column is None:
+            values = [source["metadata"].get(field) for source in self.sources]
+            column = _to_datetime(values) if dates else np.array(values, dtype=object)
+            self._columns[(field, dates)] = column
+        return column
+
+    def _sort_ids(self) -> np.ndarray:
+        """
+        Returns the doc_id paged queries are sorted on for every row, the row id when missing.
+        Must be called with the lock held.
+        """
+        column = self._columns.get(("doc_id", "sort"))
+        if column is None:
+            column = np.array(
+                [
+                    source["metadata"].get("doc_id") or doc_id
+                    for doc_id, source in zip(self.ids, self.sources)
+                ],
+                dtype=object,
+            )
+            self._columns[("doc_id", "sort")] = column
+        return column
+
+    def _ivf_rows(self, vector: np.ndarray, probes: int) -> np.ndarray:
+        """
+        Returns the rows of the IVF lists closest to the vector and the rows appended since the
+        lists were built, None when the shard is too small to be partitioned. Must be called with
+        the lock held.
+        """
+        count = len(self.ids)
+        if not self.ivf_min_rows or count < self.ivf_min_rows:
+            return None
+        if self._ivf is None or count - self._ivf[2] > self._ivf[2] * IVF_REBUILD_RATIO:
+            self._ivf = _build_ivf(self.vectors, self.logger)
+        centroids, lists, built_rows = self._ivf
+        probes = min(probes, len(centroids))
+        closest = np.argpartition(-(centroids @ vector), probes - 1)[:probes]
+        return np.concatenate(
+            [lists[c] for c in closest] + [np.arange(built_rows, count)]
+        )
+
+    @contextmanager
+    def _file_lock(self):
+        """
+        Holds an exclusive lock shared with the other processes writing to the shard.
+        """
+        with open(os.path.join(self.path, ".lock"), "a") as lock_file:
+            fcntl.flock(lock_file, fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+
+def _read_lines(path: str, offset: int) -> tuple:
+    """
+    Reads the complete lines appended to a file since offset, a line still being written is
+    read by a later call
+
+    Returns:
+        tuple: the lines and the offset following them
+    """
+    try:
+        with open(path, "rb") as file:
+            file.seek(offset)
+            data = file.read()
+    except FileNotFoundError:
+        return [], offset
+    end = data.rfind(b"\n") + 1
+    return data[:end].splitlines(), offset + end
+
+
+def filter_values(filters: list, field: str) -> list:
+    """
+    Returns the values a metadata field is restricted to by term or terms filter clauses
+    Args:
+        filters (list): OpenSearch filter clauses
+        field (str): the metadata field
+    Returns:
+        list: the allowed values, None when the field is not filtered
+    """
+    for clause in filters:
+        for kind in ("term", "terms"):
+            condition = clause.get(kind)
+            if condition is None:
+                continue
+            ((path, value),) = condition.items()
+            if _metadata_field(path) == field:
+                return value if isinstance(value, list) else [value]
+    return None
+
+
+def vector_query_filters(query: dict) -> list:
+    """
+    Returns the filter clauses of a query LocalVectorService can answer
+    Args:
+        query (dict): an OpenSearch query
+    Returns:
+        list: the filter clauses of a knn or script_score query built by VectorizerUsecase, None
+            for any other query
+    """
+    try:
+        return _parse_vector_query(query)[2]
+    except (KeyError, TypeError, ValueError):
+        return None
+
+
+def _parse_vector_query(query: dict) -> tuple:
+    """
+    Extracts the query vector, k, filter clauses and whether the score is the exact
+    script_score one from a query built by VectorizerUsecase
+    """
+    body = query["query"]
+    if "knn" in body:
+        (knn,) = body["knn"].values()
+        filters = knn.get("filter", {}).get("bool", {}).get("filter", [])
+        return knn["vector"], knn["k"], filters, False
+    if "script_score" in body:
+        script_score = body["script_score"]
+        filters = script_score["query"].get("bool", {}).get("filter", [])
+        vector = script_score["script"]["params"]["query_vector"]
+        return vector, query.get("size", 10), filters, True
+    raise ValueError(f"Unsupported query: {list(body)}")
+
+
+def _score(cosine, exact: bool):
+    """
+    Converts cosine similarities to the scale of the script_score query when `exact` is set, to
+    the one of the knn cosinesimil score otherwise
+    """
+    return cosine + 1.0 if exact else (1.0 + cosine) / 2.0
+
+
+def _truncate(path: str, size: int) -> None:
+    """
+    Truncates a file to `size` bytes when it is larger
+    """
+    try:
+        if os.path.getsize(path) > size:
+            os.truncate(path, size)
+    except FileNotFoundError:
+        pass
+
+
+def _candidate_doc_id(candidate: tuple) -> str:
+    """
+    Returns the metadata.doc_id of a (cosine, shard, row) candidate
+    """
+    _, shard, row = candidate
+    return shard.sources[row]["metadata"].get("doc_id") or shard.ids[row]
+
+
+def _project_source(source: dict, includes: list, excludes: list) -> dict:
+    """
+    Applies the `_source` includes and excludes of a query, top level fields or metadata.* paths
+    """
+    if includes is not None:
+        metadata = source.get("metadata", {})
+        projected = {}
+        for path in includes:
+            if path.startswith("metadata."):
+                field = path.removeprefix("metadata.")
+                if field in metadata:
+                    projected.setdefault("metadata", {})[field] = metadata[field]
+            elif path in source:
+                projected[path] = source[path]
+        source = projected
+    return {key: value for key, value in source.items() if key not in excludes}
+
+
+def _metadata_field(path: str) -> str:
+    """
+    Returns the metadata field of a filter path such as metadata.twin_id.keyword
+    """
+    field = path.removeprefix("metadata.")
+    return field.removesuffix(".keyword")
+
+
+def _to_datetime(values) -> np.ndarray:
+    """
+    Parses ISO 8601 dates, values that are not dates become NaT
+    """
+    parsed = []
+    for value in values:
+        try:
+            parsed.append(np.datetime64(str(value).removesuffix("Z"), "ms"))
+        except ValueError:
+            parsed.append(np.datetime64("NaT", "ms"))
+    return np.array(parsed, dtype="datetime64[ms]")
+
+
+def _build_ivf(vectors: np.ndarray, logger: Logger) -> tuple:
+    """
+    Partitions the rows with spherical k-means
+
+    Returns:
+        tuple: the normalized centroids, the rows of each list and the number of partitioned rows
+    """
+    count = len(vectors)
+    n_lists = max(1, int(IVF_LISTS_FACTOR * np.sqrt(count)))
+    rng = np.random.default_rng(0)
+    sample = np.asarray(
+        vectors[np.sort(rng.choice(count, min(count, n_lists * 40), replace=False))]
+    )
+    centroids = sample[rng.choice(len(sample), n_lists, replace=False)].copy()
+    for _ in range(IVF_ITERATIONS):
+        assignments = np.argmax(sample @ centroids.T, axis=1)
+        sums = np.zeros_like(centroids)
+        np.add.at(sums, assignments, sample)
+        norms = np.linalg.norm(sums, axis=1, keepdims=True)
+        # empty lists keep their previous centroid
+        centroids = np.where(
+            norms > 0, sums / np.where(norms == 0, 1, norms), centroids
+        )
+    assignments = np.concatenate(
+        [
+            np.argmax(np.asarray(vectors[start : start + 65536]) @ centroids.T, axis=1)
+            for start in range(0, count, 65536)
+        ]
+    )
+    order = np.argsort(assignments, kind="stable")
+    bounds = np.cumsum(np.bincount(assignments, minlength=n_lists))[:-1]
+    lists = np.split(order, bounds)
+    logger.info(f"Built {n_lists} IVF lists over {count} rows")
+    return centroids, lists, count
@@ -0,0 +1,66 @@
+from logging import Logger
+
+from opensearchpy import NotFoundError, OpenSearch
+
+from core.abstracts.services import AbstractManifestStore
+from core.utils import metrics
+
+_MANIFEST_GET_SECONDS = metrics.stage("manifest_get")
+_MANIFEST_PUT_SECONDS = metrics.stage("manifest_put")
+
+
+class OpensearchManifestStore(AbstractManifestStore):
+    """
+    Manifests of ingested S3 objects, stored in their own OpenSearch index with a document per
+    object, so that every replica of the service shares them.
+    """
+
+    def __init__(self, opensearch_client: OpenSearch, index: str, logger: Logger):
+        """
+        Initialize OpensearchManifestStore.
+
+        Args:
+            opensearch_client (OpenSearch): Opensearch client
+            index (str): the index holding the manifests
+            logger (Logger): Logger instance.
+        """
+        self.client = opensearch_client
+        self.index = index
+        self.logger = logger
+
+    def get(self, key: str) -> dict:
+        """
+        Get the manifest of an object.
+
+        Args:
+            key (str): Bucket and key of the object
+
+        Returns:
+            dict: the "etag" and "doc_ids" of the object when it was last ingested, or None
+        """
+        try:
+            with _MANIFEST_GET_SECONDS.time():
+                response = self.client.get(index=self.index, id=key)
+            return response["_source"]
+        except NotFoundError:
+            return None
+        except Exception as e:
+            error_message = f"Error while reading the manifest of {key}: {str(e)}"
+            self.logger.error(error_message)
+            raise Exception(error_message)
+
+    def put(self, key: str, manifest: dict) -> None:
+        """
+        Save the manifest of an object, replacing the previous one.
+
+        Args:
+            key (str): Bucket and key of the object
+            manifest (dict): the "etag" and "doc_ids" of the ingested object
+        """
+        try:
+            with _MANIFEST_PUT_SECONDS.time():
+                self.client.index(index=self.index, id=key, body=manifest)
+        except Exception as e:
+            error_message = f"Error while saving the manifest of {key}: {str(e)}"
+            self.logger.error(error_message)
+            raise Exception(error_message)
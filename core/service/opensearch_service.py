@@ -1,8 +1,22 @@
+import time
 from logging import Logger
+from typing import Iterator
 
-from opensearchpy import OpenSearch
+from opensearchpy import OpenSearch, helpers
 
 from core.abstracts.services import AbstractOpensearchService
+from core.utils import metrics, utils
+
+# status returned by OpenSearch when its write queues are full
+TOO_MANY_REQUESTS = 429
+# ids per delete by query, below the default index.max_terms_count
+DELETE_BATCH_SIZE = 10_000
+
+_SEARCH_SECONDS = metrics.stage("opensearch_search")
+_MSEARCH_SECONDS = metrics.stage("opensearch_msearch")
+_EXISTING_IDS_SECONDS = metrics.stage("opensearch_existing_ids")
+_BULK_INDEX_SECONDS = metrics.stage("opensearch_bulk_index")
+_DELETE_SECONDS = metrics.stage("opensearch_delete")
 
 
 class OpensearchService(AbstractOpensearchService):
@@ -10,7 +24,17 @@ class OpensearchService(AbstractOpensearchService):
     Service class for Opensearch operations.
     """
 
-    def __init__(self, opensearch_client: OpenSearch, index: str, logger: Logger):
+    def __init__(
+        self,
+        opensearch_client: OpenSearch,
+        index: str,
+        logger: Logger,
+        bulk_chunk_size: int = 500,
+        bulk_thread_count: int = 4,
+        bulk_max_chunk_bytes: int = 10 * 1024 * 1024,
+        bulk_max_retries: int = 3,
+        bulk_initial_backoff: float = 2,
+    ):
         """
         Initialize OpenSearch.
 
@@ -18,10 +42,20 @@ class OpensearchService(AbstractOpensearchService):
             opensearch_client (OpenSearch): Opensearch client
             index (str): the index to query
             logger (Logger): Logger instance.
+            bulk_chunk_size (int, optional): documents per bulk request. Defaults to 500.
+            bulk_thread_count (int, optional): threads sending bulk requests in parallel. Defaults to 4.
+            bulk_max_chunk_bytes (int, optional): maximum size of a bulk request in bytes. Defaults to 10MB.
+            bulk_max_retries (int, optional): times documents rejected with a 429 are retried. Defaults to 3.
+            bulk_initial_backoff (float, optional): seconds to wait before the first retry, doubled on each retry. Defaults to 2.
         """
         self.client = opensearch_client
         self.index = index
         self.logger = logger
+        self.bulk_chunk_size = bulk_chunk_size
+        self.bulk_thread_count = bulk_thread_count
+        self.bulk_max_chunk_bytes = bulk_max_chunk_bytes
+        self.bulk_max_retries = bulk_max_retries
+        self.bulk_initial_backoff = bulk_initial_backoff
 
     def search(self, query: dict) -> list:
         """
@@ -33,9 +67,203 @@ class OpensearchService(AbstractOpensearchService):
             list: a list of dictionaries with the opensearch query document results
         """
         try:
-            response = self.client.search(index=self.index, body=query)
+            with _SEARCH_SECONDS.time():
+                response = self.client.search(index=self.index, body=query)
             return response["hits"]["hits"]
         except Exception as e:
             error_message = f"Error while searching in OpenSearch: {str(e)}"
             self.logger.error(error_message)
             raise Exception(error_message)
+
+    def msearch(self, queries: list) -> list:
+        """
+        Performs several queries to the configured index in a single multi search request
+
+        Args:
+            queries (list): the queries to perform
+        Returns:
+            list: the document results of each query, in order
+        """
+        try:
+            with _MSEARCH_SECONDS.time():
+                response = self.client.msearch(
+                    body=build_msearch_body(self.index, queries)
+                )
+            return msearch_hits(response)
+        except Exception as e:
+            error_message = f"Error while searching in OpenSearch: {str(e)}"
+            self.logger.error(error_message)
+            raise Exception(error_message)
+
+    def existing_ids(self, ids: list) -> set:
+        """
+        Finds which documents are already indexed. Documents written through llama_index are
+        stored under random node ids, so they are matched on their metadata.doc_id instead.
+
+        Args:
+            ids (list): document ids to look up
+        Returns:
+            set: the ids of the documents already present in the index
+        """
+        query = {
+            "size": 0,
+            "query": {"terms": {"metadata.doc_id.keyword": ids}},
+            "aggs": {
+                "doc_ids": {
+                    "terms": {"field": "metadata.doc_id.keyword", "size": len(ids)}
+                }
+            },
+        }
+        try:
+            with _EXISTING_IDS_SECONDS.time():
+                response = self.client.search(index=self.index, body=query)
+            buckets = response["aggregations"]["doc_ids"]["buckets"]
+            return {bucket["key"] for bucket in buckets}
+        except Exception as e:
+            error_message = f"Error while looking up documents in OpenSearch: {str(e)}"
+            self.logger.error(error_message)
+            raise Exception(error_message)
+
+    def bulk_index(self, documents: list) -> int:
+        """
+        Writes documents to the configured index with parallel bulk requests. Documents rejected
+        because the cluster is overloaded (429) are retried with exponential backoff.
+
+        Args:
+            documents (list): documents to index, each one with its "_id"
+        Returns:
+            int: the number of indexed documents
+        """
+        with _BULK_INDEX_SECONDS.time():
+            return self._bulk_index(documents)
+
+    def _bulk_index(self, documents: list) -> int:
+        """
+        Writes documents with parallel bulk requests, retrying the throttled ones
+
+        Args:
+            documents (list): documents to index, each one with its "_id"
+        Returns:
+            int: the number of indexed documents
+        """
+        pending = {
+            document["_id"]: {"_op_type": "index", "_index": self.index, **document}
+            for document in documents
+        }
+        indexed = 0
+        for attempt in range(self.bulk_max_retries + 1):
+            if attempt > 0:
+                time.sleep(self.bulk_initial_backoff * 2 ** (attempt - 1))
+            throttled = {}
+            errors = []
+            for ok, item in helpers.parallel_bulk(
+                self.client,
+                list(pending.values()),
+                thread_count=self.bulk_thread_count,
+                chunk_size=self.bulk_chunk_size,
+                max_chunk_bytes=self.bulk_max_chunk_bytes,
+                raise_on_error=False,
+                raise_on_exception=False,
+            ):
+                if ok:
+                    indexed += 1
+                    continue
+                result = item["index"]
+                if result.get("status") == TOO_MANY_REQUESTS:
+                    throttled[result["_id"]] = pending[result["_id"]]
+                else:
+                    errors.append(result)
+            if errors:
+                error_message = f"Error while bulk indexing in OpenSearch: {len(errors)} documents failed, first error: {errors[0].get('error')}"
+                self.logger.error(error_message)
+                raise Exception(error_message)
+            if not throttled:
+                return indexed
+            self.logger.warning(
+                f"{len(throttled)} documents throttled by OpenSearch, retrying"
+            )
+            pending = throttled
+
+        error_message = f"Error while bulk indexing in OpenSearch: {len(pending)} documents still throttled after {self.bulk_max_retries} retries"
+        self.logger.error(error_message)
+        raise Exception(error_message)
+
+    def scan(self, query: dict) -> Iterator[dict]:
+        """
+        Iterates over every document of the configured index matching a query, with the scroll API
+
+        Args:
+            query (dict): the query to perform
+        Returns:
+            Iterator[dict]: the matching documents, with their "_id" and "_source"
+        """
+        try:
+            yield from helpers.scan(self.client, query=query, index=self.index)
+        except Exception as e:
+            error_message = f"Error while scanning OpenSearch: {str(e)}"
+            self.logger.error(error_message)
+            raise Exception(error_message)
+
+    def delete_ids(self, ids: list) -> int:
+        """
+        Deletes documents from the configured index with delete by query requests. Documents are
+        matched on their metadata.doc_id, like in `existing_ids`.
+
+        Args:
+            ids (list): document ids to delete
+        Returns:
+            int: the number of deleted documents
+        """
+        deleted = 0
+        try:
+            with _DELETE_SECONDS.time():
+                for batch in utils.batched(ids, DELETE_BATCH_SIZE):
+                    response = self.client.delete_by_query(
+                        index=self.index,
+                        body={"query": {"terms": {"metadata.doc_id.keyword": batch}}},
+                        conflicts="proceed",
+                        refresh=True,
+                    )
+                    deleted += response["deleted"]
+            return deleted
+        except Exception as e:
+            error_message = f"Error while deleting documents from OpenSearch: {str(e)}"
+            self.logger.error(error_message)
+            raise Exception(error_message)
+
+
+def build_msearch_body(index: str, queries: list) -> list:
+    """
+    Builds the body of a multi search request
+    Args:
+        index (str): the index to query
+        queries (list): the queries to perform
+
+    Returns:
+        list: a header line followed by the query, for each query
+    """
+    body = []
+    for query in queries:
+        body.append({"index": index})
+        body.append(query)
+    return body
+
+
+def msearch_hits(response: dict) -> list:
+    """
+    Extracts the hits of each query from a multi search response
+    Args:
+        response (dict): the multi search response
+
+    Returns:
+        list: the document results of each query, in order
+
+    Raises:
+        Exception: if any of the queries failed
+    """
+    results = []
+    for item in response["responses"]:
+        if "error" in item:
+            raise Exception(item["error"])
+        results.append(item["hits"]["hits"])
+    return results
@@ -0,0 +1,312 @@
+import random
+import socket
+import threading
+import time
+from typing import Any, Optional
+
+from opensearchpy import OpenSearch, RequestsHttpConnection, Transport
+from opensearchpy.exceptions import ConnectionError, ConnectionTimeout, TransportError
+from requests.adapters import HTTPAdapter
+from urllib3.connection import HTTPConnection
+
+from core.utils import metrics
+
+# statuses worth retrying: throttling and server side failures
+RETRY_ON_STATUS = (429, 500, 502, 503, 504)
+# a throttled request is retried but says nothing about the health of the cluster
+THROTTLED_STATUS = 429
+
+_CIRCUIT_OPEN = metrics.OPENSEARCH_CIRCUIT_OPEN
+# ticket of the requests let through by a closed breaker
+_PASS = object()
+
+
+class CircuitOpenError(ConnectionError):
+    """
+    Raised without calling OpenSearch while the circuit breaker is open.
+    """
+
+
+class CircuitBreaker:
+    """
+    Thread safe circuit breaker. It opens after `failure_threshold` consecutive failed attempts
+    and rejects requests for `reset_timeout` seconds, then lets a single trial request through:
+    its success closes the breaker and its failure opens it again. Requests are let through with
+    a ticket, so that only the outcome of the trial ends the trial.
+    """
+
+    def __init__(self, failure_threshold: int = 5, reset_timeout: float = 30):
+        """
+        Initialize the CircuitBreaker.
+
+        Args:
+            failure_threshold (int, optional): Consecutive failures opening the breaker, 0 disables it. Defaults to 5.
+            reset_timeout (float, optional): Seconds the breaker stays open. Defaults to 30.
+        """
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self._failures = 0
+        self._opened_at = None
+        self._trial = None
+        self._lock = threading.Lock()
+
+    def allow(self) -> Optional[object]:
+        """
+        Tells whether a request may be sent, call `record` with its ticket and outcome when it is.
+
+        Returns:
+            object: the ticket of the request, None while the breaker is open
+        """
+        with self._lock:
+            if self._opened_at is None:
+                return _PASS
+            if (
+                self._trial is not None
+                or time.monotonic() - self._opened_at < self.reset_timeout
+            ):
+                return None
+            self._trial = object()
+            return self._trial
+
+    def record(self, ticket: object, success: Optional[bool]) -> None:
+        """
+        Records the outcome of a request let through by `allow`.
+
+        Args:
+            ticket (object): the ticket returned by `allow`
+            success (Optional[bool]): whether the request succeeded, None when its outcome
+                tells nothing about the cluster, e.g. it was throttled
+        """
+        with self._lock:
+            if ticket is self._trial:
+                self._trial = None
+            if success is None:
+                return
+            if success:
+                self._failures = 0
+                self._opened_at = None
+            else:
+                self._failures += 1
+                if self.failure_threshold and (
+                    self._opened_at is not None
+                    or self._failures >= self.failure_threshold
+                ):
+                    self._opened_at = time.monotonic()
+            _CIRCUIT_OPEN.set(int(self._opened_at is not None))
+
+
+class _KeepAliveAdapter(HTTPAdapter):
+    """
+    Requests adapter opening its connections with TCP keep-alive enabled.
+    """
+
+    def __init__(self, socket_options: list, **kwargs):
+        self.socket_options = socket_options
+        super().__init__(**kwargs)
+
+    def init_poolmanager(self, *args, **kwargs):
+        kwargs["socket_options"] = self.socket_options
+        super().init_poolmanager(*args, **kwargs)
+
+
+class PooledHttpConnection(RequestsHttpConnection):
+    """
+    Requests connection whose pool blocks instead of opening throwaway connections when every
+    pooled connection is busy, with TCP keep-alive probes so idle connections are not dropped
+    by load balancers, and that gzips bulk request bodies only.
+    """
+
+    def __init__(
+        self,
+        pool_maxsize: int = 10,
+        keepalive_idle: int = 60,
+        compress_bulk: bool = True,
+        **kwargs: Any,
+    ):
+        """
+        Initialize PooledHttpConnection.
+
+        Args:
+            pool_maxsize (int, optional): Maximum number of pooled connections. Defaults to 10.
+            keepalive_idle (int, optional): Idle seconds before TCP keep-alive probes, 0 disables them. Defaults to 60.
+            compress_bulk (bool, optional): Gzip the bodies of bulk requests. Defaults to True.
+            **kwargs: RequestsHttpConnection arguments.
+        """
+        super().__init__(**kwargs)
+        self.compress_bulk = compress_bulk
+        socket_options = list(HTTPConnection.default_socket_options)
+        if keepalive_idle:
+            socket_options.append((socket.SOL_SOCKET, socket.SO_KEEPALIVE, 1))
+            if hasattr(socket, "TCP_KEEPIDLE"):
+                socket_options.append(
+                    (socket.IPPROTO_TCP, socket.TCP_KEEPIDLE, keepalive_idle)
+                )
+        adapter = _KeepAliveAdapter(
+            socket_options,
+            pool_connections=1,
+            pool_maxsize=pool_maxsize,
+            pool_block=True,
+        )
+        self.session.mount("http://", adapter)
+        self.session.mount("https://", adapter)
+
+    def perform_request(self, method, url, params=None, body=None, **kwargs):
+        if self.compress_bulk and body and url.endswith("/_bulk"):
+            body = self._gzip_compress(body)
+            kwargs["headers"] = {
+                **(kwargs.get("headers") or {}),
+                "content-encoding": "gzip",
+            }
+        return super().perform_request(method, url, params, body, **kwargs)
+
+
+class ResilientTransport(Transport):
+    """
+    Transport retrying throttled, failed and timed out requests with jittered exponential
+    backoff, applying a timeout per kind of operation and failing fast through a circuit
+    breaker while OpenSearch keeps failing.
+    """
+
+    def __init__(
+        self,
+        hosts: Any,
+        search_timeout: float = 10,
+        bulk_timeout: float = 60,
+        retries: int = 3,
+        retry_backoff: float = 0.5,
+        retry_max_backoff: float = 10,
+        circuit_breaker: CircuitBreaker = None,
+        **kwargs: Any,
+    ):
+        """
+        Initialize ResilientTransport.
+
+        Args:
+            hosts (Any): OpenSearch hosts.
+            search_timeout (float, optional): Seconds before a request other than a bulk times out. Defaults to 10.
+            bulk_timeout (float, optional): Seconds before a bulk request times out. Defaults to 60.
+            retries (int, optional): Times a failed request is retried. Defaults to 3.
+            retry_backoff (float, optional): Base of the exponential backoff in seconds. Defaults to 0.5.
+            retry_max_backoff (float, optional): Maximum backoff in seconds. Defaults to 10.
+            circuit_breaker (CircuitBreaker, optional): Breaker shared by the requests. Defaults to no breaker.
+            **kwargs: Transport and connection arguments.
+        """
+        # retries are handled here, with backoff, instead of right away by the base class
+        super().__init__(hosts, max_retries=0, **kwargs)
+        self.search_timeout = search_timeout
+        self.bulk_timeout = bulk_timeout
+        self.retries = retries
+        self.retry_backoff = retry_backoff
+        self.retry_max_backoff = retry_max_backoff
+        self.circuit_breaker = circuit_breaker
+
+    def perform_request(self, method, url, params=None, body=None, **kwargs):
+        params = dict(params or {})
+        if "request_timeout" not in params and "timeout" not in params:
+            params["request_timeout"] = (
+                self.bulk_timeout if url.endswith("/_bulk") else self.search_timeout
+            )
+        for attempt in range(self.retries + 1):
+            ticket = None
+            if self.circuit_breaker is not None:
+                ticket = self.circuit_breaker.allow()
+                if ticket is None:
+                    raise CircuitOpenError(
+                        "N/A", "OpenSearch circuit breaker is open", None
+                    )
+            try:
+                # the base class pops the timeout from the params
+                response = super().perform_request(
+                    method, url, dict(params), body, **kwargs
+                )
+            except TransportError as e:
+                retryable = _retryable(e)
+                if self.circuit_breaker is not None:
+                    # a rejected request means the cluster is alive
+                    self.circuit_breaker.record(
+                        ticket,
+                        None if e.status_code == THROTTLED_STATUS else not retryable,
+                    )
+                if not retryable or attempt == self.retries:
+                    raise
+                metrics.OPENSEARCH_RETRIES.labels(status=e.status_code).inc()
+                time.sleep(self._backoff(attempt))
+            except BaseException:
+                # any other error still ends the attempt, or a half open breaker would wait
+                # for the outcome of its trial forever
+                if self.circuit_breaker is not None:
+                    self.circuit_breaker.record(ticket, False)
+                raise
+            else:
+                if self.circuit_breaker is not None:
+                    self.circuit_breaker.record(ticket, True)
+                return response
+
+    def _backoff(self, attempt: int) -> float:
+        """
+        Returns the seconds to wait before a retry, with full jitter.
+        """
+        return random.uniform(
+            0, min(self.retry_max_backoff, self.retry_backoff * 2**attempt)
+        )
+
+
+def _retryable(error: TransportError) -> bool:
+    """
+    Tells whether a failed request is worth retrying
+    """
+    if isinstance(error, (ConnectionError, ConnectionTimeout)):
+        return True
+    return error.status_code in RETRY_ON_STATUS
+
+
+def build_opensearch_client(
+    host: str,
+    port: int,
+    http_auth: tuple,
+    pool_maxsize: int = 10,
+    keepalive_idle: int = 60,
+    compress_bulk: bool = True,
+    search_timeout: float = 10,
+    bulk_timeout: float = 60,
+    retries: int = 3,
+    retry_backoff: float = 0.5,
+    breaker_threshold: int = 5,
+    breaker_reset: float = 30,
+) -> OpenSearch:
+    """
+    Builds the OpenSearch client shared by every component of the process.
+
+    Args:
+        host (str): OpenSearch host.
+        port (int): OpenSearch port.
+        http_auth (tuple): User and password.
+        pool_maxsize (int, optional): Maximum number of pooled connections. Defaults to 10.
+        keepalive_idle (int, optional): Idle seconds before TCP keep-alive probes, 0 disables them. Defaults to 60.
+        compress_bulk (bool, optional): Gzip the bodies of bulk requests. Defaults to True.
+        search_timeout (float, optional): Seconds before a request other than a bulk times out. Defaults to 10.
+        bulk_timeout (float, optional): Seconds before a bulk request times out. Defaults to 60.
+        retries (int, optional): Times a failed request is retried. Defaults to 3.
+        retry_backoff (float, optional): Base of the exponential backoff in seconds. Defaults to 0.5.
+        breaker_threshold (int, optional): Consecutive failures opening the circuit breaker, 0 disables it. Defaults to 5.
+        breaker_reset (float, optional): Seconds the circuit breaker stays open. Defaults to 30.
+
+    Returns:
+        OpenSearch: the client
+    """
+    return OpenSearch(
+        hosts=[{"host": host, "port": port}],
+        http_auth=http_auth,
+        use_ssl=True,
+        verify_certs=True,
+        connection_class=PooledHttpConnection,
+        transport_class=ResilientTransport,
+        pool_maxsize=pool_maxsize,
+        keepalive_idle=keepalive_idle,
+        compress_bulk=compress_bulk,
+        search_timeout=search_timeout,
+        bulk_timeout=bulk_timeout,
+        retries=retries,
+        retry_backoff=retry_backoff,
+        circuit_breaker=CircuitBreaker(breaker_threshold, breaker_reset),
+    )
@@ -0,0 +1,200 @@
+import fcntl
+import json
+import os
+import time
+from logging import Logger
+from typing import Iterator
+
+from core.abstracts.services import AbstractOpensearchService
+from core.service.local_vector_service import (
+    LocalVectorService,
+    filter_values,
+    vector_query_filters,
+)
+from core.utils import utils
+
+
+class RoutingOpensearchService(AbstractOpensearchService):
+    """
+    Serves the searches of a few hot twins from an in-process LocalVectorService and everything
+    else from OpenSearch. OpenSearch remains the source of truth: every document is written to
+    it, and the documents of the hot twins are also appended to the local engine.
+    """
+
+    def __init__(
+        self,
+        remote: AbstractOpensearchService,
+        local: LocalVectorService,
+        twin_ids: list,
+        logger: Logger,
+        sync_batch_size: int = 1000,
+        sync_max_age: float = 0,
+    ):
+        """
+        Initialize RoutingOpensearchService.
+
+        Args:
+            remote (AbstractOpensearchService): Service backed by the OpenSearch cluster.
+            local (LocalVectorService): In-process engine holding the hot twins.
+            twin_ids (list): Twins served by the local engine.
+            logger (Logger): Logger instance.
+            sync_batch_size (int, optional): Documents copied at a time by `sync`. Defaults to 1000.
+            sync_max_age (float, optional): Seconds during which a twin synced by any process of the host
+                is not synced again by `sync`, 0 always syncs. Defaults to 0.
+        """
+        self.remote = remote
+        self.local = local
+        self.twin_ids = set(twin_ids)
+        self.logger = logger
+        self.sync_batch_size = sync_batch_size
+        self.sync_max_age = sync_max_age
+
+    def search(self, query: dict) -> list:
+        """
+        Performs a query on the local engine when it only targets hot twins, on OpenSearch otherwise
+
+        Args:
+            query (dict): the query to perform
+        Returns:
+            list: a list of dictionaries with the query document results
+        """
+        if self._is_local(query):
+            return self.local.search(query)
+        return self.remote.search(query)
+
+    def msearch(self, queries: list) -> list:
+        """
+        Answers the queries targeting hot twins locally and sends the others to OpenSearch in a
+        single multi search request
+
+        Args:
+            queries (list): the queries to perform
+        Returns:
+            list: the document results of each query, in order
+        """
+        results = [None] * len(queries)
+        remote = []
+        for i, query in enumerate(queries):
+            if self._is_local(query):
+                results[i] = self.local.search(query)
+            else:
+                remote.append(i)
+        if remote:
+            responses = self.remote.msearch([queries[i] for i in remote])
+            for i, hits in zip(remote, responses):
+                results[i] = hits
+        return results
+
+    def existing_ids(self, ids: list) -> set:
+        """
+        Finds which documents are already indexed in OpenSearch
+
+        Args:
+            ids (list): document ids to look up
+        Returns:
+            set: the ids of the documents already present in the index
+        """
+        return self.remote.existing_ids(ids)
+
+    def bulk_index(self, documents: list) -> int:
+        """
+        Writes documents to OpenSearch and appends the documents of hot twins to the local engine
+
+        Args:
+            documents (list): documents to index, each one with its "_id"
+        Returns:
+            int: the number of documents indexed in OpenSearch
+        """
+        indexed = self.remote.bulk_index(documents)
+        hot = [
+            document
+            for document in documents
+            if document["metadata"]["twin_id"] in self.twin_ids
+        ]
+        if hot:
+            self.local.bulk_index(hot)
+        return indexed
+
+    def scan(self, query: dict) -> Iterator[dict]:
+        """
+        Iterates over every document of OpenSearch matching a query
+
+        Args:
+            query (dict): the query to perform
+        Returns:
+            Iterator[dict]: the matching documents, with their "_id" and "_source"
+        """
+        return self.remote.scan(query)
+
+    def delete_ids(self, ids: list) -> int:
+        """
+        Deletes documents from OpenSearch and from the local engine
+
+        Args:
+            ids (list): document ids to delete
+        Returns:
+            int: the number of documents deleted from OpenSearch
+        """
+        deleted = self.remote.delete_ids(ids)
+        self.local.delete_ids(ids)
+        return deleted
+
+    def sync(self) -> None:
+        """
+        Copies the documents of the hot twins missing from the local engine out of OpenSearch.
+        Documents already present locally are skipped, so it can be run on every start. The
+        processes sharing the local engine files sync one at a time, and skip the twins synced
+        less than `sync_max_age` seconds ago, e.g. by another worker or a previous backfill run.
+        """
+        os.makedirs(self.local.path, exist_ok=True)
+        state_path = os.path.join(self.local.path, "sync.json")
+        with open(os.path.join(self.local.path, ".sync.lock"), "a") as lock_file:
+            fcntl.flock(lock_file, fcntl.LOCK_EX)
+            try:
+                synced_at = {}
+                if os.path.exists(state_path):
+                    with open(state_path) as state_file:
+                        synced_at = json.load(state_file)
+                for twin_id in sorted(self.twin_ids):
+                    if time.time() - synced_at.get(twin_id, 0) < self.sync_max_age:
+                        self.logger.info(
+                            f"Twin {twin_id} was synced to the local vector engine recently, skipping"
+                        )
+                        continue
+                    self._sync_twin(twin_id)
+                    synced_at[twin_id] = time.time()
+                    tmp_path = f"{state_path}.tmp"
+                    with open(tmp_path, "w") as state_file:
+                        json.dump(synced_at, state_file)
+                    os.replace(tmp_path, state_path)
+            finally:
+                fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+    def _sync_twin(self, twin_id: str) -> None:
+        """
+        Copies the documents of a twin missing from the local engine out of OpenSearch
+        """
+        query = {
+            "query": {
+                "bool": {"filter": [{"term": {"metadata.twin_id.keyword": twin_id}}]}
+            }
+        }
+        before = self.local.count(twin_id)
+        hits = self.remote.scan(query)
+        for batch in utils.batched(hits, self.sync_batch_size):
+            self.local.bulk_index(
+                [{"_id": hit["_id"], **hit["_source"]} for hit in batch]
+            )
+        self.logger.info(
+            f"Synced {self.local.count(twin_id) - before} documents of twin {twin_id} to the local vector engine"
+        )
+
+    def _is_local(self, query: dict) -> bool:
+        """
+        Tells whether a query is restricted to hot twins and can be answered locally
+        """
+        filters = vector_query_filters(query)
+        if filters is None:
+            return False
+        twin_ids = filter_values(filters, "twin_id")
+        return twin_ids is not None and set(twin_ids) <= self.twin_ids
@@ -1,9 +1,19 @@
+import codecs
 import json
 from logging import Logger
+from typing import Iterator
 
 from botocore.client import BaseClient
 
 from core.abstracts.services import AbstractS3Service
+from core.utils import metrics
+from core.utils.json_stream import iter_json_array
+
+_GET_OBJECT_SECONDS = metrics.stage("s3_get_object")
+_HEAD_OBJECT_SECONDS = metrics.stage("s3_head_object")
+_LIST_OBJECTS_SECONDS = metrics.stage("s3_list_objects")
+_JSON_DECODE_SECONDS = metrics.stage("json_decode")
+_S3_BYTES = metrics.S3_BYTES
 
 
 class S3Service(AbstractS3Service):
@@ -22,22 +32,149 @@ class S3Service(AbstractS3Service):
         self.s3_client = s3_client
         self.logger = logger
 
-    def get_object(self, bucket_name: str, object_key: str) -> list:
+    def get_object(
+        self, bucket_name: str, object_key: str, if_match: str = None
+    ) -> list:
         """
         Get an object from S3.
 
         Args:
             bucket_name (str): Name of the S3 bucket.
             object_key (str): Key of the object in the S3 bucket.
+            if_match (str, optional): Fail unless the object still has this ETag. Defaults to any ETag.
 
         Returns:
             list: List of dictionaries containing the loaded JSON content of the S3 object, or None if an error occurs.
         """
         try:
-            response = self.s3_client.get_object(Bucket=bucket_name, Key=object_key)
-            json_content = response["Body"].read().decode("utf-8")
-            return json.loads(json_content)
+            with _GET_OBJECT_SECONDS.time():
+                response = self.s3_client.get_object(
+                    **_get_object_args(bucket_name, object_key, if_match)
+                )
+                body = response["Body"].read()
+            _S3_BYTES.inc(len(body))
+            with _JSON_DECODE_SECONDS.time():
+                return json.loads(body.decode("utf-8"))
         except Exception as e:
             error_message = f"Error while retrieving and loading the S3 file: {str(e)}"
             self.logger.error(error_message)
             raise ValueError(error_message)
+
+    def stream_object(
+        self,
+        bucket_name: str,
+        object_key: str,
+        chunk_size: int = 1024 * 1024,
+        if_match: str = None,
+    ) -> Iterator[dict]:
+        """
+        Stream the items of a JSON array object from S3, reading the body in chunks so the
+        whole object is never held in memory.
+
+        Args:
+            bucket_name (str): Name of the S3 bucket.
+            object_key (str): Key of the object in the S3 bucket.
+            chunk_size (int, optional): Bytes read from the body at a time. Defaults to 1MB.
+            if_match (str, optional): Fail unless the object still has this ETag. Defaults to any ETag.
+
+        Returns:
+            Iterator[dict]: The items of the JSON array, in order.
+        """
+        try:
+            with _GET_OBJECT_SECONDS.time():
+                response = self.s3_client.get_object(
+                    **_get_object_args(bucket_name, object_key, if_match)
+                )
+            decoder = codecs.getincrementaldecoder("utf-8")()
+            # reading and decoding are interleaved with the consumers of the items
+            chunks = (
+                decoder.decode(_count_bytes(chunk))
+                for chunk in response["Body"].iter_chunks(chunk_size)
+            )
+            yield from iter_json_array(chunks)
+        except Exception as e:
+            error_message = f"Error while streaming the S3 file: {str(e)}"
+            self.logger.error(error_message)
+            raise ValueError(error_message)
+
+    def get_etag(self, bucket_name: str, object_key: str) -> str:
+        """
+        Get the ETag of an object with a HEAD request, without downloading its body.
+
+        Args:
+            bucket_name (str): Name of the S3 bucket.
+            object_key (str): Key of the object in the S3 bucket.
+
+        Returns:
+            str: The ETag of the object.
+        """
+        try:
+            with _HEAD_OBJECT_SECONDS.time():
+                response = self.s3_client.head_object(
+                    Bucket=bucket_name, Key=object_key
+                )
+            return response["ETag"]
+        except Exception as e:
+            error_message = f"Error while retrieving the S3 file metadata: {str(e)}"
+            self.logger.error(error_message)
+            raise ValueError(error_message)
+
+    def list_objects(
+        self,
+        bucket_name: str,
+        prefix: str = "",
+        start_after: str = None,
+        page_size: int = 1000,
+    ) -> Iterator[dict]:
+        """
+        List the objects of a bucket with paginated list_objects_v2 requests. Pages are requested
+        as the objects are consumed, so listing overlaps with processing them. Folder markers
+        are left out.
+
+        Args:
+            bucket_name (str): Name of the S3 bucket.
+            prefix (str, optional): Only list the keys starting with it. Defaults to every key.
+            start_after (str, optional): Only list the keys after it. Defaults to the first key.
+            page_size (int, optional): Keys requested per page. Defaults to 1000.
+
+        Returns:
+            Iterator[dict]: The "Key" and "Size" of each object, in key order.
+        """
+        kwargs = {"Bucket": bucket_name, "Prefix": prefix}
+        if start_after:
+            kwargs["StartAfter"] = start_after
+        paginator = self.s3_client.get_paginator("list_objects_v2")
+        pages = iter(
+            paginator.paginate(**kwargs, PaginationConfig={"PageSize": page_size})
+        )
+        try:
+            while True:
+                with _LIST_OBJECTS_SECONDS.time():
+                    page = next(pages, None)
+                if page is None:
+                    return
+                for item in page.get("Contents", []):
+                    if not item["Key"].endswith("/"):
+                        yield {"Key": item["Key"], "Size": item["Size"]}
+        except Exception as e:
+            error_message = f"Error while listing the S3 bucket: {str(e)}"
+            self.logger.error(error_message)
+            raise ValueError(error_message)
+
+
+def _get_object_args(bucket_name: str, object_key: str, if_match: str) -> dict:
+    """
+    Arguments of a get_object request, conditional on the ETag when one is given
+    """
+    args = {"Bucket": bucket_name, "Key": object_key}
+    if if_match is not None:
+        args["IfMatch"] = if_match
+    return args
+
+
+def _count_bytes(chunk: bytes) -> bytes:
+    """
+    Counts a chunk read from S3 and returns it
+    """
+    _S3_BYTES.inc(len(chunk))
+    return chunk
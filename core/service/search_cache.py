@@ -0,0 +1,79 @@
+from logging import Logger
+
+from core.abstracts.services import AbstractSearchCache
+from core.utils.cache import LRUCache
+
+
+class InMemorySearchCache(AbstractSearchCache):
+    """
+    Search result cache kept in the memory of the current process. Indexing only invalidates the
+    cache of the process that indexed, so the other workers serve stale results until the ttl.
+    """
+
+    def __init__(self, logger: Logger, maxsize: int = 1024, ttl: float = None):
+        """
+        Initialize InMemorySearchCache.
+
+        Args:
+            logger (Logger): Logger instance.
+            maxsize (int, optional): Maximum number of cached searches. Defaults to 1024.
+            ttl (float, optional): Seconds a cached search stays valid. Defaults to no expiration.
+        """
+        self.cache = LRUCache(maxsize=maxsize, ttl=ttl)
+        self.logger = logger
+
+    def get(self, key: str) -> list:
+        """
+        Get cached search results.
+
+        Args:
+            key (str): Key identifying the search (query, k, filters)
+
+        Returns:
+            list: the cached results, or None when the search is not cached
+        """
+        entry = self.cache.get(key)
+        return entry[0] if entry is not None else None
+
+    def set(self, key: str, results: list, scope: dict) -> None:
+        """
+        Cache search results.
+
+        Args:
+            key (str): Key identifying the search (query, k, filters)
+            results (list): the search results
+            scope (dict): the twin_id and source_name filters of the search, used for invalidation
+        """
+        self.cache.set(key, (results, scope))
+
+    def invalidate(self, twin_id: str, source_name: str) -> None:
+        """
+        Drop every cached search that may include documents of a twin source. Searches without
+        a twin_id or source_name filter span every twin or source, so they are always dropped.
+
+        Args:
+            twin_id (str): Identifier for the twin.
+            source_name (str): Name of the data source.
+        """
+
+        def affected(_, entry) -> bool:
+            scope = entry[1]
+            return _in_scope(scope.get("twin_id"), twin_id) and _in_scope(
+                scope.get("source_name"), source_name
+            )
+
+        removed = self.cache.delete_where(affected)
+        self.logger.debug(
+            f"Invalidated {removed} cached searches for {twin_id}/{source_name}"
+        )
+
+
+def _in_scope(filter_value, value: str) -> bool:
+    """
+    Checks whether a filter value (None, a string or a list of strings) matches value
+    """
+    if filter_value is None:
+        return True
+    if isinstance(filter_value, list):
+        return value in filter_value
+    return filter_value == value
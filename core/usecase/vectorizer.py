@@ -1,15 +1,106 @@
+import asyncio
+import base64
+import json
+from concurrent.futures import Executor
 from logging import Logger
-from typing import Any
+from typing import Any, Callable, Iterable, Iterator
 
 import numpy
 import numpy as np
 
-from core.abstracts.services import AbstractOpensearchService
-from core.abstracts.usescases import AbstractVectorizeUsecase
+from core.abstracts.services import (
+    AbstractAsyncOpensearchService,
+    AbstractManifestStore,
+    AbstractOpensearchService,
+    AbstractSearchCache,
+)
+from core.abstracts.usescases import (
+    AbstractAsyncVectorizeUsecase,
+    AbstractVectorizeUsecase,
+)
 from core.service.llama_index_service import AbstractLlamaIndexService
 from core.service.s3_service import AbstractS3Service
+from core.utils import metrics, utils
+from core.utils.quantization import (
+    DATA_TYPE_FLOAT,
+    EMBEDDING_FULL_FIELD,
+    candidates_count,
+    quantize_vector,
+    rescore_hits,
+)
 
 EMBED_FIELD = "embedding"
+# approximate nearest neighbours through the HNSW graph
+SEARCH_MODE_KNN = "knn"
+# brute force cosine similarity, used as fallback and for recall checks
+SEARCH_MODE_EXACT = "exact"
+# lexical match and knn legs fused client-side
+SEARCH_MODE_HYBRID = "hybrid"
+SEARCH_MODES = (SEARCH_MODE_KNN, SEARCH_MODE_EXACT, SEARCH_MODE_HYBRID)
+# reciprocal rank fusion of the hybrid legs
+FUSION_RRF = "rrf"
+# weighted sum of the min-max normalized scores of the hybrid legs
+FUSION_BLEND = "blend"
+FUSIONS = (FUSION_RRF, FUSION_BLEND)
+# fields matched by the lexical leg, the preprocessed text and the raw text and user name
+LEXICAL_FIELDS = ("content", "metadata.raw_text", "metadata.user_name")
+# per request settings of a hybrid search
+HYBRID_PARAMS = ("lexical_k", "vector_k", "lexical_weight", "vector_weight", "fusion")
+# metadata fields that can be used to narrow down a search
+FILTER_FIELDS = ("twin_id", "source_name", "channelId", "file_uuid")
+# date field that can be filtered by range
+DATE_FILTER_FIELD = "created_at"
+DATE_RANGE_OPERATORS = ("gt", "gte", "lt", "lte")
+# metadata fields a search can return, the first three by default
+RESULT_FIELDS = (
+    "raw_text",
+    "source_name",
+    "file_uuid",
+    "twin_id",
+    "channelId",
+    "user_id",
+    "user_name",
+    "created_at",
+    "doc_id",
+)
+DEFAULT_RESULT_FIELDS = RESULT_FIELDS[:3]
+# total order of the hits, so that a page can start right after the last hit of the previous one
+CURSOR_SORT = [{"_score": "desc"}, {"metadata.doc_id.keyword": "asc"}]
+# hits without a doc_id would sort last, after a cursor falling back to their _id
+CURSOR_FILTER = {"exists": {"field": "metadata.doc_id"}}
+
+_UNCHANGED_DOCUMENTS = metrics.DOCUMENTS.labels(outcome="unchanged")
+_DELETED_DOCUMENTS = metrics.DOCUMENTS.labels(outcome="deleted")
+
+
+class SearchPlan:
+    """
+    State of a batch of searches between the steps of `VectorizerUsecase.plan_searches`,
+    `search_queries` and `finish_searches`.
+    """
+
+    def __init__(self, searches: list):
+        """
+        Initialize SearchPlan.
+
+        Args:
+            searches (list): the searches completed with the defaults
+        """
+        self.searches = searches
+        self.pages = [None] * len(searches)
+        self.cache_keys = [None] * len(searches)
+        # positions of the searches missing from the cache
+        self.pending = []
+        self.vectors = []
+        # number of OpenSearch queries of each pending search
+        self.legs = []
+
+    @property
+    def texts(self) -> list:
+        """
+        The query texts of the searches left to run, to vectorize
+        """
+        return [self.searches[i]["q"] for i in self.pending]
 
 
 class VectorizerUsecase(AbstractVectorizeUsecase):
@@ -23,6 +114,18 @@ class VectorizerUsecase(AbstractVectorizeUsecase):
         llama_index_service: AbstractLlamaIndexService,
         opensearch_service: AbstractOpensearchService,
         logger: Logger,
+        search_mode: str = SEARCH_MODE_KNN,
+        ef_search: int = None,
+        search_cache: AbstractSearchCache = None,
+        s3_streaming: bool = False,
+        s3_stream_chunk_size: int = 1024 * 1024,
+        vector_data_type: str = DATA_TYPE_FLOAT,
+        rescore_oversample: float = 4,
+        hybrid_fusion: str = FUSION_RRF,
+        hybrid_rrf_k: int = 60,
+        hybrid_lexical_weight: float = 1.0,
+        hybrid_vector_weight: float = 1.0,
+        manifest_store: AbstractManifestStore = None,
     ):
         """
         Initialize the Usecase.
@@ -30,16 +133,48 @@ class VectorizerUsecase(AbstractVectorizeUsecase):
         Args:
             s3_service (AbstractS3Service): An instance of a class implementing the AbstractS3Service interface.
             llama_index_service (AbstractLlamaIndexService): An instance of a class implementing the AbstractLlamaIndexService interface.
+            search_mode (str, optional): Default search mode, "knn" or "exact". Defaults to "knn".
+            ef_search (int, optional): HNSW candidate list size for knn searches. Defaults to the index setting.
+            search_cache (AbstractSearchCache, optional): Cache for search results. Defaults to no caching.
+            s3_streaming (bool, optional): Stream S3 objects instead of loading them whole. Defaults to False.
+            s3_stream_chunk_size (int, optional): Bytes read at a time when streaming. Defaults to 1MB.
+            vector_data_type (str, optional): Precision of the indexed embeddings. Searches on quantized
+                embeddings fetch `rescore_oversample` candidates per result and rescore them exactly. Defaults to "float".
+            rescore_oversample (float, optional): Candidates fetched per result from a quantized index. Defaults to 4.
+            hybrid_fusion (str, optional): Default fusion of the hybrid legs, "rrf" or "blend". Defaults to "rrf".
+            hybrid_rrf_k (int, optional): Rank constant of the reciprocal rank fusion. Defaults to 60.
+            hybrid_lexical_weight (float, optional): Default weight of the lexical leg. Defaults to 1.0.
+            hybrid_vector_weight (float, optional): Default weight of the knn leg. Defaults to 1.0.
+            manifest_store (AbstractManifestStore, optional): Manifests of the ingested objects. When set,
+                re-ingesting an object only indexes its new messages and deletes the documents of the
+                messages removed from it. Defaults to full re-ingestion.
         """
+        if search_mode not in SEARCH_MODES:
+            raise ValueError(f"Unsupported search mode: {search_mode}")
+        if hybrid_fusion not in FUSIONS:
+            raise ValueError(f"Unsupported fusion: {hybrid_fusion}")
         self.s3_service = s3_service
         self.llama_index_service = llama_index_service
         self.opensearch_service = opensearch_service
         self.logger = logger
+        self.search_mode = search_mode
+        self.ef_search = ef_search
+        self.search_cache = search_cache
+        self.s3_streaming = s3_streaming
+        self.s3_stream_chunk_size = s3_stream_chunk_size
+        self.vector_data_type = vector_data_type
+        self.rescore_oversample = rescore_oversample
+        self.hybrid_fusion = hybrid_fusion
+        self.hybrid_rrf_k = hybrid_rrf_k
+        self.hybrid_lexical_weight = hybrid_lexical_weight
+        self.hybrid_vector_weight = hybrid_vector_weight
+        self.manifest_store = manifest_store
 
     def vectorize_and_index(self, bucket_name: str, object_key: str) -> str:
         """
         This method retrieves JSON content from the specified S3 bucket and delegates indexing tasks
-        to the llama_index_service.
+        to the llama_index_service. With a manifest store, objects whose ETag did not change are
+        skipped without being downloaded.
 
         Args:
             bucket_name (str): Name of the S3 bucket containing the document.
@@ -48,54 +183,856 @@ class VectorizerUsecase(AbstractVectorizeUsecase):
         Returns:
             str: The indexed document.
         """
+        manifest_key = f"{bucket_name}/{object_key}"
+        etag = None
+        if self.manifest_store is not None:
+            etag = self.s3_service.get_etag(bucket_name, object_key)
+            manifest = self.manifest_store.get(manifest_key)
+            if manifest is not None and manifest["etag"] == etag:
+                summary = f"Skipped unchanged {object_key}"
+                self.logger.info(summary)
+                return summary
 
-        json_content = self.s3_service.get_object(bucket_name, object_key)
+        # the GET fails if the object was rewritten since the HEAD, so the manifest never records
+        # the ETag of a version other than the one indexed. A rewrite sends its own notification
+        if self.s3_streaming:
+            json_content = self.s3_service.stream_object(
+                bucket_name, object_key, self.s3_stream_chunk_size, if_match=etag
+            )
+        else:
+            json_content = self.s3_service.get_object(
+                bucket_name, object_key, if_match=etag
+            )
         if json_content is None:
             error_message = "Not content to be indexing"
             self.logger.error(error_message)
             raise ValueError(error_message)
         try:
             twin_id, source_name, channel, file_uuid = object_key.split("/")
-            return self.llama_index_service.vector_store_index(
-                twin_id, source_name, channel, file_uuid, json_content
-            )
+            try:
+                if self.manifest_store is None:
+                    return self.llama_index_service.vector_store_index(
+                        twin_id, source_name, channel, file_uuid, json_content
+                    )
+                return self._index_delta(
+                    manifest_key, etag, manifest, object_key, json_content
+                )
+            finally:
+                # documents may have been written even if indexing failed part way
+                if self.search_cache is not None:
+                    self.search_cache.invalidate(twin_id, source_name)
         except ValueError as e:
             self.logger.error(e)
             raise ValueError(e)
 
-    def search(self, query: str) -> list[dict[str, Any]]:
+    def _index_delta(
+        self,
+        manifest_key: str,
+        etag: str,
+        manifest: dict,
+        object_key: str,
+        messages: Iterable[dict],
+    ) -> str:
+        """
+        Indexes the messages of an object missing from its manifest, deletes the documents of the
+        messages no longer in the object and saves its new manifest. Objects ingested before
+        their first manifest are compared with the documents already indexed for the file.
+
+        Args:
+            manifest_key (str): Bucket and key of the object.
+            etag (str): ETag of the object.
+            manifest (dict): Manifest of the previous ingestion, or None.
+            object_key (str): Key of the object, twin_id/source_name/channel/file_uuid.
+            messages (Iterable[dict]): Messages of the object, a list or a stream.
+
+        Returns:
+            str: Index summary
+        """
+        twin_id, source_name, channel, file_uuid = object_key.split("/")
+        if manifest is not None:
+            known_ids = set(manifest["doc_ids"])
+        else:
+            known_ids = self._indexed_ids(twin_id, source_name, channel, file_uuid)
+        current_ids = set()
+
+        def changed() -> Iterator[dict]:
+            for message in messages:
+                doc_id = utils.document_id(
+                    twin_id, source_name, channel, file_uuid, message
+                )
+                current_ids.add(doc_id)
+                if doc_id not in known_ids:
+                    yield message
+
+        summary = self.llama_index_service.vector_store_index(
+            twin_id, source_name, channel, file_uuid, changed()
+        )
+        stale = known_ids - current_ids
+        deleted = self.opensearch_service.delete_ids(list(stale)) if stale else 0
+        # saved last, a failed ingestion is retried against the previous manifest
+        self.manifest_store.put(
+            manifest_key, {"etag": etag, "doc_ids": sorted(current_ids)}
+        )
+        unchanged = len(known_ids & current_ids)
+        _UNCHANGED_DOCUMENTS.inc(unchanged)
+        _DELETED_DOCUMENTS.inc(deleted)
+        return f"{summary}, {unchanged} unchanged, {deleted} deleted"
+
+    def _indexed_ids(
+        self, twin_id: str, source_name: str, channel: str, file_uuid: str
+    ) -> set:
+        """
+        Returns the doc ids of the documents indexed for a file
+        """
+        filters = {
+            "twin_id": twin_id,
+            "source_name": source_name,
+            "channelId": channel,
+            "file_uuid": file_uuid,
+        }
+        query = {
+            "_source": ["metadata.doc_id"],
+            "query": {"bool": {"filter": build_opensearch_filter(filters)}},
+        }
+        return {
+            hit["_source"]["metadata"]["doc_id"]
+            for hit in self.opensearch_service.scan(query)
+            if "doc_id" in hit["_source"].get("metadata", {})
+        }
+
+    def vectorize_objects(
+        self, payload: dict, report_progress: Callable[[int, str], None]
+    ) -> None:
+        """
+        Vectorizes and indexes several S3 objects one after the other, used as the handler of
+        background ingestion jobs. A failing object is reported and does not stop the job.
+
+        Args:
+            payload (dict): Job payload with an "objects" list of {"bucket", "key"} dictionaries.
+            report_progress (Callable[[int, str], None]): Called with (1, error or None) after each object.
+        """
+        for s3_object in payload["objects"]:
+            try:
+                self.vectorize_and_index(s3_object["bucket"], s3_object["key"])
+                report_progress(1, None)
+            except Exception as e:
+                report_progress(1, f"{s3_object['key']}: {e}")
+
+    def search(
+        self,
+        query: str,
+        k: int = 10,
+        mode: str = None,
+        filters: dict = None,
+        hybrid: dict = None,
+        fields: list = None,
+        cursor: str = None,
+    ) -> list[dict[str, Any]]:
         """
         Performs a search request to the configured opensearch index. Returns a list of results
         Args:
             query (str): the string to search in the indexed documents
+            k (int, optional): the number of results to return. Defaults to 10.
+            mode (str, optional): "knn", "exact" or "hybrid". Defaults to the configured search mode.
+            filters (dict, optional): metadata filters applied before scoring, see `build_opensearch_filter`.
+            hybrid (dict, optional): per leg k and weights and fusion of a hybrid search, any of HYBRID_PARAMS.
+                Defaults to `k` results per leg and the configured weights and fusion.
+            fields (list, optional): metadata fields of each result, any of RESULT_FIELDS. Defaults to DEFAULT_RESULT_FIELDS.
+            cursor (str, optional): the `next_cursor` of the previous page. Defaults to the first page.
 
         Returns:
             list[dict[str, Any]]: A list of matching documents.
         """
+        return self.search_page(query, k, mode, filters, hybrid, fields, cursor)[
+            "results"
+        ]
+
+    def search_page(
+        self,
+        query: str,
+        k: int = 10,
+        mode: str = None,
+        filters: dict = None,
+        hybrid: dict = None,
+        fields: list = None,
+        cursor: str = None,
+    ) -> dict[str, Any]:
+        """
+        Performs a search request to the configured opensearch index. Returns a page of results
+        and the cursor of the next page, see `search` for the arguments.
+
+        Returns:
+            dict[str, Any]: the matching documents under "results" and the cursor of the next page
+                under "next_cursor", None on the last page.
+        """
+        plan = self.plan_searches(
+            [
+                {
+                    "q": query,
+                    "k": k,
+                    "mode": mode,
+                    "filters": filters,
+                    "hybrid": hybrid,
+                    "fields": fields,
+                    "cursor": cursor,
+                }
+            ]
+        )
+        if not plan.pending:
+            return plan.pages[0]
         try:
             # vectorize query
             v_query = self.llama_index_service.vectorize_string(query)
-            vector = np.array(v_query)
-            # build query
-            query = build_opensearch_vector_query(vector, EMBED_FIELD)
+            # build queries, the legs of a hybrid search are sent in a single request
+            queries = self.search_queries(plan, [v_query])
+            if len(queries) == 1:
+                responses = [self.opensearch_service.search(queries[0])]
+            else:
+                responses = self.opensearch_service.msearch(queries)
             # search and return results
-            results = self.opensearch_service.search(query)
-            messages = [
+            return self.finish_searches(plan, responses)[0]
+        except ValueError as e:
+            self.logger.error(f"ERROR: {e}")
+            raise ValueError(e)
+
+    def search_batch(self, searches: list[dict[str, Any]]) -> list[dict[str, Any]]:
+        """
+        Performs several searches at once: the queries are vectorized in a single batched forward
+        pass and sent to the configured opensearch index in a single multi search request.
+        Args:
+            searches (list[dict[str, Any]]): the searches, each one with its "q" string and optional
+                "k", "mode", "filters", "hybrid", "fields" and "cursor", as accepted by `search`
+
+        Returns:
+            list[dict[str, Any]]: The page of each search, as returned by `search_page`, in order.
+        """
+        plan = self.plan_searches(searches)
+        if not plan.pending:
+            return plan.pages
+
+        try:
+            vectors = self.llama_index_service.vectorize_strings(plan.texts)
+            responses = self.opensearch_service.msearch(
+                self.search_queries(plan, vectors)
+            )
+            return self.finish_searches(plan, responses)
+        except ValueError as e:
+            self.logger.error(f"ERROR: {e}")
+            raise ValueError(e)
+
+    def _normalize_searches(
+        self, searches: list[dict[str, Any]]
+    ) -> list[dict[str, Any]]:
+        """
+        Completes searches with the default k, mode, filters, hybrid settings and fields, and
+        decodes their cursors
+        Args:
+            searches (list[dict[str, Any]]): the searches, as accepted by `search_batch`
+
+        Returns:
+            list[dict[str, Any]]: the searches with every one of "q", "k", "mode", "filters",
+                "hybrid", "fields" and "cursor"
+        """
+        normalized = []
+        for search in searches:
+            mode = search.get("mode") or self.search_mode
+            if mode not in SEARCH_MODES:
+                raise ValueError(f"Unsupported search mode: {mode}")
+            k = search.get("k") or 10
+            cursor = search.get("cursor")
+            normalized.append(
+                {
+                    "q": search["q"],
+                    "k": k,
+                    "mode": mode,
+                    "filters": search.get("filters") or {},
+                    "hybrid": self._hybrid_params(mode, k, search.get("hybrid")),
+                    "fields": list(search.get("fields") or DEFAULT_RESULT_FIELDS),
+                    "cursor": decode_cursor(cursor) if cursor else None,
+                }
+            )
+        return normalized
+
+    def plan_searches(self, searches: list[dict[str, Any]]) -> "SearchPlan":
+        """
+        First step of a search: completes the searches with the defaults and looks them up in
+        the search cache. The queries of the searches left to run are then vectorized, their
+        OpenSearch queries built by `search_queries` and the responses turned into pages by
+        `finish_searches`. The embedding and OpenSearch requests in between are left to the
+        caller, so that they can be awaited by the async app.
+        Args:
+            searches (list[dict[str, Any]]): the searches, as accepted by `search_batch`
+
+        Returns:
+            SearchPlan: the searches, their cached pages and the positions of those left to run
+        """
+        plan = SearchPlan(self._normalize_searches(searches))
+        for i, search in enumerate(plan.searches):
+            plan.cache_keys[i], plan.pages[i] = self._cached_search(search)
+            if plan.pages[i] is None:
+                plan.pending.append(i)
+        return plan
+
+    def search_queries(self, plan: "SearchPlan", vectors: list) -> list:
+        """
+        Second step of a search: builds the OpenSearch queries of the searches left to run
+        Args:
+            plan (SearchPlan): the plan returned by `plan_searches`
+            vectors (list): the vectorized query of each search left to run, see `SearchPlan.texts`
+
+        Returns:
+            list: the queries of every search left to run, in order, to send in one multi search
+        """
+        plan.vectors = vectors
+        queries = []
+        for i, vector in zip(plan.pending, vectors):
+            search_queries = self._build_queries(np.array(vector), plan.searches[i])
+            queries.extend(search_queries)
+            plan.legs.append(len(search_queries))
+        return queries
+
+    def finish_searches(self, plan: "SearchPlan", responses: list) -> list:
+        """
+        Last step of a search: builds and caches the pages of the searches left to run from the
+        responses to the queries of `search_queries`
+        Args:
+            plan (SearchPlan): the plan returned by `plan_searches`
+            responses (list): the hits of each query
+
+        Returns:
+            list: the page of each search of the plan, in order
+        """
+        responses = iter(responses)
+        for i, vector, count in zip(plan.pending, plan.vectors, plan.legs):
+            search = plan.searches[i]
+            plan.pages[i] = self._build_page(
+                [next(responses) for _ in range(count)], vector, search
+            )
+            self._cache_search(plan.cache_keys[i], plan.pages[i], search["filters"])
+        return plan.pages
+
+    def _hybrid_params(self, mode: str, k: int, hybrid: dict) -> dict:
+        """
+        Completes the hybrid settings of a search with the configured defaults
+        Args:
+            mode (str): the search mode
+            k (int): the number of results to return
+            hybrid (dict): the requested hybrid settings, may be None
+
+        Returns:
+            dict: every one of HYBRID_PARAMS, None when the search is not hybrid
+        """
+        if mode != SEARCH_MODE_HYBRID:
+            return None
+        hybrid = hybrid or {}
+        params = {
+            "lexical_k": hybrid.get("lexical_k", k),
+            "vector_k": hybrid.get("vector_k", k),
+            "lexical_weight": hybrid.get("lexical_weight", self.hybrid_lexical_weight),
+            "vector_weight": hybrid.get("vector_weight", self.hybrid_vector_weight),
+            "fusion": hybrid.get("fusion", self.hybrid_fusion),
+        }
+        if params["fusion"] not in FUSIONS:
+            raise ValueError(f"Unsupported fusion: {params['fusion']}")
+        return params
+
+    def _paged_by_opensearch(self, search: dict) -> bool:
+        """
+        Tells whether OpenSearch ranks the final hits of a search, so that its pages can be
+        fetched with `search_after`. The hits of hybrid searches and of quantized indexes are
+        ranked after fusion or rescoring, and paged by `_build_page` instead.
+        """
+        return search["hybrid"] is None and self.vector_data_type == DATA_TYPE_FLOAT
+
+    def _build_queries(self, vector: numpy.ndarray, search: dict) -> list:
+        """
+        Builds the OpenSearch queries of a search, the knn and the lexical legs of a hybrid search
+        Args:
+            vector (numpy.ndarray): the vectorized query
+            search (dict): the search, as returned by `_normalize_searches`
+
+        Returns:
+            list: the OpenSearch query dictionaries, in the order expected by `_build_page`
+        """
+        cursor = search["cursor"]
+        # ranks of the previous pages, the candidates must cover them to rank the page
+        depth = cursor["depth"] if cursor else 0
+        # the doc_id breaks score ties between pages
+        fields = dict.fromkeys([*search["fields"], "doc_id"])
+        includes = [f"metadata.{field}" for field in fields]
+        hybrid = search["hybrid"]
+        if self._paged_by_opensearch(search):
+            query = self._build_query(
+                vector,
+                depth + search["k"],
+                search["mode"],
+                search["filters"],
+                extra_filters=[CURSOR_FILTER],
+            )
+            query["size"] = search["k"]
+            query["sort"] = CURSOR_SORT
+            # scores are not computed when sorting on more than _score otherwise
+            query["track_scores"] = True
+            if cursor:
+                query["search_after"] = [cursor["score"], cursor["doc_id"]]
+            query["_source"] = {"includes": includes}
+            return [query]
+        if hybrid is None:
+            query = self._build_query(
+                vector, depth + search["k"], search["mode"], search["filters"]
+            )
+            query["_source"] = {"includes": includes + [EMBEDDING_FULL_FIELD]}
+            return [query]
+        vector_query = self._build_query(
+            vector, depth + hybrid["vector_k"], SEARCH_MODE_KNN, search["filters"]
+        )
+        if self.vector_data_type != DATA_TYPE_FLOAT:
+            vector_query["_source"] = {"includes": includes + [EMBEDDING_FULL_FIELD]}
+        else:
+            vector_query["_source"] = {"includes": includes}
+        lexical_query = build_opensearch_lexical_query(
+            search["q"],
+            LEXICAL_FIELDS,
+            depth + hybrid["lexical_k"],
+            filters=build_opensearch_filter(search["filters"]),
+        )
+        lexical_query["_source"] = {"includes": includes}
+        return [vector_query, lexical_query]
+
+    def _build_page(self, responses: list, vector: list, search: dict) -> dict:
+        """
+        Builds the page of a search from the responses to the queries of `_build_queries`
+        Args:
+            responses (list): the hits of each query
+            vector (list): the full precision query embedding
+            search (dict): the search, as returned by `_normalize_searches`
+
+        Returns:
+            dict: the results of the page and the cursor of the next page, see `search_page`
+        """
+        k = search["k"]
+        cursor = search["cursor"]
+        depth = cursor["depth"] if cursor else 0
+        hybrid = search["hybrid"]
+        if self._paged_by_opensearch(search):
+            hits = responses[0]
+        elif hybrid is None:
+            # every candidate is ranked, those of the previous pages are skipped by the cursor
+            hits = page_hits(
+                self._rescore(responses[0], vector, len(responses[0])), cursor, k
+            )
+        else:
+            vector_hits, lexical_hits = responses
+            vector_hits = self._rescore(vector_hits, vector, len(vector_hits))
+            fused = fuse_hits(
+                [vector_hits, lexical_hits],
+                [hybrid["vector_weight"], hybrid["lexical_weight"]],
+                len(vector_hits) + len(lexical_hits),
+                fusion=hybrid["fusion"],
+                rrf_k=self.hybrid_rrf_k,
+            )
+            hits = page_hits(fused, cursor, k)
+        next_cursor = None
+        if len(hits) == k:
+            last = hits[-1]
+            if self._paged_by_opensearch(search):
+                # the sort values of the last hit are what `search_after` expects back
+                score, doc_id = last["sort"]
+            else:
+                score, doc_id = last["_score"], hit_doc_id(last)
+            next_cursor = encode_cursor(score, doc_id, depth + k)
+        return {
+            "results": build_messages(hits, search["fields"]),
+            "next_cursor": next_cursor,
+        }
+
+    def _build_query(
+        self,
+        vector: numpy.ndarray,
+        k: int,
+        mode: str,
+        filters: dict,
+        extra_filters: list = None,
+    ) -> dict:
+        """
+        Builds the OpenSearch query of a search. On a quantized index the query is quantized
+        the same way as the documents, and oversampled candidates are requested for `_rescore`.
+        Args:
+            vector (numpy.ndarray): the vectorized query
+            k (int): the number of results to return
+            mode (str): "knn" or "exact"
+            filters (dict): metadata filters applied before scoring
+            extra_filters (list, optional): filter clauses applied along with the metadata filters
+
+        Returns:
+            dict: An OpenSearch query dictionary.
+        """
+        filter_clauses = build_opensearch_filter(filters) + (extra_filters or [])
+        if self.vector_data_type != DATA_TYPE_FLOAT:
+            vector = np.array(quantize_vector(vector, self.vector_data_type))
+            k = candidates_count(k, self.rescore_oversample)
+        if mode == SEARCH_MODE_KNN:
+            query = build_opensearch_knn_query(
+                vector,
+                EMBED_FIELD,
+                k,
+                ef_search=self.ef_search,
+                filters=filter_clauses,
+            )
+        else:
+            query = build_opensearch_vector_query(
+                vector, EMBED_FIELD, k, filters=filter_clauses
+            )
+        return query
+
+    def _rescore(self, hits: list, vector: list, k: int) -> list:
+        """
+        Rescores the oversampled candidates of a quantized index with their full precision embeddings
+        Args:
+            hits (list): the OpenSearch hits
+            vector (list): the full precision query embedding
+            k (int): the number of results to return
+
+        Returns:
+            list: the k best hits, the hits unchanged on a full precision index
+        """
+        if self.vector_data_type == DATA_TYPE_FLOAT:
+            return hits
+        return rescore_hits(hits, vector, k)
+
+    def _cached_search(self, search: dict) -> tuple:
+        """
+        Looks a search up in the search cache
+        Args:
+            search (dict): the search, as returned by `_normalize_searches`
+
+        Returns:
+            tuple: the cache key, None when caching is disabled, and the cached page, None on a miss
+        """
+        if self.search_cache is None:
+            return None, None
+        cache_key = build_search_cache_key(
+            search["q"],
+            search["k"],
+            search["mode"],
+            search["filters"],
+            search["hybrid"],
+            search["fields"],
+            search["cursor"],
+        )
+        return cache_key, self.search_cache.get(cache_key)
+
+    def _cache_search(self, cache_key: str, page: dict, filters: dict) -> None:
+        """
+        Stores the page of a search in the search cache
+        Args:
+            cache_key (str): the key returned by `_cached_search`, None when caching is disabled
+            page (dict): the search page
+            filters (dict): the metadata filters of the search
+        """
+        if cache_key is None:
+            return
+        scope = {
+            "twin_id": filters.get("twin_id"),
+            "source_name": filters.get("source_name"),
+        }
+        self.search_cache.set(cache_key, page, scope)
+
+
+class AsyncVectorizerUsecase(AbstractAsyncVectorizeUsecase):
+    """
+    Search usecase served from an event loop. The searches are planned, fused, rescored and
+    cached by a `VectorizerUsecase`, the query embedding runs on a bounded executor and the
+    OpenSearch requests are awaited, so a pending search holds no thread.
+    """
+
+    def __init__(
+        self,
+        usecase: VectorizerUsecase,
+        opensearch_service: AbstractAsyncOpensearchService,
+        logger: Logger,
+        executor: Executor,
+    ):
+        """
+        Initialize the Usecase.
+
+        Args:
+            usecase (VectorizerUsecase): Usecase providing the search settings, the query embedding and the search cache.
+            opensearch_service (AbstractAsyncOpensearchService): An instance of a class implementing the AbstractAsyncOpensearchService interface.
+            logger (Logger): Logger instance.
+            executor (Executor): Executor running the query embedding, its size bounds the concurrent forward passes.
+        """
+        self.usecase = usecase
+        self.opensearch_service = opensearch_service
+        self.logger = logger
+        self.executor = executor
+
+    async def search(
+        self,
+        query: str,
+        k: int = 10,
+        mode: str = None,
+        filters: dict = None,
+        hybrid: dict = None,
+        fields: list = None,
+        cursor: str = None,
+    ) -> list[dict[str, Any]]:
+        """
+        Performs a search request to the configured opensearch index, see `VectorizerUsecase.search`
+        Args:
+            query (str): the string to search in the indexed documents
+            k (int, optional): the number of results to return. Defaults to 10.
+            mode (str, optional): "knn", "exact" or "hybrid". Defaults to the configured search mode.
+            filters (dict, optional): metadata filters applied before scoring.
+            hybrid (dict, optional): per leg k and weights and fusion of a hybrid search.
+            fields (list, optional): metadata fields of each result. Defaults to DEFAULT_RESULT_FIELDS.
+            cursor (str, optional): the `next_cursor` of the previous page. Defaults to the first page.
+
+        Returns:
+            list[dict[str, Any]]: A list of matching documents.
+        """
+        page = await self.search_page(query, k, mode, filters, hybrid, fields, cursor)
+        return page["results"]
+
+    async def search_page(
+        self,
+        query: str,
+        k: int = 10,
+        mode: str = None,
+        filters: dict = None,
+        hybrid: dict = None,
+        fields: list = None,
+        cursor: str = None,
+    ) -> dict[str, Any]:
+        """
+        Performs a search request to the configured opensearch index, see `VectorizerUsecase.search_page`
+
+        Returns:
+            dict[str, Any]: the matching documents under "results" and the cursor of the next page
+                under "next_cursor", None on the last page.
+        """
+        usecase = self.usecase
+        plan = usecase.plan_searches(
+            [
                 {
-                    "raw_text": result["_source"]["metadata"]["raw_text"],
-                    "source_name": result["_source"]["metadata"]["source_name"],
-                    "file_uuid": result["_source"]["metadata"]["file_uuid"],
+                    "q": query,
+                    "k": k,
+                    "mode": mode,
+                    "filters": filters,
+                    "hybrid": hybrid,
+                    "fields": fields,
+                    "cursor": cursor,
                 }
-                for result in results
             ]
-            return messages
+        )
+        if not plan.pending:
+            return plan.pages[0]
+        try:
+            v_query = await self._run(
+                usecase.llama_index_service.vectorize_string, query
+            )
+            queries = usecase.search_queries(plan, [v_query])
+            if len(queries) == 1:
+                responses = [await self.opensearch_service.search(queries[0])]
+            else:
+                responses = await self.opensearch_service.msearch(queries)
+            return usecase.finish_searches(plan, responses)[0]
         except ValueError as e:
             self.logger.error(f"ERROR: {e}")
             raise ValueError(e)
 
+    async def search_batch(
+        self, searches: list[dict[str, Any]]
+    ) -> list[dict[str, Any]]:
+        """
+        Performs several searches at once, see `VectorizerUsecase.search_batch`
+        Args:
+            searches (list[dict[str, Any]]): the searches, each one with its "q" string and optional
+                "k", "mode", "filters", "hybrid", "fields" and "cursor", as accepted by `search`
+
+        Returns:
+            list[dict[str, Any]]: The page of each search, as returned by `search_page`, in order.
+        """
+        usecase = self.usecase
+        plan = usecase.plan_searches(searches)
+        if not plan.pending:
+            return plan.pages
+
+        try:
+            vectors = await self._run(
+                usecase.llama_index_service.vectorize_strings, plan.texts
+            )
+            responses = await self.opensearch_service.msearch(
+                usecase.search_queries(plan, vectors)
+            )
+            return usecase.finish_searches(plan, responses)
+        except ValueError as e:
+            self.logger.error(f"ERROR: {e}")
+            raise ValueError(e)
+
+    async def _run(self, function: Callable, *args) -> Any:
+        """
+        Runs a blocking call on the executor without blocking the event loop
+        Args:
+            function (Callable): the blocking function
+            *args: its arguments
+
+        Returns:
+            Any: the return value of the function
+        """
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self.executor, function, *args)
+
+
+def build_messages(
+    results: list, fields: list = DEFAULT_RESULT_FIELDS
+) -> list[dict[str, Any]]:
+    """
+    Builds the search response messages from OpenSearch hits.
+    Args:
+        results (list): the OpenSearch hits
+        fields (list, optional): the metadata fields of each message. Defaults to DEFAULT_RESULT_FIELDS.
+    Returns:
+        list[dict[str, Any]]: the selected metadata fields of each hit
+    """
+    messages = []
+    for result in results:
+        metadata = result["_source"]["metadata"]
+        messages.append({field: metadata.get(field) for field in fields})
+    return messages
+
+
+def build_search_cache_key(
+    query: str,
+    k: int,
+    mode: str,
+    filters: dict,
+    hybrid: dict = None,
+    fields: list = None,
+    cursor: dict = None,
+) -> str:
+    """
+    Builds the search cache key, searches differing only in query case or spacing share a key.
+    Args:
+        query (str): the search text
+        k (int): the number of results
+        mode (str): the search mode
+        filters (dict): the metadata filters
+        hybrid (dict, optional): the hybrid settings
+        fields (list, optional): the returned metadata fields
+        cursor (dict, optional): the decoded cursor of the page
+    Returns:
+        str: the cache key
+    """
+    normalized = " ".join(query.split()).lower()
+    return json.dumps(
+        {
+            "q": normalized,
+            "k": k,
+            "mode": mode,
+            "filters": filters,
+            "hybrid": hybrid,
+            "fields": fields,
+            "cursor": cursor,
+        },
+        sort_keys=True,
+    )
+
+
+def encode_cursor(score: float, doc_id: str, depth: int) -> str:
+    """
+    Builds the opaque cursor of the page following a hit.
+    Args:
+        score (float): the score of the last hit of the page
+        doc_id (str): the document id of the last hit of the page
+        depth (int): the number of hits of this page and the previous ones
+    Returns:
+        str: the URL safe cursor
+    """
+    payload = json.dumps({"score": score, "doc_id": doc_id, "depth": depth})
+    return base64.urlsafe_b64encode(payload.encode("utf-8")).decode("ascii")
+
+
+def decode_cursor(cursor: str) -> dict:
+    """
+    Decodes a cursor built by `encode_cursor`.
+    Args:
+        cursor (str): the cursor
+    Returns:
+        dict: the "score", "doc_id" and "depth" of the cursor
+    Raises:
+        ValueError: if the cursor is malformed
+    """
+    try:
+        decoded = json.loads(base64.urlsafe_b64decode(cursor.encode("ascii")))
+        score, doc_id, depth = decoded["score"], decoded["doc_id"], decoded["depth"]
+    except (ValueError, TypeError, KeyError, UnicodeEncodeError):
+        raise ValueError("Invalid cursor")
+    if (
+        not isinstance(score, (int, float))
+        or not isinstance(doc_id, str)
+        or not isinstance(depth, int)
+        or depth < 0
+    ):
+        raise ValueError("Invalid cursor")
+    return {"score": score, "doc_id": doc_id, "depth": depth}
+
+
+def hit_doc_id(hit: dict) -> str:
+    """
+    Returns the document id of a hit, its "metadata.doc_id" and its "_id" when missing.
+    """
+    return hit["_source"].get("metadata", {}).get("doc_id") or hit["_id"]
+
+
+def page_hits(hits: list, cursor: dict, k: int) -> list:
+    """
+    Pages hits ranked after fusion or rescoring, in the CURSOR_SORT order.
+    Args:
+        hits (list): the hits of the page and of the previous pages
+        cursor (dict): the decoded cursor of the page, None for the first page
+        k (int): the number of hits of the page
+    Returns:
+        list: the k best hits ranked after the cursor
+    """
+    ranked = sorted(hits, key=lambda hit: (-hit["_score"], hit_doc_id(hit)))
+    if cursor is not None:
+        after = (-cursor["score"], cursor["doc_id"])
+        ranked = [hit for hit in ranked if (-hit["_score"], hit_doc_id(hit)) > after]
+    return ranked[:k]
+
+
+def build_opensearch_filter(filters: dict) -> list:
+    """
+    Builds the OpenSearch filter clauses for the given metadata filters.
+    Args:
+        filters (dict): Values to match for any of FILTER_FIELDS, either a string or a list of strings,
+            and an optional `created_at` range using the gt/gte/lt/lte operators.
+    Returns:
+        list: A list of OpenSearch filter clauses, empty when there is nothing to filter.
+    """
+    clauses = []
+    for field in FILTER_FIELDS:
+        value = filters.get(field)
+        if value is None:
+            continue
+        if isinstance(value, list):
+            clauses.append({"terms": {f"metadata.{field}.keyword": value}})
+        else:
+            clauses.append({"term": {f"metadata.{field}.keyword": value}})
+
+    date_range = filters.get(DATE_FILTER_FIELD)
+    if date_range:
+        clauses.append({"range": {f"metadata.{DATE_FILTER_FIELD}": date_range}})
+
+    return clauses
+
 
 def build_opensearch_vector_query(
-    query_vector: numpy.ndarray, field_name: str, k: int = 10
+    query_vector: numpy.ndarray,
+    field_name: str,
+    k: int = 10,
+    filters: list = None,
 ) -> dict:
     """
     Builds an OpenSearch query for searching in vector fields sorted by cosine similarity.
@@ -103,15 +1040,20 @@ def build_opensearch_vector_query(
         query_vector (numpy.ndarray): The vectorized representation of the input query.
         field_name (str): The name of the knn_vector field in your OpenSearch index.
         k (int, optional): The number of nearest neighbors to return. Defaults to 10.
+        filters (list, optional): Filter clauses restricting the documents that get scored.
     Returns:
         dict: An OpenSearch query dictionary.
     """
+    if filters:
+        candidates = {"bool": {"filter": filters}}
+    else:
+        candidates = {"match_all": {}}
 
     query = {
         "size": k,
         "query": {
             "script_score": {
-                "query": {"match_all": {}},
+                "query": candidates,
                 "script": {
                     "source": "cosineSimilarity(params.query_vector, doc['{}']) + 1.0".format(
                         field_name
@@ -123,3 +1065,105 @@ def build_opensearch_vector_query(
     }
 
     return query
+
+
+def build_opensearch_knn_query(
+    query_vector: numpy.ndarray,
+    field_name: str,
+    k: int = 10,
+    ef_search: int = None,
+    filters: list = None,
+) -> dict:
+    """
+    Builds an approximate k-NN OpenSearch query, served by the HNSW graph of the knn_vector field.
+    Args:
+        query_vector (numpy.ndarray): The vectorized representation of the input query.
+        field_name (str): The name of the knn_vector field in your OpenSearch index.
+        k (int, optional): The number of nearest neighbors to return. Defaults to 10.
+        ef_search (int, optional): The HNSW candidate list size, higher values trade latency for recall.
+            Defaults to the index setting.
+        filters (list, optional): Filter clauses applied during the graph traversal (efficient k-NN
+            filtering), so that only matching documents are scored.
+    Returns:
+        dict: An OpenSearch query dictionary.
+    """
+    knn = {"vector": query_vector.tolist(), "k": k}
+    if ef_search is not None:
+        knn["method_parameters"] = {"ef_search": ef_search}
+    if filters:
+        knn["filter"] = {"bool": {"filter": filters}}
+
+    query = {"size": k, "query": {"knn": {field_name: knn}}}
+
+    return query
+
+
+def build_opensearch_lexical_query(
+    query_text: str,
+    fields: tuple,
+    k: int = 10,
+    filters: list = None,
+) -> dict:
+    """
+    Builds a BM25 OpenSearch query matching the query terms in text fields, the lexical leg of
+    a hybrid search.
+    Args:
+        query_text (str): The text of the input query.
+        fields (tuple): The text fields matched against the query.
+        k (int, optional): The number of documents to return. Defaults to 10.
+        filters (list, optional): Filter clauses restricting the documents that get scored.
+    Returns:
+        dict: An OpenSearch query dictionary.
+    """
+    match = {"multi_match": {"query": query_text, "fields": list(fields)}}
+    if filters:
+        match = {"bool": {"must": [match], "filter": filters}}
+
+    query = {
+        "size": k,
+        "query": match,
+        # embeddings are not needed to fuse the lexical hits
+        "_source": {"excludes": [EMBED_FIELD, EMBEDDING_FULL_FIELD]},
+    }
+
+    return query
+
+
+def fuse_hits(
+    legs: list,
+    weights: list,
+    k: int = 10,
+    fusion: str = FUSION_RRF,
+    rrf_k: int = 60,
+) -> list:
+    """
+    Fuses the ranked hits of several queries into a single ranking.
+    Args:
+        legs (list): The hits of each query, best first.
+        weights (list): The weight of each query in the fused score.
+        k (int, optional): The number of hits to return. Defaults to 10.
+        fusion (str, optional): "rrf" sums weight / (rrf_k + rank) over the legs, "blend" sums the
+            weighted scores of each leg min-max normalized to [0, 1]. Defaults to "rrf".
+        rrf_k (int, optional): Rank constant of the reciprocal rank fusion. Defaults to 60.
+    Returns:
+        list: The best k hits by fused score, a hit found by several legs is returned once.
+    """
+    if fusion not in FUSIONS:
+        raise ValueError(f"Unsupported fusion: {fusion}")
+    scores = {}
+    hits_by_id = {}
+    for hits, weight in zip(legs, weights):
+        if fusion == FUSION_RRF:
+            leg_scores = [1.0 / (rrf_k + rank) for rank in range(1, len(hits) + 1)]
+        else:
+            raw_scores = [hit["_score"] for hit in hits]
+            low, high = min(raw_scores, default=0), max(raw_scores, default=0)
+            leg_scores = [
+                (score - low) / (high - low) if high > low else 1.0
+                for score in raw_scores
+            ]
+        for hit, score in zip(hits, leg_scores):
+            hits_by_id.setdefault(hit["_id"], hit)
+            scores[hit["_id"]] = scores.get(hit["_id"], 0.0) + weight * score
+    ranked = sorted(scores, key=scores.get, reverse=True)[:k]
+    return [{**hits_by_id[hit_id], "_score": scores[hit_id]} for hit_id in ranked]
@@ -1,3 +1,58 @@
+import copy
+
+from core.utils.quantization import (
+    DATA_TYPE_BYTE,
+    DATA_TYPE_FLOAT,
+    DATA_TYPE_FLOAT16,
+    DATA_TYPES,
+    EMBEDDING_FULL_FIELD,
+)
+
+# Default HNSW parameters for the knn_vector embedding field
+KNN_ENGINE = "lucene"
+KNN_SPACE_TYPE = "cosinesimil"
+KNN_M = 16
+KNN_EF_CONSTRUCTION = 128
+KNN_EF_SEARCH = 100
+
+
+def build_knn_method(
+    engine: str = KNN_ENGINE,
+    space_type: str = KNN_SPACE_TYPE,
+    m: int = KNN_M,
+    ef_construction: int = KNN_EF_CONSTRUCTION,
+    data_type: str = DATA_TYPE_FLOAT,
+) -> dict:
+    """
+    Builds the HNSW method definition of the embedding knn_vector field
+    Args:
+        engine (str, optional): the knn engine (lucene, faiss or nmslib). Defaults to KNN_ENGINE.
+        space_type (str, optional): the vector space used to compute distances. Defaults to KNN_SPACE_TYPE.
+        m (int, optional): number of bidirectional links per graph node. Defaults to KNN_M.
+        ef_construction (int, optional): size of the candidate list used while building the graph. Defaults to KNN_EF_CONSTRUCTION.
+        data_type (str, optional): precision of the stored vectors, "float", "float16" or "byte". Defaults to "float".
+
+    Returns:
+        dict: the knn_vector method definition
+    """
+    if data_type not in DATA_TYPES:
+        raise ValueError(f"Unsupported vector data type: {data_type}")
+    if data_type == DATA_TYPE_FLOAT16 and engine != "faiss":
+        raise ValueError("float16 vectors require the faiss engine")
+    if data_type == DATA_TYPE_BYTE and engine != "lucene":
+        raise ValueError("byte vectors require the lucene engine")
+    parameters = {"m": m, "ef_construction": ef_construction}
+    if data_type == DATA_TYPE_FLOAT16:
+        # faiss scalar quantizer, vectors are kept as 16 bit floats in the graph files
+        parameters["encoder"] = {"name": "sq", "parameters": {"type": "fp16"}}
+    return {
+        "name": "hnsw",
+        "engine": engine,
+        "space_type": space_type,
+        "parameters": parameters,
+    }
+
+
 MAPPINGS = {
     "mappings": {
         "properties": {
@@ -5,7 +60,11 @@ MAPPINGS = {
                 "type": "text",
                 "fields": {"keyword": {"type": "keyword", "ignore_above": 256}},
             },
-            "embedding": {"type": "knn_vector", "dimension": 384},
+            "embedding": {
+                "type": "knn_vector",
+                "dimension": 384,
+                "method": build_knn_method(),
+            },
             "metadata": {
                 "properties": {
                     "_node_content": {
@@ -16,6 +75,11 @@ MAPPINGS = {
                         "type": "text",
                         "fields": {"keyword": {"type": "keyword", "ignore_above": 256}},
                     },
+                    "channelId": {
+                        "type": "text",
+                        "fields": {"keyword": {"type": "keyword", "ignore_above": 256}},
+                    },
+                    "created_at": {"type": "date"},
                     "doc_id": {
                         "type": "text",
                         "fields": {"keyword": {"type": "keyword", "ignore_above": 256}},
@@ -62,9 +126,157 @@ MAPPINGS = {
     },
     "settings": {
         "index": {
+            "knn": True,
+            "knn.algo_param.ef_search": KNN_EF_SEARCH,
             "replication": {"type": "DOCUMENT"},
             "number_of_shards": "1",
             "number_of_replicas": "1",
         }
     },
 }
+
+# manifests of ingested S3 objects, the doc ids are only kept in _source
+MANIFEST_MAPPINGS = {
+    "mappings": {
+        "dynamic": False,
+        "properties": {
+            "etag": {"type": "keyword"},
+            "doc_ids": {"type": "object", "enabled": False},
+        },
+    },
+    "settings": {"index": {"number_of_shards": "1", "number_of_replicas": "1"}},
+}
+
+# background jobs, only the fields used to claim them are indexed
+JOBS_MAPPINGS = {
+    "mappings": {
+        "dynamic": False,
+        "properties": {
+            "status": {"type": "keyword"},
+            "created_at": {"type": "double"},
+            "heartbeat_at": {"type": "double"},
+        },
+    },
+    "settings": {"index": {"number_of_shards": "1", "number_of_replicas": "1"}},
+}
+
+
+def build_mappings(
+    engine: str = KNN_ENGINE,
+    space_type: str = KNN_SPACE_TYPE,
+    m: int = KNN_M,
+    ef_construction: int = KNN_EF_CONSTRUCTION,
+    ef_search: int = KNN_EF_SEARCH,
+    data_type: str = DATA_TYPE_FLOAT,
+) -> dict:
+    """
+    Builds the index body with a knn enabled embedding field using the given HNSW parameters
+    Args:
+        engine (str, optional): the knn engine (lucene, faiss or nmslib). Defaults to KNN_ENGINE.
+        space_type (str, optional): the vector space used to compute distances. Defaults to KNN_SPACE_TYPE.
+        m (int, optional): number of bidirectional links per graph node. Defaults to KNN_M.
+        ef_construction (int, optional): size of the candidate list used while building the graph. Defaults to KNN_EF_CONSTRUCTION.
+        ef_search (int, optional): default size of the candidate list used while searching. Defaults to KNN_EF_SEARCH.
+        data_type (str, optional): precision of the stored vectors, "float", "float16" or "byte". Quantized
+            indices also keep the full precision vectors, unindexed, for rescoring. Defaults to "float".
+
+    Returns:
+        dict: the index mappings and settings
+    """
+    mappings = copy.deepcopy(MAPPINGS)
+    properties = mappings["mappings"]["properties"]
+    properties["embedding"]["method"] = build_knn_method(
+        engine, space_type, m, ef_construction, data_type
+    )
+    if data_type == DATA_TYPE_BYTE:
+        properties["embedding"]["data_type"] = DATA_TYPE_BYTE
+    if data_type != DATA_TYPE_FLOAT:
+        # stored in _source only, it takes no heap nor graph memory
+        properties[EMBEDDING_FULL_FIELD] = {"type": "object", "enabled": False}
+    mappings["settings"]["index"]["knn.algo_param.ef_search"] = ef_search
+    return mappings
+
+
+def _version_tuple(version: str) -> tuple:
+    return tuple(int(part) for part in version.split("-")[0].split(".")[:3])
+
+
+def check_knn_settings(
+    engine: str,
+    space_type: str,
+    ef_search: int,
+    query_ef_search: int = None,
+    version: str = None,
+) -> list:
+    """
+    Checks the knn settings against the engine and the OpenSearch version of the cluster
+    Args:
+        engine (str): the knn engine (lucene, faiss or nmslib).
+        space_type (str): the vector space used to compute distances.
+        ef_search (int): index level size of the candidate list used while searching.
+        query_ef_search (int, optional): per query ef_search override. Defaults to None.
+        version (str, optional): OpenSearch version of the cluster, not checked when unknown. Defaults to None.
+
+    Raises:
+        ValueError: If the settings would make index creation or every search fail.
+
+    Returns:
+        list: warnings about the settings that have no effect
+    """
+    warnings = []
+    cluster_version = _version_tuple(version) if version else None
+    if engine == "faiss" and space_type == "cosinesimil":
+        if cluster_version is not None and cluster_version < (2, 19):
+            raise ValueError(
+                f"The faiss engine supports cosinesimil from OpenSearch 2.19, the cluster runs {version}, "
+                f"use KNN_SPACE_TYPE=innerproduct (the embeddings are normalized) or l2"
+            )
+    if query_ef_search is not None:
+        if cluster_version is not None and cluster_version < (2, 16):
+            raise ValueError(
+                f"KNN_QUERY_EF_SEARCH requires OpenSearch 2.16 or newer, the cluster runs {version}"
+            )
+    elif engine == "lucene" and ef_search != KNN_EF_SEARCH:
+        warnings.append(
+            f"KNN_EF_SEARCH={ef_search} has no effect with the lucene engine, which ignores "
+            f"index.knn.algo_param.ef_search, use KNN_QUERY_EF_SEARCH or the faiss or nmslib engine"
+        )
+    return warnings
+
+
+def knn_settings_drift(index: dict, mappings: dict) -> list:
+    """
+    Lists the knn settings of an existing index which differ from the configured ones. The HNSW
+    method and the data type are fixed when the index is created, so they only change on reindex.
+    Args:
+        index (dict): the existing index, as returned by indices.get for its name.
+        mappings (dict): the index body built from the configuration, see build_mappings.
+
+    Returns:
+        list: the differing settings, formatted as "name: existing != configured"
+    """
+    existing = index["mappings"]["properties"].get("embedding", {})
+    configured = mappings["mappings"]["properties"]["embedding"]
+    existing_method = existing.get("method", {})
+    configured_method = configured["method"]
+    pairs = [
+        ("engine", existing_method.get("engine"), configured_method["engine"]),
+        (
+            "space_type",
+            existing_method.get("space_type"),
+            configured_method["space_type"],
+        ),
+        (
+            "data_type",
+            existing.get("data_type", DATA_TYPE_FLOAT),
+            configured.get("data_type", DATA_TYPE_FLOAT),
+        ),
+    ]
+    existing_parameters = existing_method.get("parameters", {})
+    for name, value in configured_method["parameters"].items():
+        pairs.append((name, existing_parameters.get(name), value))
+    return [
+        f"{name}: {existing_value} != {configured_value}"
+        for name, existing_value, configured_value in pairs
+        if str(existing_value) != str(configured_value)
+    ]
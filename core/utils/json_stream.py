@@ -0,0 +1,88 @@
+import json
+from typing import Any, Iterable, Iterator
+
+_WHITESPACE = " \t\n\r"
+# characters a JSON number may continue with
+_NUMBER_CHARS = "0123456789.eE+-"
+
+
+def iter_json_array(chunks: Iterable[str]) -> Iterator[Any]:
+    """
+    Incrementally parses a JSON array from text chunks, yielding its items one by one
+    so that only the item being parsed has to be kept in memory.
+    Args:
+        chunks (Iterable[str]): consecutive pieces of the JSON document
+
+    Returns:
+        Iterator[Any]: the decoded array items
+
+    Raises:
+        ValueError: if the document is not a well formed JSON array
+    """
+    decoder = json.JSONDecoder()
+    buffer = ""
+    started = False
+    expect_item = True
+    after_comma = False
+    finished = False
+
+    for chunk in _with_end_marker(chunks):
+        at_end = chunk is None
+        if not at_end:
+            buffer += chunk
+        pos = 0
+        while not finished:
+            while pos < len(buffer) and buffer[pos] in _WHITESPACE:
+                pos += 1
+            if pos >= len(buffer):
+                break
+            char = buffer[pos]
+            if not started:
+                if char != "[":
+                    raise ValueError("Expected a JSON array")
+                started = True
+                pos += 1
+            elif char == "]":
+                if after_comma:
+                    raise ValueError("Unexpected ']' after ','")
+                finished = True
+                pos += 1
+            elif not expect_item:
+                if char != ",":
+                    raise ValueError(f"Expected ',' or ']' but found {char!r}")
+                expect_item = True
+                after_comma = True
+                pos += 1
+            else:
+                try:
+                    item, end = decoder.raw_decode(buffer, pos)
+                except json.JSONDecodeError:
+                    if at_end:
+                        raise ValueError("Truncated or malformed JSON array")
+                    # the item continues in the next chunk
+                    break
+                if (
+                    not at_end
+                    and isinstance(item, (int, float))
+                    and not buffer[end:].strip(_NUMBER_CHARS)
+                ):
+                    # the number may continue in the next chunk, e.g. "1." followed by "5"
+                    break
+                yield item
+                expect_item = False
+                after_comma = False
+                pos = end
+        buffer = buffer[pos:]
+
+    if not finished:
+        raise ValueError("Truncated JSON array")
+    if buffer.strip(_WHITESPACE):
+        raise ValueError("Unexpected data after the JSON array")
+
+
+def _with_end_marker(chunks: Iterable[str]) -> Iterator[str]:
+    """
+    Yields every chunk followed by None to signal the end of the stream
+    """
+    yield from chunks
+    yield None
@@ -0,0 +1,178 @@
+import functools
+import inspect
+import os
+from typing import Callable
+
+from prometheus_client import (
+    REGISTRY,
+    CollectorRegistry,
+    Counter,
+    Gauge,
+    Histogram,
+    generate_latest,
+    multiprocess,
+)
+
+# latency buckets in seconds, from sub-millisecond cache hits to multi-minute ingestions
+LATENCY_BUCKETS = (
+    0.0005,
+    0.001,
+    0.0025,
+    0.005,
+    0.01,
+    0.025,
+    0.05,
+    0.1,
+    0.25,
+    0.5,
+    1.0,
+    2.5,
+    5.0,
+    10.0,
+    30.0,
+    60.0,
+    300.0,
+)
+# batch size buckets
+SIZE_BUCKETS = (1, 2, 4, 8, 16, 32, 64, 128, 256, 512, 1024)
+
+STAGE_SECONDS = Histogram(
+    "vector_stage_seconds",
+    "Time spent in each stage of ingestion and search",
+    ("stage",),
+    buckets=LATENCY_BUCKETS,
+)
+DOCUMENTS = Counter(
+    "vector_documents_total",
+    "Documents read, indexed or skipped by ingestion",
+    ("outcome",),
+)
+TEXTS = Counter("vector_texts_total", "Texts preprocessed or embedded", ("operation",))
+S3_BYTES = Counter("vector_s3_bytes_total", "Bytes read from S3 objects")
+REQUEST_SECONDS = Histogram(
+    "vector_request_seconds",
+    "Time spent handling API requests",
+    ("endpoint",),
+    buckets=LATENCY_BUCKETS,
+)
+REQUESTS = Counter(
+    "vector_requests_total", "API requests by response status", ("endpoint", "status")
+)
+EMBED_DISPATCH_BATCH_SIZE = Histogram(
+    "vector_embed_dispatch_batch_size",
+    "Texts per coalesced query embedding forward pass",
+    buckets=SIZE_BUCKETS,
+)
+# gauges of the worker processes still alive are summed, or maxed, in multiprocess mode
+EMBED_DISPATCH_QUEUE_DEPTH = Gauge(
+    "vector_embed_dispatch_queue_depth",
+    "Query embeddings waiting for a forward pass",
+    multiprocess_mode="livesum",
+)
+OPENSEARCH_RETRIES = Counter(
+    "vector_opensearch_retries_total",
+    "OpenSearch requests retried, by failure status",
+    ("status",),
+)
+OPENSEARCH_CIRCUIT_OPEN = Gauge(
+    "vector_opensearch_circuit_open",
+    "1 while the OpenSearch circuit breaker rejects requests",
+    multiprocess_mode="livemax",
+)
+
+
+def stage(name: str) -> Histogram:
+    """
+    Returns the histogram child of an ingestion or search stage.
+
+    Args:
+        name (str): Name of the stage
+
+    Returns:
+        Histogram: the stage histogram, use `.time()` to measure a block
+    """
+    return STAGE_SECONDS.labels(stage=name)
+
+
+def stage_totals() -> dict:
+    """
+    Returns the time spent in every stage by this process so far, and its number of calls. The
+    difference of two calls measures the stages of the code run in between, e.g. by the
+    benchmarks.
+
+    Returns:
+        dict: the (seconds, calls) of each stage name
+    """
+    seconds = {}
+    calls = {}
+    for metric in STAGE_SECONDS.collect():
+        for sample in metric.samples:
+            name = sample.labels["stage"]
+            if sample.name.endswith("_sum"):
+                seconds[name] = sample.value
+            elif sample.name.endswith("_count"):
+                calls[name] = int(sample.value)
+    return {name: (seconds[name], calls[name]) for name in seconds}
+
+
+def render() -> bytes:
+    """
+    Renders the metrics of the process in the Prometheus text format, or the ones of every
+    worker process when PROMETHEUS_MULTIPROC_DIR is set.
+
+    Returns:
+        bytes: the exposition text
+    """
+    if os.environ.get("PROMETHEUS_MULTIPROC_DIR"):
+        registry = CollectorRegistry()
+        multiprocess.MultiProcessCollector(registry)
+        return generate_latest(registry)
+    return generate_latest(REGISTRY)
+
+
+def instrumented(endpoint: str) -> Callable:
+    """
+    Records the latency and the response status of a controller method returning a
+    (response, status) tuple, sync or async.
+
+    Args:
+        endpoint (str): Name of the endpoint in the metrics.
+
+    Returns:
+        Callable: the method decorator
+    """
+    seconds = REQUEST_SECONDS.labels(endpoint=endpoint)
+
+    def record(status: int) -> None:
+        REQUESTS.labels(endpoint=endpoint, status=int(status)).inc()
+
+    def decorator(method: Callable) -> Callable:
+        if inspect.iscoroutinefunction(method):
+
+            @functools.wraps(method)
+            async def async_wrapper(*args, **kwargs):
+                status = 500
+                try:
+                    with seconds.time():
+                        response = await method(*args, **kwargs)
+                    status = response[1]
+                    return response
+                finally:
+                    record(status)
+
+            return async_wrapper
+
+        @functools.wraps(method)
+        def wrapper(*args, **kwargs):
+            status = 500
+            try:
+                with seconds.time():
+                    response = method(*args, **kwargs)
+                status = response[1]
+                return response
+            finally:
+                record(status)
+
+        return wrapper
+
+    return decorator
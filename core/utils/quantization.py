@@ -0,0 +1,78 @@
+import math
+
+import numpy as np
+
+# full precision embeddings, the default
+DATA_TYPE_FLOAT = "float"
+# half precision embeddings, encoded by the faiss scalar quantizer
+DATA_TYPE_FLOAT16 = "float16"
+# signed 8 bit embeddings, stored as lucene byte vectors
+DATA_TYPE_BYTE = "byte"
+DATA_TYPES = (DATA_TYPE_FLOAT, DATA_TYPE_FLOAT16, DATA_TYPE_BYTE)
+# unindexed copy of the full precision embedding, kept only in _source for rescoring
+EMBEDDING_FULL_FIELD = "embedding_full"
+# embeddings are unit length, so every component fits in [-1, 1]
+BYTE_SCALE = 127
+FLOAT16_MAX = float(np.finfo(np.float16).max)
+
+
+def quantize_vector(vector: list, data_type: str) -> list:
+    """
+    Converts an embedding to the precision stored in the knn_vector field
+    Args:
+        vector (list): the full precision embedding
+        data_type (str): "float", "float16" or "byte"
+
+    Returns:
+        list: the embedding as indexed, integers in [-128, 127] for byte vectors
+    """
+    if data_type == DATA_TYPE_BYTE:
+        values = np.rint(np.asarray(vector, dtype=np.float32) * BYTE_SCALE)
+        return np.clip(values, -128, 127).astype(np.int8).tolist()
+    if data_type == DATA_TYPE_FLOAT16:
+        # the faiss fp16 encoder rejects values out of the float16 range
+        values = np.clip(
+            np.asarray(vector, dtype=np.float32), -FLOAT16_MAX, FLOAT16_MAX
+        )
+        return values.astype(np.float16).astype(np.float32).tolist()
+    if data_type == DATA_TYPE_FLOAT:
+        return list(vector)
+    raise ValueError(f"Unsupported vector data type: {data_type}")
+
+
+def candidates_count(k: int, oversample: float) -> int:
+    """
+    Returns the number of candidates fetched from a quantized index to rescore k results
+    Args:
+        k (int): the number of results
+        oversample (float): candidates fetched per result
+
+    Returns:
+        int: the number of candidates, at least k
+    """
+    return max(k, math.ceil(k * oversample))
+
+
+def rescore_hits(hits: list, query_vector: list, k: int) -> list:
+    """
+    Rescores hits by the exact cosine similarity of their full precision embedding and keeps
+    the k best. Hits indexed without a full precision embedding keep their score.
+    Args:
+        hits (list): the OpenSearch hits, with EMBEDDING_FULL_FIELD in their _source
+        query_vector (list): the full precision query embedding
+        k (int): the number of hits to keep
+
+    Returns:
+        list: the k best hits, the full precision embedding removed from their _source
+    """
+    query = np.asarray(query_vector, dtype=np.float32)
+    query /= np.linalg.norm(query) or 1.0
+    for hit in hits:
+        full = hit["_source"].pop(EMBEDDING_FULL_FIELD, None)
+        if full is None:
+            continue
+        vector = np.asarray(full, dtype=np.float32)
+        cosine = float(vector @ query / (np.linalg.norm(vector) or 1.0))
+        # same scale as the score of a cosinesimil knn query
+        hit["_score"] = (1.0 + cosine) / 2.0
+    return sorted(hits, key=lambda hit: hit["_score"], reverse=True)[:k]
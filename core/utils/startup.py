@@ -0,0 +1,48 @@
+import threading
+import time
+from contextlib import contextmanager
+from logging import Logger
+
+# set once the service has loaded and warmed up its models
+ready = threading.Event()
+
+
+class StartupTimer:
+    """
+    Measures the duration of each startup stage and logs a breakdown.
+    """
+
+    def __init__(self, logger: Logger):
+        """
+        Initialize StartupTimer.
+
+        Args:
+            logger (Logger): Logger instance.
+        """
+        self.logger = logger
+        self.stages = []
+        self.started_at = time.perf_counter()
+
+    @contextmanager
+    def stage(self, name: str):
+        """
+        Measures the duration of the wrapped block.
+
+        Args:
+            name (str): Name of the stage
+        """
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.stages.append((name, time.perf_counter() - start))
+
+    def log_summary(self) -> None:
+        """
+        Logs the duration of every stage and the total startup time.
+        """
+        breakdown = ", ".join(
+            f"{name}={duration:.3f}s" for name, duration in self.stages
+        )
+        total = time.perf_counter() - self.started_at
+        self.logger.info(f"Startup timings: {breakdown}, total={total:.3f}s")
@@ -1,20 +1,48 @@
+import hashlib
+import threading
+from itertools import islice
+from typing import Iterable, Iterator
+
 import spacy
 
-nlp = spacy.load("en_core_web_sm")
+from core.utils import metrics
 
+# The lemma and stop-word filter only need the tokenizer, tagger, attribute ruler
+# and lemmatizer, so the dependency parser and NER are never run
+DISABLED_COMPONENTS = ["parser", "ner"]
 
-def preprocess_text(text: str) -> str:
+_nlp = None
+_nlp_lock = threading.Lock()
+
+_PREPROCESS_SECONDS = metrics.stage("preprocess")
+_PREPROCESSED_TEXTS = metrics.TEXTS.labels(operation="preprocess")
+
+
+def get_nlp() -> spacy.language.Language:
     """
-    Takes text as input, removes punctuation symbols, stop words and lemmatizes the text
+    Returns the SpaCy pipeline, loading it on first use. Loading it before forking worker
+    processes shares it between them.
+
+    Returns:
+        spacy.language.Language: the en_core_web_sm pipeline
+    """
+    global _nlp
+    if _nlp is None:
+        with _nlp_lock:
+            if _nlp is None:
+                _nlp = spacy.load("en_core_web_sm", disable=DISABLED_COMPONENTS)
+    return _nlp
+
+
+def _filter_tokens(doc) -> str:
+    """
+    Removes punctuation symbols and stop words from a processed document and lemmatizes it
     Args:
-        text (str): raw text string
+        doc (spacy.tokens.Doc): processed SpaCy document
 
     Returns:
         str: lemmatized, stop-word removed, lower-cased text
     """
-    # Process text using SpaCy
-    doc = nlp(text)
-
     # Initialize list to store tokens after preprocessing
     preprocessed_tokens = []
 
@@ -26,3 +54,84 @@ def preprocess_text(text: str) -> str:
             preprocessed_tokens.append(token.lemma_.lower())
 
     return " ".join(preprocessed_tokens)
+
+
+def preprocess_text(text: str) -> str:
+    """
+    Takes text as input, removes punctuation symbols, stop words and lemmatizes the text
+    Args:
+        text (str): raw text string
+
+    Returns:
+        str: lemmatized, stop-word removed, lower-cased text
+    """
+    # Process text using SpaCy
+    with _PREPROCESS_SECONDS.time():
+        processed = _filter_tokens(get_nlp()(text))
+    _PREPROCESSED_TEXTS.inc()
+    return processed
+
+
+def preprocess_texts(texts: list, batch_size: int = 256, n_process: int = 1) -> list:
+    """
+    Bulk version of `preprocess_text`, streams the texts through `nlp.pipe`
+    Args:
+        texts (list): raw text strings
+        batch_size (int, optional): number of texts buffered per pipe batch. Defaults to 256.
+        n_process (int, optional): number of worker processes used by SpaCy. Defaults to 1.
+
+    Returns:
+        list: lemmatized, stop-word removed, lower-cased texts in the same order as `texts`
+    """
+    with _PREPROCESS_SECONDS.time():
+        processed = [
+            _filter_tokens(doc)
+            for doc in get_nlp().pipe(texts, batch_size=batch_size, n_process=n_process)
+        ]
+    _PREPROCESSED_TEXTS.inc(len(processed))
+    return processed
+
+
+def batched(items: Iterable, size: int) -> Iterator[list]:
+    """
+    Splits an iterable into lists of at most `size` items, consuming it lazily
+    Args:
+        items (Iterable): items to split, a list or a stream
+        size (int): maximum number of items per batch
+
+    Returns:
+        Iterator[list]: the batches, in order
+    """
+    iterator = iter(items)
+    while batch := list(islice(iterator, size)):
+        yield batch
+
+
+def document_id(
+    twin_id: str, source_name: str, channelId: str, file_uuid: str, message: dict
+) -> str:
+    """
+    Builds a deterministic document id from the content of a message, scoped by the file it
+    belongs to, so that re-ingesting the same message always yields the same id
+    Args:
+        twin_id (str): Identifier for the twin.
+        source_name (str): Name of the data source.
+        channelId (str): Identifier for the channel.
+        file_uuid (str): UUID of the file containing the message.
+        message (dict): the message, with its text, user_id and created_at
+
+    Returns:
+        str: hex encoded SHA-256 of the scope and message content
+    """
+    parts = (
+        twin_id,
+        source_name,
+        channelId,
+        file_uuid,
+        message["user_id"],
+        message["created_at"],
+        message["text"],
+    )
+    # exports may hold null or numeric values, e.g. epoch timestamps
+    text = "\x1f".join(str(part) if part is not None else "" for part in parts)
+    return hashlib.sha256(text.encode("utf-8")).hexdigest()
@@ -0,0 +1,56 @@
+import gc
+import glob
+import os
+
+# The app, and with it the spaCy and HuggingFace models, is loaded once in the master
+# process and shared copy-on-write with the forked workers
+preload_app = True
+bind = f"0.0.0.0:{os.environ.get('PORT', '8080')}"
+workers = int(os.environ.get("GUNICORN_WORKERS") or "2")
+threads = int(os.environ.get("GUNICORN_THREADS") or "4")
+timeout = int(os.environ.get("GUNICORN_TIMEOUT") or "120")
+
+# Inference thread pools are not fork safe, so each worker warms the models up after forking,
+# whatever WARM_UP is set to in the environment or the .env file
+os.environ["WARM_UP"] = "post_fork"
+
+# Directory where prometheus_client keeps the metrics of each worker process, read by every
+# scrape. It must exist before the app, and its metrics, are loaded
+multiproc_dir = os.environ.get("PROMETHEUS_MULTIPROC_DIR")
+if multiproc_dir:
+    os.makedirs(multiproc_dir, exist_ok=True)
+
+
+def on_starting(server):
+    from config import Config
+
+    if workers > 1 and Config.JOBS_BACKEND == "memory":
+        # the status of a job is only known to the worker which queued it
+        server.log.warning(
+            'JOBS_BACKEND="memory" with several workers, set JOBS_BACKEND="opensearch"'
+        )
+    # counters restart from zero with the server
+    if multiproc_dir:
+        for path in glob.glob(os.path.join(multiproc_dir, "*.db")):
+            os.remove(path)
+
+
+def when_ready(server):
+    # Moves the preloaded objects out of the garbage collector's reach, so that collections
+    # in the workers do not touch, and copy, the pages shared with the master
+    gc.freeze()
+
+
+def post_fork(server, worker):
+    from main import reset_connections, warm_up
+
+    reset_connections()
+    warm_up()
+
+
+def child_exit(server, worker):
+    # the gauges of an exited worker no longer describe anything
+    if multiproc_dir:
+        from prometheus_client import multiprocess
+
+        multiprocess.mark_process_dead(worker.pid)
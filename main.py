@@ -1,19 +1,12 @@
-import boto3
 from dotenv import load_dotenv
-from flask import Flask, jsonify, request
-from llama_index.vector_stores.opensearch import (
-    OpensearchVectorClient,
-    OpensearchVectorStore,
-)
-from opensearchpy import OpenSearch, RequestsHttpConnection
+from flask import Flask, Response, jsonify, request
+from prometheus_client import CONTENT_TYPE_LATEST
 
+from bootstrap import build_usecase
 from config import Config
 from core.controller.vector import VectorController
-from core.service.llama_index_service import LlamaIndexService
-from core.service.opensearch_service import OpensearchService
-from core.service.s3_service import S3Service
-from core.usecase.vectorizer import VectorizerUsecase
-from core.utils.definitions import MAPPINGS
+from core.service.job_queue import InMemoryJobQueue, OpensearchJobQueue
+from core.utils import metrics, startup
 from core.utils.logger import logger
 
 load_dotenv()
@@ -21,74 +14,88 @@ load_dotenv()
 app = Flask(__name__)
 
 
-def initialize_app():
+def initialize_app(timer: startup.StartupTimer):
     cfg = Config()
     app.config.from_object(cfg)
+    usecase, llama_service, opensearch_client = build_usecase(cfg, timer)
+    if cfg.JOBS_BACKEND == "memory":
+        job_queue = InMemoryJobQueue(
+            usecase.vectorize_objects,
+            logger,
+            workers=cfg.JOBS_WORKERS,
+            maxsize=cfg.JOBS_QUEUE_SIZE,
+            history_size=cfg.JOBS_HISTORY_SIZE,
+        )
+    else:
+        job_queue = OpensearchJobQueue(
+            usecase.vectorize_objects,
+            opensearch_client,
+            cfg.JOBS_INDEX,
+            logger,
+            workers=cfg.JOBS_WORKERS,
+            maxsize=cfg.JOBS_QUEUE_SIZE,
+            lease=cfg.JOBS_LEASE_SECONDS,
+            poll_interval=cfg.JOBS_POLL_INTERVAL,
+            max_attempts=cfg.JOBS_MAX_ATTEMPTS,
+        )
+    controller = VectorController(
+        usecase,
+        logger,
+        max_workers=cfg.VECTORIZE_MAX_WORKERS,
+        job_queue=job_queue,
+        max_batch_queries=cfg.SEARCH_BATCH_MAX_QUERIES,
+    )
 
-    s3_client = boto3.client("s3")
-    s3_service = S3Service(s3_client, logger)
+    return controller, llama_service, job_queue, opensearch_client
 
-    host = {"host": cfg.OPENSEARCH_HOST, "port": cfg.OPENSEARCH_PORT}
 
-    # Opensearch initialization
-    try:
-        opensearch_client = OpenSearch(
-            hosts=[host],
-            http_auth=(cfg.OPENSEARCH_USER, cfg.OPENSEARCH_PASS),
-            use_ssl=True,
-            verify_certs=True,
-            connection_class=RequestsHttpConnection,
-        )
-        if not opensearch_client.indices.exists(index=cfg.OPENSEARCH_INDEX):
-            opensearch_client.indices.create(index=cfg.OPENSEARCH_INDEX, body=MAPPINGS)
-    except Exception as e:
-        logger.error(f"Failed to connect to OpenSearch: {e}")
-        raise
+startup_timer = startup.StartupTimer(logger)
+controller, llama_service, job_queue, opensearch_client = initialize_app(startup_timer)
 
-    opensearch_service = OpensearchService(
-        opensearch_client, cfg.OPENSEARCH_INDEX, logger
-    )
 
-    text_field = "content"
-    embedding_field = "embedding"
-    try:
-        os_vector_client = OpensearchVectorClient(
-            cfg.OPENSEARCH_HOST,
-            cfg.OPENSEARCH_INDEX,
-            384,
-            embedding_field=embedding_field,
-            text_field=text_field,
-            http_auth=(cfg.OPENSEARCH_USER, cfg.OPENSEARCH_PASS),
-            use_ssl=True,
-            verify_certs=True,
-            connection_class=RequestsHttpConnection,
-            timeout=10,
-            port="",
-        )
-        vector_store = OpensearchVectorStore(os_vector_client)
-    except Exception as e:
-        logger.error(f"Failed to initialize OpensearchVectorClient: {e}")
-        raise
+def reset_connections():
+    """
+    Closes the pooled OpenSearch connections, which are reopened on the next request. The app
+    talks to OpenSearch while it is loaded, so a forked worker must not keep using the sockets
+    it inherited from the preloading parent, they are shared with the parent and the other
+    workers (see gunicorn.conf.py).
+    """
+    opensearch_client.transport.close()
 
-    llama_service = LlamaIndexService(vector_store, logger)
-    usecase = VectorizerUsecase(s3_service, llama_service, opensearch_service, logger)
-    controller = VectorController(usecase, logger)
 
-    return controller
+def warm_up():
+    """
+    Runs a first inference, logs the startup timings and marks the service as ready.
+    When the app is preloaded by a parent process that forks workers, this runs in each
+    worker after the fork (see gunicorn.conf.py).
+    """
+    with startup_timer.stage("warm_up"):
+        llama_service.warm_up()
+    startup_timer.log_summary()
+    # picks up the jobs queued before a restart or by other workers
+    job_queue.start()
+    startup.ready.set()
 
 
-controller = initialize_app()
+if app.config["WARM_UP"] == "import":
+    warm_up()
 
 
 @app.route("/v1/api/vectorize", methods=["POST"])
 def vectorize():
     try:
         request_data = request.get_json()
-        return controller.vectoring(request_data)
+        asynchronous = request.args.get("async", "false").lower() == "true"
+        return controller.vectoring(request_data, asynchronous=asynchronous)
     except Exception as e:
         return jsonify({"error": "Failed to decode JSON object: " + str(e)}), 400
 
 
+@app.route("/v1/api/jobs/<job_id>", methods=["GET"])
+def job_status(job_id):
+    return controller.job_status(job_id)
+
+
 @app.route("/v1/api/search", methods=["POST"])
 def search():
     try:
@@ -98,10 +105,31 @@ def search():
         return jsonify({"error": "Failed to decode JSON object: " + str(e)}), 400
 
 
+@app.route("/v1/api/search/batch", methods=["POST"])
+def search_batch():
+    try:
+        request_data = request.get_json()
+        return controller.search_batch(request_data)
+    except Exception as e:
+        return jsonify({"error": "Failed to decode JSON object: " + str(e)}), 400
+
+
 @app.route("/health", methods=["GET"])
 def health():
     return jsonify({"status": "healthy"}), 200
 
 
+@app.route("/ready", methods=["GET"])
+def ready():
+    if not startup.ready.is_set():
+        return jsonify({"status": "starting"}), 503
+    return jsonify({"status": "ready"}), 200
+
+
+@app.route("/metrics", methods=["GET"])
+def prometheus_metrics():
+    return Response(metrics.render(), content_type=CONTENT_TYPE_LATEST)
+
+
 if __name__ == "__main__":
     app.run(debug=True)
@@ -0,0 +1,67 @@
+import json
+
+import pytest
+
+from backfill import Checkpoint
+
+
+def s3_object(key: str, size: int = 10) -> dict:
+    return {"Key": key, "Size": size}
+
+
+def test_watermark_only_moves_past_contiguous_done_keys(tmp_path):
+    checkpoint = Checkpoint(str(tmp_path / "cp.json"), "bucket", "prefix/")
+    for key in "abcd":
+        checkpoint.start(s3_object(key))
+    checkpoint.finish(s3_object("b"))
+    checkpoint.finish(s3_object("c"))
+    assert checkpoint.watermark is None
+    assert checkpoint.done == {"b", "c"}
+    checkpoint.finish(s3_object("a"))
+    assert checkpoint.watermark == "c"
+    assert checkpoint.done == set()
+    checkpoint.finish(s3_object("d"))
+    assert checkpoint.watermark == "d"
+    assert (checkpoint.objects, checkpoint.bytes) == (4, 40)
+
+
+def test_failed_keys_are_retried_and_do_not_block_the_watermark(tmp_path):
+    checkpoint = Checkpoint(str(tmp_path / "cp.json"), "bucket", "")
+    checkpoint.start(s3_object("a", 5))
+    checkpoint.start(s3_object("b"))
+    checkpoint.finish(s3_object("a", 5), "boom")
+    checkpoint.finish(s3_object("b"))
+    assert checkpoint.watermark == "b"
+    assert checkpoint.failed == {"a": {"size": 5, "error": "boom"}}
+    (retry,) = checkpoint.retries()
+    assert retry == {"Key": "a", "Size": 5, "retry": True}
+    checkpoint.start(retry)
+    checkpoint.finish(retry)
+    assert checkpoint.failed == {}
+    assert checkpoint.watermark == "b"
+    assert checkpoint.objects == 2
+
+
+def test_save_and_resume(tmp_path):
+    path = str(tmp_path / "cp.json")
+    checkpoint = Checkpoint(path, "bucket", "p/")
+    for key in ("p/a", "p/b", "p/c"):
+        checkpoint.start(s3_object(key))
+    checkpoint.finish(s3_object("p/a"))
+    checkpoint.finish(s3_object("p/c"), "boom")
+    checkpoint.save()
+    assert not (tmp_path / "cp.json.tmp").exists()
+
+    resumed = Checkpoint(path, "bucket", "p/")
+    assert resumed.watermark == "p/a"
+    assert resumed.done == {"p/c"}
+    assert list(resumed.failed) == ["p/c"]
+    assert resumed.objects == 1
+    assert json.loads((tmp_path / "cp.json").read_text())["bucket"] == "bucket"
+
+
+def test_refuses_the_checkpoint_of_another_backfill(tmp_path):
+    path = str(tmp_path / "cp.json")
+    Checkpoint(path, "bucket", "a/").save()
+    with pytest.raises(ValueError, match="checkpoint of s3://bucket/a/"):
+        Checkpoint(path, "bucket", "b/")
@@ -0,0 +1,57 @@
+import pytest
+
+from core.utils import cache
+from core.utils.cache import LRUCache
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    now = [1000.0]
+    monkeypatch.setattr(cache.time, "monotonic", lambda: now[0])
+    return now
+
+
+def test_get_and_set():
+    lru = LRUCache(maxsize=2)
+    assert lru.get("a") is None
+    lru.set("a", 1)
+    assert lru.get("a") == 1
+    assert lru.stats() == {"size": 1, "maxsize": 2, "hits": 1, "misses": 1}
+
+
+def test_evicts_least_recently_used():
+    lru = LRUCache(maxsize=2)
+    lru.set("a", 1)
+    lru.set("b", 2)
+    lru.get("a")
+    lru.set("c", 3)
+    assert lru.get("b") is None
+    assert lru.get("a") == 1
+    assert lru.get("c") == 3
+
+
+def test_entries_expire_after_ttl(clock):
+    lru = LRUCache(maxsize=10, ttl=5)
+    lru.set("a", 1)
+    clock[0] += 4.9
+    assert lru.get("a") == 1
+    clock[0] += 0.2
+    assert lru.get("a") is None
+    assert lru.stats()["size"] == 0
+
+
+def test_zero_maxsize_disables_caching():
+    lru = LRUCache(maxsize=0)
+    lru.set("a", 1)
+    assert lru.get("a") is None
+
+
+def test_delete_where_and_clear():
+    lru = LRUCache()
+    for i in range(5):
+        lru.set(i, i * 10)
+    assert lru.delete_where(lambda key, value: value >= 30) == 2
+    lru.delete(0)
+    assert [lru.get(i) for i in range(5)] == [None, 10, 20, None, None]
+    lru.clear()
+    assert lru.stats()["size"] == 0
@@ -0,0 +1,51 @@
+import pytest
+
+from core.utils.definitions import (
+    build_mappings,
+    check_knn_settings,
+    knn_settings_drift,
+)
+
+
+def test_lucene_warns_about_index_ef_search():
+    warnings = check_knn_settings("lucene", "cosinesimil", 200, None, "2.11.0")
+    assert len(warnings) == 1
+    assert "KNN_EF_SEARCH=200" in warnings[0]
+
+
+def test_lucene_default_ef_search_or_query_override_does_not_warn():
+    assert check_knn_settings("lucene", "cosinesimil", 100, None, "2.11.0") == []
+    assert check_knn_settings("lucene", "cosinesimil", 200, 200, "2.16.0") == []
+
+
+def test_faiss_reads_index_ef_search():
+    assert check_knn_settings("faiss", "innerproduct", 200, None, "2.11.0") == []
+
+
+def test_faiss_cosinesimil_requires_2_19():
+    with pytest.raises(ValueError):
+        check_knn_settings("faiss", "cosinesimil", 100, None, "2.18.0")
+    assert check_knn_settings("faiss", "cosinesimil", 100, None, "2.19.1") == []
+
+
+def test_query_ef_search_requires_2_16():
+    with pytest.raises(ValueError):
+        check_knn_settings("lucene", "cosinesimil", 100, 200, "2.15.0")
+
+
+def test_unknown_version_is_not_checked():
+    assert check_knn_settings("faiss", "cosinesimil", 100, 200) == []
+
+
+def test_knn_settings_drift():
+    existing = build_mappings("lucene", "cosinesimil", 16, 128)
+    assert (
+        knn_settings_drift(existing, build_mappings("lucene", "cosinesimil", 16, 128))
+        == []
+    )
+    drift = knn_settings_drift(
+        existing, build_mappings("faiss", "cosinesimil", 32, 128, data_type="float16")
+    )
+    assert "engine: lucene != faiss" in drift
+    assert "m: 16 != 32" in drift
+    assert any(line.startswith("encoder:") for line in drift)
@@ -0,0 +1,112 @@
+import multiprocessing
+import os
+
+import numpy as np
+import pytest
+
+from core.service import embedding_store
+from core.service.embedding_store import EmbeddingStore
+from core.utils.logger import logger
+
+
+def vector(seed: int) -> list:
+    return [float(seed), float(seed) / 2, -float(seed)]
+
+
+def make_store(path, max_rows=1000) -> EmbeddingStore:
+    return EmbeddingStore(
+        str(path), "org/model", logger, dimension=3, max_rows=max_rows
+    )
+
+
+def test_put_and_get(tmp_path):
+    store = make_store(tmp_path)
+    assert store.get_many(["a"]) == {}
+    store.put_many({"a": vector(1), "b": vector(2)})
+    assert store.get_many(["a", "b", "c"]) == {"a": vector(1), "b": vector(2)}
+
+
+def test_existing_texts_are_not_rewritten(tmp_path):
+    store = make_store(tmp_path)
+    store.put_many({"a": vector(1)})
+    store.put_many({"a": vector(9), "b": vector(2)})
+    assert store.get_many(["a"]) == {"a": vector(1)}
+    assert os.path.getsize(f"{store.prefix}.0.vec") == 2 * 3 * 4
+
+
+def test_rejects_vectors_of_another_dimension(tmp_path):
+    store = make_store(tmp_path)
+    with pytest.raises(ValueError):
+        store.put_many({"a": [1.0, 2.0]})
+
+
+def test_other_instances_see_appended_rows(tmp_path):
+    writer, reader = make_store(tmp_path), make_store(tmp_path)
+    assert reader.get_many(["a"]) == {}
+    writer.put_many({"a": vector(1)})
+    assert reader.get_many(["a"]) == {"a": vector(1)}
+
+
+def test_failed_append_does_not_shift_later_rows(tmp_path, monkeypatch):
+    store = make_store(tmp_path)
+    store.put_many({"a": vector(1)})
+
+    def failing_open(path, mode="r", *args, **kwargs):
+        if path.endswith(".idx") and mode == "ab":
+            # part of a digest makes it to disk before the write fails
+            with open(path, mode) as idx_file:
+                idx_file.write(b"partial")
+            raise OSError("No space left on device")
+        return open(path, mode, *args, **kwargs)
+
+    monkeypatch.setattr(embedding_store, "open", failing_open, raising=False)
+    with pytest.raises(OSError):
+        store.put_many({"b": vector(2)})
+    monkeypatch.undo()
+
+    store.put_many({"c": vector(3)})
+    reader = make_store(tmp_path)
+    assert reader.get_many(["a", "b", "c"]) == {"a": vector(1), "c": vector(3)}
+    assert os.path.getsize(f"{store.prefix}.0.vec") == 2 * 3 * 4
+
+
+def test_compaction_keeps_the_newest_half(tmp_path):
+    store = make_store(tmp_path, max_rows=4)
+    other = make_store(tmp_path, max_rows=4)
+    other.get_many(["t0"])
+    for i in range(5):
+        store.put_many({f"t{i}": vector(i)})
+    cached = store.get_many([f"t{i}" for i in range(5)])
+    assert cached == {"t3": vector(3), "t4": vector(4)}
+    assert not os.path.exists(f"{store.prefix}.0.vec")
+    # an instance still on the previous generation reloads the new one
+    assert other.get_many([f"t{i}" for i in range(5)]) == cached
+
+
+def _put_range(path, start, count):
+    store = make_store(path)
+    for i in range(start, start + count):
+        store.put_many({f"t{i}": vector(i), "shared": vector(-1)})
+
+
+def test_concurrent_processes_keep_rows_and_digests_aligned(tmp_path):
+    context = multiprocessing.get_context("fork")
+    processes = [
+        context.Process(target=_put_range, args=(tmp_path, start, 50))
+        for start in range(0, 200, 50)
+    ]
+    for process in processes:
+        process.start()
+    for process in processes:
+        process.join()
+        assert process.exitcode == 0
+    store = make_store(tmp_path)
+    texts = [f"t{i}" for i in range(200)]
+    cached = store.get_many(texts + ["shared"])
+    assert len(cached) == 201
+    for i in range(200):
+        assert cached[f"t{i}"] == vector(i)
+    # the shared text was written once
+    rows = os.path.getsize(f"{store.prefix}.0.vec") // (3 * 4)
+    assert rows == 201
+    assert np.fromfile(f"{store.prefix}.0.vec", dtype=np.float32).size == 201 * 3
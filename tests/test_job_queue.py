@@ -0,0 +1,176 @@
+import copy
+import time
+
+import pytest
+from opensearchpy import ConflictError, NotFoundError
+
+from core.abstracts.services import QueueFullError
+from core.service.job_queue import (
+    JOB_FAILED,
+    JOB_QUEUED,
+    JOB_RUNNING,
+    JOB_SUCCEEDED,
+    OpensearchJobQueue,
+)
+from core.utils.logger import logger
+
+
+class FakeOpensearch:
+    """
+    The few document APIs used by OpensearchJobQueue, with seq_no based concurrency control
+    """
+
+    def __init__(self):
+        self.docs = {}
+        self.seq_no = 0
+
+    def _write(self, doc_id: str, body: dict) -> dict:
+        self.seq_no += 1
+        self.docs[doc_id] = (copy.deepcopy(body), self.seq_no)
+        return {"_seq_no": self.seq_no, "_primary_term": 1}
+
+    def create(self, index, id, body):
+        if id in self.docs:
+            raise ConflictError(409, "version_conflict_engine_exception")
+        return self._write(id, body)
+
+    def index(self, index, id, body, if_seq_no, if_primary_term):
+        if self.docs[id][1] != if_seq_no or if_primary_term != 1:
+            raise ConflictError(409, "version_conflict_engine_exception")
+        return self._write(id, body)
+
+    def get(self, index, id):
+        if id not in self.docs:
+            raise NotFoundError(404, "not_found")
+        return {"_id": id, "_source": copy.deepcopy(self.docs[id][0])}
+
+    def count(self, index, body):
+        status = body["query"]["term"]["status"]
+        return {"count": sum(doc["status"] == status for doc, _ in self.docs.values())}
+
+    def search(self, index, body):
+        should = body["query"]["bool"]["should"]
+        stale = should[1]["bool"]["filter"][1]["range"]["heartbeat_at"]["lt"]
+        hits = [
+            {
+                "_id": doc_id,
+                "_source": copy.deepcopy(doc),
+                "_seq_no": seq_no,
+                "_primary_term": 1,
+            }
+            for doc_id, (doc, seq_no) in self.docs.items()
+            if doc["status"] == JOB_QUEUED
+            or (doc["status"] == JOB_RUNNING and doc["heartbeat_at"] < stale)
+        ]
+        hits.sort(key=lambda hit: hit["_source"]["created_at"])
+        return {"hits": {"hits": hits[: body["size"]]}}
+
+
+def make_queue(client, handler=None, **kwargs) -> OpensearchJobQueue:
+    def default_handler(payload, report_progress):
+        for _ in payload["objects"]:
+            report_progress(1)
+
+    job_queue = OpensearchJobQueue(
+        handler or default_handler, client, "jobs", logger, **kwargs
+    )
+    # jobs are claimed and run by the tests instead of background threads
+    job_queue.start = lambda: None
+    return job_queue
+
+
+def test_submitted_job_is_run_by_another_queue():
+    client = FakeOpensearch()
+    job_id = make_queue(client).submit({"objects": ["a", "b"]}, total=2)
+    assert make_queue(client).get(job_id)["status"] == JOB_QUEUED
+
+    worker = make_queue(client)
+    worker._run(*worker._claim())
+
+    job = make_queue(client).get(job_id)
+    assert job["id"] == job_id
+    assert job["status"] == JOB_SUCCEEDED
+    assert job["progress"] == {"done": 2, "total": 2}
+    assert job["errors"] == []
+    assert "payload" not in job
+
+
+def test_handler_errors_fail_the_job():
+    def handler(payload, report_progress):
+        report_progress(1, "bad object")
+        raise RuntimeError("boom")
+
+    client = FakeOpensearch()
+    job_queue = make_queue(client, handler)
+    job_id = job_queue.submit({"objects": ["a"]}, total=1)
+    job_queue._run(*job_queue._claim())
+    job = job_queue.get(job_id)
+    assert job["status"] == JOB_FAILED
+    assert job["errors"] == ["bad object", "boom"]
+
+
+def test_running_job_is_not_claimed_twice():
+    client = FakeOpensearch()
+    make_queue(client).submit({"objects": ["a"]}, total=1)
+    assert make_queue(client)._claim() is not None
+    assert make_queue(client)._claim() is None
+
+
+def test_claim_loses_the_race_on_conflict():
+    client = FakeOpensearch()
+    job_id = make_queue(client).submit({"objects": ["a"]}, total=1)
+    hit = client.search("jobs", make_search_body())["hits"]["hits"][0]
+    assert make_queue(client)._claim()[0] == job_id
+    stale_version = (hit["_seq_no"], hit["_primary_term"])
+    assert make_queue(client)._save(job_id, hit["_source"], stale_version) is None
+
+
+def test_job_without_heartbeat_is_claimed_again_then_failed():
+    client = FakeOpensearch()
+    job_id = make_queue(client).submit({"objects": ["a"]}, total=1)
+    for attempt in range(1, 3):
+        claimed = make_queue(client, lease=60, max_attempts=2)._claim()
+        assert claimed[1]["attempts"] == attempt
+        # the process running the job died without saving a heartbeat since
+        doc, seq_no = client.docs[job_id]
+        doc["heartbeat_at"] = time.time() - 120
+        client.docs[job_id] = (doc, seq_no)
+
+    assert make_queue(client, max_attempts=2)._claim() is None
+    job = make_queue(client).get(job_id)
+    assert job["status"] == JOB_FAILED
+    assert job["errors"] == ["Abandoned after 2 attempts"]
+
+
+def test_submit_rejects_jobs_when_full():
+    client = FakeOpensearch()
+    job_queue = make_queue(client, maxsize=1)
+    job_queue.submit({"objects": ["a"]}, total=1)
+    with pytest.raises(QueueFullError):
+        job_queue.submit({"objects": ["b"]}, total=1)
+
+
+def test_unknown_job():
+    assert make_queue(FakeOpensearch()).get("missing") is None
+
+
+def make_search_body() -> dict:
+    stale = time.time() - 60
+    return {
+        "query": {
+            "bool": {
+                "should": [
+                    {"term": {"status": JOB_QUEUED}},
+                    {
+                        "bool": {
+                            "filter": [
+                                {"term": {"status": JOB_RUNNING}},
+                                {"range": {"heartbeat_at": {"lt": stale}}},
+                            ]
+                        }
+                    },
+                ]
+            }
+        },
+        "size": 10,
+    }
@@ -0,0 +1,68 @@
+import json
+
+import pytest
+
+from core.utils.json_stream import iter_json_array
+
+
+def chunked(text: str, size: int) -> list:
+    return [text[i : i + size] for i in range(0, len(text), size)]
+
+
+@pytest.mark.parametrize("size", [1, 2, 3, 7, 1024])
+def test_yields_items_across_chunk_sizes(size):
+    items = [{"text": "hello, [world]", "n": 1}, [1, 2], 'a"b', None, True, {}]
+    text = json.dumps(items, indent=2)
+    assert list(iter_json_array(chunked(text, size))) == items
+
+
+def test_empty_array():
+    assert list(iter_json_array(["  [ ", " ]\n"])) == []
+
+
+def test_multibyte_characters():
+    items = [{"text": "café ☕ 日本"}]
+    assert (
+        list(iter_json_array(chunked(json.dumps(items, ensure_ascii=False), 1)))
+        == items
+    )
+
+
+def test_is_lazy():
+    def chunks():
+        yield '[{"a": 1}, '
+        raise AssertionError("read past the first item")
+
+    items = iter_json_array(chunks())
+    assert next(items) == {"a": 1}
+
+
+@pytest.mark.parametrize(
+    "text",
+    ['{"a": 1}', "[1, 2", "[1 2]", "[1] x", '[{"a": 1}', "", "[1,]", "[,1]", "[1.x]"],
+)
+def test_rejects_malformed_documents(text):
+    with pytest.raises(ValueError):
+        list(iter_json_array([text]))
+
+
+SPLIT_FIXTURES = [
+    "[1.5, -4.5e10, 4.25E-3, 10, 0]",
+    '[{"n": 1.5}, "1.5", 42, true, null, [2.0e1]]',
+    "[12345678901234567890, -0.0, 3]",
+    '[ "café ☕", {"a": [1, 2, {"b": "]"}]} ]',
+]
+
+
+@pytest.mark.parametrize("text", SPLIT_FIXTURES)
+def test_split_at_every_offset(text):
+    expected = json.loads(text)
+    for offset in range(len(text) + 1):
+        assert list(iter_json_array([text[:offset], text[offset:]])) == expected, offset
+
+
+@pytest.mark.parametrize("text", ["[1.5, 2,]", '[{"a": 1},\n]', "[1 2]", "[1.5e]"])
+def test_rejects_malformed_documents_split_at_every_offset(text):
+    for offset in range(len(text) + 1):
+        with pytest.raises(ValueError):
+            list(iter_json_array([text[:offset], text[offset:]]))
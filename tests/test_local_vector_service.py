@@ -0,0 +1,237 @@
+import json
+import os
+
+import numpy as np
+import pytest
+
+from core.service import local_vector_service
+from core.service.local_vector_service import LocalVectorService
+from core.usecase.vectorizer import (
+    CURSOR_FILTER,
+    CURSOR_SORT,
+    build_opensearch_knn_query,
+    build_opensearch_vector_query,
+)
+from core.utils.logger import logger
+
+
+def document(
+    doc_id: str, embedding: list, metadata: dict = None, twin_id: str = "a"
+) -> dict:
+    return {
+        "_id": f"node-{doc_id}",
+        "embedding": embedding,
+        "metadata": {"twin_id": twin_id, "doc_id": doc_id, **(metadata or {})},
+    }
+
+
+def knn_query(vector: list, k: int, filters: list = None) -> dict:
+    filters = filters or [{"term": {"metadata.twin_id.keyword": "a"}}]
+    return build_opensearch_knn_query(np.array(vector), "embedding", k, filters=filters)
+
+
+def paged_query(vector: list, k: int, exact: bool, after: list = None) -> dict:
+    filters = [{"term": {"metadata.twin_id.keyword": "a"}}, CURSOR_FILTER]
+    if exact:
+        query = build_opensearch_vector_query(
+            np.array(vector), "embedding", k, filters=filters
+        )
+    else:
+        query = knn_query(vector, k, filters)
+    query["sort"] = CURSOR_SORT
+    query["track_scores"] = True
+    if after is not None:
+        query["search_after"] = after
+    return query
+
+
+def doc_ids(hits: list) -> list:
+    return [hit["_source"]["metadata"]["doc_id"] for hit in hits]
+
+
+def random_documents(count: int, dimension: int, seed: int = 0) -> list:
+    rng = np.random.default_rng(seed)
+    vectors = rng.normal(size=(count, dimension))
+    # duplicated embeddings tie on their score
+    vectors[count // 2 :: 7] = vectors[0]
+    return [document(f"d{i:03d}", vector.tolist()) for i, vector in enumerate(vectors)]
+
+
+def test_paged_queries_sort_ties_by_doc_id(tmp_path):
+    local = LocalVectorService(str(tmp_path), logger, dimension=2)
+    local.bulk_index(
+        [
+            document("c", [1.0, 0.0]),
+            document("b", [1.0, 0.0]),
+            document("a", [0.0, 1.0]),
+            {
+                "_id": "node-orphan",
+                "embedding": [1.0, 0.0],
+                "metadata": {"twin_id": "a"},
+            },
+        ]
+    )
+    hits = local.search(paged_query([1.0, 0.0], 3, exact=False))
+    assert [hit["sort"] for hit in hits] == [[1.0, "b"], [1.0, "c"], [0.5, "a"]]
+
+
+@pytest.mark.parametrize("exact", [False, True])
+@pytest.mark.parametrize("ivf_min_rows", [0, 50])
+def test_search_after_walks_every_hit_once(tmp_path, exact, ivf_min_rows):
+    local = LocalVectorService(
+        str(tmp_path), logger, dimension=4, ivf_min_rows=ivf_min_rows, ivf_probes=100
+    )
+    local.bulk_index(random_documents(120, 4))
+    vector = [0.3, -0.2, 0.5, 0.1]
+    ranking = doc_ids(local.search(paged_query(vector, 120, exact)))
+    assert len(ranking) == 120
+
+    seen = []
+    after = None
+    while True:
+        # the JSON round trip of a cursor
+        page = local.search(paged_query(vector, 7, exact, after))
+        seen.extend(doc_ids(page))
+        if len(page) < 7:
+            break
+        after = json.loads(json.dumps(page[-1]["sort"]))
+    assert seen == ranking
+
+
+def test_knn_and_exact_scores(tmp_path):
+    local = LocalVectorService(str(tmp_path), logger, dimension=2)
+    local.bulk_index([document("a", [1.0, 0.0]), document("b", [0.0, 2.0])])
+    knn = local.search(knn_query([1.0, 0.0], 2))
+    assert [(hit["_id"], hit["_score"]) for hit in knn] == [
+        ("node-a", 1.0),
+        ("node-b", 0.5),
+    ]
+    exact = local.search(paged_query([0.0, 1.0], 2, exact=True))
+    assert [(hit["_id"], hit["_score"]) for hit in exact] == [
+        ("node-b", 2.0),
+        ("node-a", 1.0),
+    ]
+    # the _source only holds the requested fields
+    query = knn_query([1.0, 0.0], 1)
+    query["_source"] = {"includes": ["metadata.doc_id"]}
+    assert local.search(query)[0]["_source"] == {"metadata": {"doc_id": "a"}}
+
+
+def test_filters(tmp_path):
+    local = LocalVectorService(str(tmp_path), logger, dimension=2)
+    local.bulk_index(
+        [
+            document(
+                "a",
+                [1.0, 0.0],
+                {"source_name": "slack", "created_at": "2023-01-01T00:00:00Z"},
+            ),
+            document(
+                "b",
+                [1.0, 0.1],
+                {"source_name": "jira", "created_at": "2023-06-01T00:00:00Z"},
+            ),
+            document(
+                "c", [1.0, 0.2], {"source_name": "email", "created_at": "not a date"}
+            ),
+            document("d", [1.0, 0.0], twin_id="b"),
+        ]
+    )
+
+    def search(*filters):
+        twin = {"term": {"metadata.twin_id.keyword": "a"}}
+        return sorted(
+            doc_ids(local.search(knn_query([1.0, 0.0], 10, [twin, *filters])))
+        )
+
+    assert search() == ["a", "b", "c"]
+    assert search({"term": {"metadata.source_name.keyword": "jira"}}) == ["b"]
+    assert search({"terms": {"metadata.source_name.keyword": ["slack", "email"]}}) == [
+        "a",
+        "c",
+    ]
+    assert search({"range": {"metadata.created_at": {"gte": "2023-03-01"}}}) == ["b"]
+    assert search({"range": {"metadata.created_at": {"lt": "2023-03-01"}}}) == ["a"]
+    assert search({"exists": {"field": "metadata.source_name"}}) == ["a", "b", "c"]
+    with pytest.raises(ValueError):
+        search({"prefix": {"metadata.source_name.keyword": "sl"}})
+
+    both = [{"terms": {"metadata.twin_id.keyword": ["a", "b"]}}]
+    assert sorted(doc_ids(local.search(knn_query([1.0, 0.0], 10, both)))) == [
+        "a",
+        "b",
+        "c",
+        "d",
+    ]
+
+
+def test_deleted_documents_are_masked_until_indexed_again(tmp_path):
+    local = LocalVectorService(str(tmp_path), logger, dimension=2)
+    local.bulk_index([document("a", [1.0, 0.0]), document("b", [0.0, 1.0])])
+    assert local.delete_ids(["a", "missing"]) == 1
+    assert local.delete_ids(["a"]) == 0
+    assert doc_ids(local.search(knn_query([1.0, 0.0], 10))) == ["b"]
+    assert local.count("a") == 1
+    assert local.existing_ids(["node-a", "node-b"]) == {"node-b"}
+    scan = {
+        "query": {"bool": {"filter": [{"term": {"metadata.twin_id.keyword": "a"}}]}}
+    }
+    assert [hit["_id"] for hit in local.scan(scan)] == ["node-b"]
+
+    local.bulk_index([document("a", [1.0, 0.0])])
+    assert doc_ids(local.search(knn_query([1.0, 0.0], 10))) == ["a", "b"]
+
+
+def test_other_instances_see_appends_and_deletes(tmp_path):
+    writer = LocalVectorService(str(tmp_path), logger, dimension=2)
+    reader = LocalVectorService(str(tmp_path), logger, dimension=2)
+    assert reader.search(knn_query([1.0, 0.0], 10)) == []
+    writer.bulk_index([document("a", [1.0, 0.0]), document("b", [0.0, 1.0])])
+    # documents already present are not appended twice
+    writer.bulk_index([document("a", [1.0, 0.0])])
+    assert doc_ids(reader.search(knn_query([1.0, 0.0], 10))) == ["a", "b"]
+    writer.delete_ids(["b"])
+    assert doc_ids(reader.search(knn_query([1.0, 0.0], 10))) == ["a"]
+    assert os.path.getsize(tmp_path / "a" / "vectors.f32") == 2 * 2 * 4
+
+
+def test_ivf_searches_rows_appended_after_the_lists_were_built(tmp_path):
+    local = LocalVectorService(
+        str(tmp_path), logger, dimension=4, ivf_min_rows=50, ivf_probes=100
+    )
+    local.bulk_index(random_documents(100, 4))
+    local.search(knn_query([1.0, 0.0, 0.0, 0.0], 5))
+    local.bulk_index([document("new", [1.0, 0.0, 0.0, 0.0])])
+    assert doc_ids(local.search(knn_query([1.0, 0.0, 0.0, 0.0], 1))) == ["new"]
+
+
+def test_failed_append_does_not_shift_later_rows(tmp_path, monkeypatch):
+    local = LocalVectorService(str(tmp_path), logger, dimension=2)
+    local.bulk_index([document("a", [1.0, 0.0])])
+
+    def failing_open(path, mode="r", *args, **kwargs):
+        if path.endswith("docs.jsonl") and mode == "a":
+            # part of a line makes it to disk before the write fails
+            with open(path, mode) as docs_file:
+                docs_file.write('{"_id": "node-b"')
+            raise OSError("No space left on device")
+        return open(path, mode, *args, **kwargs)
+
+    monkeypatch.setattr(local_vector_service, "open", failing_open, raising=False)
+    with pytest.raises(OSError):
+        local.bulk_index([document("b", [0.0, 1.0])])
+    monkeypatch.undo()
+
+    local.bulk_index([document("c", [-1.0, 0.0])])
+    reader = LocalVectorService(str(tmp_path), logger, dimension=2)
+    hits = reader.search(knn_query([-1.0, 0.0], 10))
+    assert [(hit["_id"], hit["_score"]) for hit in hits] == [
+        ("node-c", 1.0),
+        ("node-a", 0.0),
+    ]
+
+
+def test_rejects_embeddings_of_another_dimension(tmp_path):
+    local = LocalVectorService(str(tmp_path), logger, dimension=2)
+    with pytest.raises(ValueError):
+        local.bulk_index([document("a", [1.0, 0.0, 0.0])])
@@ -0,0 +1,104 @@
+import asyncio
+import os
+import subprocess
+import sys
+
+from prometheus_client import REGISTRY
+
+from core.utils import metrics
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def test_stage_totals_accumulate_per_stage():
+    before = metrics.stage_totals().get("test_stage", (0.0, 0))
+    child = metrics.stage("test_stage")
+    child.observe(0.25)
+    child.observe(0.5)
+    seconds, calls = metrics.stage_totals()["test_stage"]
+    assert calls - before[1] == 2
+    assert seconds - before[0] == 0.75
+
+
+def requests(endpoint: str, status: int) -> float:
+    return (
+        REGISTRY.get_sample_value(
+            "vector_requests_total", {"endpoint": endpoint, "status": str(status)}
+        )
+        or 0
+    )
+
+
+def test_instrumented_records_the_status_of_sync_and_async_methods():
+    @metrics.instrumented("test_sync")
+    def handler(status):
+        if status is None:
+            raise RuntimeError("boom")
+        return "response", status
+
+    @metrics.instrumented("test_async")
+    async def async_handler(status):
+        return "response", status
+
+    assert handler(200) == ("response", 200)
+    try:
+        handler(None)
+    except RuntimeError:
+        pass
+    assert asyncio.run(async_handler(404)) == ("response", 404)
+
+    assert requests("test_sync", 200) == 1
+    assert requests("test_sync", 500) == 1
+    assert requests("test_async", 404) == 1
+    assert (
+        REGISTRY.get_sample_value(
+            "vector_request_seconds_count", {"endpoint": "test_sync"}
+        )
+        == 2
+    )
+
+
+def test_render_is_per_process_by_default():
+    metrics.stage("render_stage").observe(1)
+    text = metrics.render().decode()
+    assert 'vector_stage_seconds_count{stage="render_stage"} 1.0' in text
+    assert "# TYPE vector_documents_total counter" in text
+
+
+WORKERS_SCRIPT = """
+import os
+from prometheus_client import multiprocess
+from core.utils import metrics
+
+pids = []
+for open_circuit in (1, 0):
+    pid = os.fork()
+    if pid == 0:
+        metrics.DOCUMENTS.labels(outcome="read").inc(2 + open_circuit)
+        metrics.OPENSEARCH_CIRCUIT_OPEN.set(open_circuit)
+        os._exit(0)
+    os.waitpid(pid, 0)
+    pids.append(pid)
+print(metrics.render().decode())
+print("=" * 8)
+multiprocess.mark_process_dead(pids[0])
+print(metrics.render().decode())
+"""
+
+
+def test_multiprocess_mode_aggregates_every_worker(tmp_path):
+    # the mode is picked when prometheus_client is imported, so in a process of its own
+    result = subprocess.run(
+        [sys.executable, "-c", WORKERS_SCRIPT],
+        env={**os.environ, "PROMETHEUS_MULTIPROC_DIR": str(tmp_path)},
+        cwd=ROOT,
+        capture_output=True,
+        text=True,
+        check=True,
+    )
+    alive, after_exit = result.stdout.split("=" * 8)
+    assert 'vector_documents_total{outcome="read"} 5.0' in alive
+    assert "vector_opensearch_circuit_open 1.0" in alive
+    # the counters of an exited worker are kept, its live gauges are dropped
+    assert 'vector_documents_total{outcome="read"} 5.0' in after_exit
+    assert "vector_opensearch_circuit_open 0.0" in after_exit
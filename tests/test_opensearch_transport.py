@@ -0,0 +1,119 @@
+import pytest
+from opensearchpy import Transport, TransportError
+
+from core.service import opensearch_transport
+from core.service.opensearch_transport import CircuitBreaker, ResilientTransport
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    now = [1000.0]
+    monkeypatch.setattr(opensearch_transport.time, "monotonic", lambda: now[0])
+    return now
+
+
+def fail(breaker: CircuitBreaker, times: int) -> None:
+    for _ in range(times):
+        ticket = breaker.allow()
+        assert ticket is not None
+        breaker.record(ticket, False)
+
+
+def test_opens_after_consecutive_failures(clock):
+    breaker = CircuitBreaker(failure_threshold=3, reset_timeout=30)
+    fail(breaker, 2)
+    breaker.record(breaker.allow(), True)
+    fail(breaker, 2)
+    fail(breaker, 1)
+    assert breaker.allow() is None
+
+
+def test_lets_a_single_trial_through_after_the_reset_timeout(clock):
+    breaker = CircuitBreaker(failure_threshold=1, reset_timeout=30)
+    fail(breaker, 1)
+    clock[0] += 29
+    assert breaker.allow() is None
+    clock[0] += 1
+    assert breaker.allow() is not None
+    # a single trial at a time
+    assert breaker.allow() is None
+
+
+def test_successful_trial_closes_the_breaker(clock):
+    breaker = CircuitBreaker(failure_threshold=2, reset_timeout=30)
+    fail(breaker, 2)
+    clock[0] += 30
+    breaker.record(breaker.allow(), True)
+    fail(breaker, 1)
+    # the failure count restarted from zero
+    assert breaker.allow() is not None
+
+
+def test_failed_trial_opens_the_breaker_again(clock):
+    breaker = CircuitBreaker(failure_threshold=2, reset_timeout=30)
+    fail(breaker, 2)
+    clock[0] += 30
+    fail(breaker, 1)
+    clock[0] += 29
+    assert breaker.allow() is None
+    clock[0] += 1
+    assert breaker.allow() is not None
+
+
+def test_zero_threshold_disables_the_breaker(clock):
+    breaker = CircuitBreaker(failure_threshold=0)
+    fail(breaker, 100)
+    assert breaker.allow() is not None
+
+
+def test_other_errors_end_the_trial(clock, monkeypatch):
+    def perform_request(self, method, url, params=None, body=None, **kwargs):
+        raise ValueError("cannot serialize")
+
+    monkeypatch.setattr(Transport, "perform_request", perform_request)
+    breaker = CircuitBreaker(failure_threshold=1, reset_timeout=30)
+    transport = ResilientTransport([{"host": "localhost"}], circuit_breaker=breaker)
+    fail(breaker, 1)
+    clock[0] += 30
+    with pytest.raises(ValueError):
+        transport.perform_request("GET", "/index/_search")
+    # the failed trial opened the breaker again instead of leaving it half open
+    assert breaker.allow() is None
+    clock[0] += 30
+    assert breaker.allow() is not None
+
+
+def test_only_the_trial_ends_the_trial(clock):
+    breaker = CircuitBreaker(failure_threshold=1, reset_timeout=30)
+    # sent before the breaker opened, answered after
+    late = breaker.allow()
+    fail(breaker, 1)
+    clock[0] += 30
+    trial = breaker.allow()
+    assert trial is not None
+    breaker.record(late, False)
+    clock[0] += 30
+    # the trial is still pending
+    assert breaker.allow() is None
+    breaker.record(trial, True)
+    assert breaker.allow() is not None
+
+
+def test_throttled_requests_are_retried_without_opening_the_breaker(clock, monkeypatch):
+    attempts = []
+
+    def perform_request(self, method, url, params=None, body=None, **kwargs):
+        attempts.append(url)
+        if len(attempts) <= 3:
+            raise TransportError(429, "too_many_requests")
+        return {"ok": True}
+
+    monkeypatch.setattr(Transport, "perform_request", perform_request)
+    monkeypatch.setattr(opensearch_transport.time, "sleep", lambda seconds: None)
+    breaker = CircuitBreaker(failure_threshold=1, reset_timeout=30)
+    transport = ResilientTransport(
+        [{"host": "localhost"}], retries=3, circuit_breaker=breaker
+    )
+    assert transport.perform_request("GET", "/index/_search") == {"ok": True}
+    assert len(attempts) == 4
+    assert breaker.allow() is not None
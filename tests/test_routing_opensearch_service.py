@@ -0,0 +1,100 @@
+import numpy as np
+
+from core.service.routing_opensearch_service import RoutingOpensearchService
+from core.usecase.vectorizer import (
+    CURSOR_FILTER,
+    CURSOR_SORT,
+    build_opensearch_knn_query,
+)
+from core.utils.logger import logger
+
+
+class FakeRemote:
+    def __init__(self, hits: list):
+        self.hits = hits
+        self.scans = 0
+        self.searches = []
+
+    def search(self, query):
+        self.searches.append(query)
+        return []
+
+    def scan(self, query):
+        self.scans += 1
+        twin_id = query["query"]["bool"]["filter"][0]["term"][
+            "metadata.twin_id.keyword"
+        ]
+        return iter(
+            [
+                hit
+                for hit in self.hits
+                if hit["_source"]["metadata"]["twin_id"] == twin_id
+            ]
+        )
+
+
+class FakeLocal:
+    def __init__(self, path: str):
+        self.path = path
+        self.docs = {}
+        self.searches = []
+
+    def search(self, query):
+        self.searches.append(query)
+        return []
+
+    def count(self, twin_id):
+        return sum(doc["metadata"]["twin_id"] == twin_id for doc in self.docs.values())
+
+    def bulk_index(self, documents):
+        for document in documents:
+            self.docs.setdefault(document["_id"], document)
+        return len(documents)
+
+
+HITS = [
+    {"_id": "1", "_source": {"metadata": {"twin_id": "a"}}},
+    {"_id": "2", "_source": {"metadata": {"twin_id": "b"}}},
+]
+
+
+def make_service(remote, path, twin_ids, max_age) -> RoutingOpensearchService:
+    return RoutingOpensearchService(
+        remote, FakeLocal(str(path)), twin_ids, logger, sync_max_age=max_age
+    )
+
+
+def test_sync_copies_the_documents_of_hot_twins(tmp_path):
+    service = make_service(FakeRemote(HITS), tmp_path, ["a"], 0)
+    service.sync()
+    assert list(service.local.docs) == ["1"]
+
+
+def test_recently_synced_twins_are_skipped(tmp_path):
+    remote = FakeRemote(HITS)
+    make_service(remote, tmp_path, ["a"], 3600).sync()
+    assert remote.scans == 1
+    # another process of the host, with one more hot twin
+    make_service(remote, tmp_path, ["a", "b"], 3600).sync()
+    assert remote.scans == 2
+    make_service(remote, tmp_path, ["a", "b"], 0).sync()
+    assert remote.scans == 4
+
+
+def test_every_page_of_a_hot_twin_is_searched_locally(tmp_path):
+    service = make_service(FakeRemote(HITS), tmp_path, ["a"], 0)
+    query = build_opensearch_knn_query(
+        np.array([1.0, 0.0]),
+        "embedding",
+        20,
+        filters=[{"term": {"metadata.twin_id.keyword": "a"}}, CURSOR_FILTER],
+    )
+    query["sort"] = CURSOR_SORT
+    query["search_after"] = [0.9, "doc"]
+    service.search(query)
+    assert service.local.searches == [query]
+    query["query"]["knn"]["embedding"]["filter"]["bool"]["filter"][0]["term"][
+        "metadata.twin_id.keyword"
+    ] = "b"
+    service.search(query)
+    assert service.remote.searches == [query]
@@ -0,0 +1,93 @@
+import pytest
+
+from core.controller.search_params import parse_search_batch, parse_search_request
+from core.usecase.vectorizer import encode_cursor
+
+
+def test_defaults():
+    query, params = parse_search_request({"q": "kudos"})
+    assert query == "kudos"
+    assert params == {
+        "k": 10,
+        "mode": None,
+        "filters": {},
+        "hybrid": None,
+        "fields": None,
+        "cursor": None,
+    }
+
+
+def test_accepts_a_full_request():
+    cursor = encode_cursor(0.5, "doc", 10)
+    request = {
+        "q": "kudos",
+        "k": 5,
+        "mode": "hybrid",
+        "filters": {
+            "twin_id": ["a", "b"],
+            "source_name": "slack",
+            "created_at": {"gte": "2023-01-01"},
+        },
+        "hybrid": {"lexical_k": 20, "vector_weight": 0.5, "fusion": "blend"},
+        "fields": ["raw_text", "user_name"],
+        "cursor": cursor,
+    }
+    _, params = parse_search_request(request)
+    assert params["filters"] == request["filters"]
+    assert params["cursor"] == cursor
+
+
+@pytest.mark.parametrize(
+    "request_body, message",
+    [
+        ({}, '"q" is required'),
+        ({"q": "  "}, '"q" is required'),
+        ({"q": "x", "k": 0}, '"k" must be'),
+        ({"q": "x", "k": True}, '"k" must be'),
+        ({"q": "x", "mode": "fuzzy"}, '"mode" must be'),
+        ({"q": "x", "filters": ["twin_id"]}, '"filters" must be'),
+        ({"q": "x", "filters": {"twin_id": 1}}, 'filter "twin_id"'),
+        ({"q": "x", "filters": {"twin_id": []}}, 'filter "twin_id"'),
+        ({"q": "x", "filters": {"created_at": {"after": "x"}}}, 'filter "created_at"'),
+        ({"q": "x", "filters": {"color": "red"}}, 'unsupported filter "color"'),
+        ({"q": "x", "mode": "knn", "hybrid": {}}, 'requires mode "hybrid"'),
+        ({"q": "x", "hybrid": []}, '"hybrid" must be'),
+        ({"q": "x", "hybrid": {"lexical_k": -1}}, 'hybrid "lexical_k"'),
+        ({"q": "x", "hybrid": {"vector_weight": "1"}}, 'hybrid "vector_weight"'),
+        ({"q": "x", "hybrid": {"fusion": "max"}}, 'hybrid "fusion"'),
+        ({"q": "x", "hybrid": {"boost": 1}}, 'unsupported hybrid param "boost"'),
+        ({"q": "x", "fields": []}, '"fields" must be'),
+        ({"q": "x", "fields": ["embedding"]}, '"fields" must be'),
+        ({"q": "x", "cursor": 1}, '"cursor" must be'),
+        ({"q": "x", "cursor": "not a cursor"}, "Invalid cursor"),
+    ],
+)
+def test_rejects_invalid_params(request_body, message):
+    with pytest.raises(ValueError, match=message):
+        parse_search_request(request_body)
+
+
+def test_batch():
+    searches = parse_search_batch({"queries": [{"q": "a"}, {"q": "b", "k": 3}]}, 10)
+    assert [(search["q"], search["k"]) for search in searches] == [("a", 10), ("b", 3)]
+
+
+@pytest.mark.parametrize(
+    "request_body, message",
+    [
+        ({}, '"queries" must be'),
+        ({"queries": []}, '"queries" must be'),
+        ({"queries": [{"q": "a"}] * 3}, "at most 2 queries"),
+        ({"queries": [{"q": "a"}, "b"]}, r"queries\[1\]: must be an object"),
+        ({"queries": [{"q": "a"}, {"q": "b", "k": -1}]}, r'queries\[1\]: param "k"'),
+    ],
+)
+def test_batch_rejects_invalid_requests(request_body, message):
+    with pytest.raises(ValueError, match=message):
+        parse_search_batch(request_body, 2)
+
+
+def test_hybrid_settings_imply_hybrid_mode():
+    _, params = parse_search_request({"q": "x", "hybrid": {"lexical_weight": 2}})
+    assert params["mode"] == "hybrid"
+    assert params["hybrid"] == {"lexical_weight": 2}
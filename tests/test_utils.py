@@ -0,0 +1,38 @@
+from core.utils.utils import batched, document_id
+
+MESSAGE = {"text": "hello", "user_id": "U1", "created_at": "2023-09-27T07:37:56Z"}
+
+
+def test_document_id_is_deterministic():
+    first = document_id("twin", "slack", "general", "file", dict(MESSAGE))
+    assert first == document_id("twin", "slack", "general", "file", dict(MESSAGE))
+    assert len(first) == 64
+
+
+def test_document_id_depends_on_scope_and_content():
+    base = document_id("twin", "slack", "general", "file", MESSAGE)
+    assert base != document_id("twin", "slack", "general", "other", MESSAGE)
+    assert base != document_id("twin", "slack", "random", "file", MESSAGE)
+    assert base != document_id(
+        "twin", "slack", "general", "file", {**MESSAGE, "text": "hello!"}
+    )
+
+
+def test_document_id_ignores_other_fields():
+    assert document_id("t", "s", "c", "f", MESSAGE) == document_id(
+        "t", "s", "c", "f", {**MESSAGE, "user_name": "someone"}
+    )
+
+
+def test_batched():
+    assert list(batched(iter(range(5)), 2)) == [[0, 1], [2, 3], [4]]
+    assert list(batched([], 3)) == []
+
+
+def test_document_id_accepts_null_and_numeric_values():
+    message = {"user_id": None, "created_at": 1700000000, "text": "hello"}
+    first = document_id("twin", "slack", None, "file", message)
+    assert first == document_id("twin", "slack", "", "file", {**message, "user_id": ""})
+    assert first != document_id(
+        "twin", "slack", None, "file", {**message, "created_at": 1700000001}
+    )
@@ -0,0 +1,65 @@
+from http import HTTPStatus
+
+import pytest
+from flask import Flask
+
+from core.controller.vector import VectorController
+from core.service.job_queue import InMemoryJobQueue
+from core.utils.logger import logger
+
+
+class FakeUsecase:
+    def __init__(self):
+        self.objects = []
+
+    def vectorize_and_index(self, bucket_name, object_key):
+        self.objects.append((bucket_name, object_key))
+        return "Indexed"
+
+    def vectorize_objects(self, payload, report_progress):
+        pass
+
+
+def record(bucket: str, key: str) -> dict:
+    return {"s3": {"bucket": {"name": bucket}, "object": {"key": key}}}
+
+
+MALFORMED_RECORDS = [{}, {"s3": {"bucket": {"name": "bucket"}}}, {"s3": None}]
+
+
+@pytest.fixture
+def controller():
+    with Flask(__name__).app_context():
+        usecase = FakeUsecase()
+        yield VectorController(
+            usecase,
+            logger,
+            job_queue=InMemoryJobQueue(usecase.vectorize_objects, logger),
+        )
+
+
+def test_malformed_records_are_reported_per_record(controller):
+    records = [record("bucket", "a/b/c/d"), *MALFORMED_RECORDS]
+    response, status = controller.vectoring({"Records": records})
+    assert status == HTTPStatus.MULTI_STATUS
+    results = response.get_json()["results"]
+    assert results[0] == {"bucket": "bucket", "key": "a/b/c/d", "status": "succeeded"}
+    for result in results[1:]:
+        assert result["status"] == "failed"
+        assert "Malformed S3 event record" in result["error"]
+    assert controller.usecase.objects == [("bucket", "a/b/c/d")]
+
+
+def test_malformed_records_are_left_out_of_jobs(controller):
+    records = [record("bucket", "a/b/c/d"), *MALFORMED_RECORDS]
+    response, status = controller.vectoring({"Records": records}, asynchronous=True)
+    assert status == HTTPStatus.ACCEPTED
+    body = response.get_json()
+    assert [rejected["record"] for rejected in body["rejected"]] == [1, 2, 3]
+    assert controller.job_queue.get(body["job_id"])["progress"]["total"] == 1
+
+    response, status = controller.vectoring(
+        {"Records": MALFORMED_RECORDS}, asynchronous=True
+    )
+    assert status == HTTPStatus.BAD_REQUEST
+    assert len(response.get_json()["rejected"]) == 3
@@ -0,0 +1,276 @@
+import base64
+import json
+
+import pytest
+
+from core.service.search_cache import InMemorySearchCache
+from core.usecase.vectorizer import (
+    VectorizerUsecase,
+    decode_cursor,
+    encode_cursor,
+    fuse_hits,
+    hit_doc_id,
+    page_hits,
+)
+from core.utils.logger import logger
+
+
+def hit(doc_id: str, score: float, metadata: bool = True) -> dict:
+    if not metadata:
+        return {"_id": f"node-{doc_id}", "_score": score, "_source": {}}
+    return {
+        "_id": f"node-{doc_id}",
+        "_score": score,
+        "_source": {"metadata": {"doc_id": doc_id}},
+        "sort": [score, doc_id],
+    }
+
+
+def test_cursor_round_trip():
+    cursor = encode_cursor(0.875, "abc", 20)
+    assert decode_cursor(cursor) == {"score": 0.875, "doc_id": "abc", "depth": 20}
+    # URL safe, no padding issue when passed back as is
+    assert set(cursor) <= set(
+        "ABCDEFGHIJKLMNOPQRSTUVWXYZabcdefghijklmnopqrstuvwxyz0123456789-_="
+    )
+
+
+@pytest.mark.parametrize(
+    "payload",
+    [
+        {"score": "1", "doc_id": "a", "depth": 1},
+        {"score": 1, "doc_id": 2, "depth": 1},
+        {"score": 1, "doc_id": "a", "depth": -1},
+        {"score": 1, "doc_id": "a", "depth": 1.5},
+        {"score": 1, "doc_id": "a"},
+        [1, "a", 1],
+    ],
+)
+def test_decode_cursor_rejects_malformed_payloads(payload):
+    cursor = base64.urlsafe_b64encode(json.dumps(payload).encode()).decode()
+    with pytest.raises(ValueError, match="Invalid cursor"):
+        decode_cursor(cursor)
+
+
+@pytest.mark.parametrize("cursor", ["", "%%%", "é", "bm90IGpzb24="])
+def test_decode_cursor_rejects_garbage(cursor):
+    with pytest.raises(ValueError, match="Invalid cursor"):
+        decode_cursor(cursor)
+
+
+def test_hit_doc_id_falls_back_to_the_hit_id():
+    assert hit_doc_id(hit("a", 1)) == "a"
+    assert hit_doc_id(hit("a", 1, metadata=False)) == "node-a"
+
+
+def test_page_hits_walks_every_hit_once_in_rank_order():
+    hits = [hit(f"d{i:02d}", score) for i, score in enumerate([3, 1, 2, 2, 2, 1, 3])]
+    ranking = sorted(hits, key=lambda h: (-h["_score"], hit_doc_id(h)))
+    seen = []
+    cursor = None
+    while True:
+        page = page_hits(hits, cursor, 3)
+        seen.extend(page)
+        if len(page) < 3:
+            break
+        last = page[-1]
+        cursor = decode_cursor(
+            encode_cursor(last["_score"], hit_doc_id(last), len(seen))
+        )
+    assert seen == ranking
+
+
+def test_page_hits_after_the_last_hit_is_empty():
+    hits = [hit("a", 2), hit("b", 1)]
+    assert page_hits(hits, {"score": 1, "doc_id": "b", "depth": 2}, 5) == []
+
+
+def test_rrf_fusion():
+    lexical = [hit("a", 12.0), hit("b", 8.0)]
+    vector = [hit("b", 0.9), hit("c", 0.8)]
+    fused = fuse_hits([lexical, vector], [1.0, 1.0], k=3, fusion="rrf", rrf_k=60)
+    assert [hit_doc_id(h) for h in fused] == ["b", "a", "c"]
+    assert fused[0]["_score"] == pytest.approx(1 / 62 + 1 / 61)
+    assert fused[1]["_score"] == pytest.approx(1 / 61)
+
+
+def test_rrf_weights():
+    lexical = [hit("a", 12.0)]
+    vector = [hit("b", 0.9)]
+    fused = fuse_hits([lexical, vector], [1.0, 2.0], k=2, fusion="rrf")
+    assert [hit_doc_id(h) for h in fused] == ["b", "a"]
+
+
+def test_blend_fusion_normalizes_each_leg():
+    lexical = [hit("a", 20.0), hit("b", 10.0), hit("c", 0.0)]
+    vector = [hit("c", 0.9), hit("a", 0.5), hit("b", 0.1)]
+    fused = fuse_hits([lexical, vector], [1.0, 1.0], k=3, fusion="blend")
+    scores = {hit_doc_id(h): h["_score"] for h in fused}
+    assert scores == pytest.approx({"a": 1.5, "b": 0.5, "c": 1.0})
+    assert [hit_doc_id(h) for h in fused] == ["a", "c", "b"]
+
+
+def test_blend_fusion_with_equal_scores():
+    fused = fuse_hits([[hit("a", 3.0), hit("b", 3.0)]], [0.5], k=2, fusion="blend")
+    assert [h["_score"] for h in fused] == [0.5, 0.5]
+
+
+def test_fusion_truncates_and_keeps_sources():
+    legs = [[hit(str(i), 10 - i) for i in range(10)]]
+    fused = fuse_hits(legs, [1.0], k=4)
+    assert len(fused) == 4
+    assert fused[0]["_source"] == {"metadata": {"doc_id": "0"}}
+
+
+def test_fusion_rejects_unknown_fusions():
+    with pytest.raises(ValueError):
+        fuse_hits([[]], [1.0], fusion="max")
+
+
+class FakeLlamaIndexService:
+    def vectorize_string(self, text):
+        return [1.0, 0.0, 0.0]
+
+    def vectorize_strings(self, texts):
+        return [self.vectorize_string(text) for text in texts]
+
+
+class FakeOpensearchService:
+    def __init__(self, hits: list):
+        self.hits = hits
+        self.queries = []
+
+    def search(self, query):
+        self.queries.append(query)
+        return self.hits
+
+    def msearch(self, queries):
+        self.queries.extend(queries)
+        return [self.hits for _ in queries]
+
+    def scan(self, query):
+        self.queries.append(query)
+        return iter(self.hits)
+
+
+def make_usecase(hits: list) -> VectorizerUsecase:
+    return VectorizerUsecase(
+        None,
+        FakeLlamaIndexService(),
+        FakeOpensearchService(hits),
+        logger,
+        search_cache=InMemorySearchCache(logger),
+    )
+
+
+def test_search_steps_skip_cached_searches():
+    usecase = make_usecase([hit("a", 0.9), hit("b", 0.8)])
+    searches = [{"q": "first", "k": 2}, {"q": "second", "k": 2, "mode": "hybrid"}]
+    plan = usecase.plan_searches(searches)
+    assert plan.pending == [0, 1]
+    assert plan.texts == ["first", "second"]
+    queries = usecase.search_queries(
+        plan, usecase.llama_index_service.vectorize_strings(plan.texts)
+    )
+    # the hybrid search has a knn and a lexical leg
+    assert len(queries) == 3
+    pages = usecase.finish_searches(plan, usecase.opensearch_service.msearch(queries))
+    assert [len(page["results"]) for page in pages] == [2, 2]
+
+    cached = usecase.plan_searches(searches)
+    assert cached.pending == []
+    assert cached.pages == pages
+    assert usecase.search_batch(searches) == pages
+    assert len(usecase.opensearch_service.queries) == 3
+
+
+# hits of a knn query sorted by CURSOR_SORT without track_scores, as returned by OpenSearch
+RECORDED_HITS = [
+    {
+        "_index": "clone-ingestion-messages",
+        "_id": "node-a",
+        "_score": None,
+        "_source": {"metadata": {"raw_text": "first", "doc_id": "a"}},
+        "sort": [0.9132, "a"],
+    },
+    {
+        "_index": "clone-ingestion-messages",
+        "_id": "node-b",
+        "_score": None,
+        "_source": {"metadata": {"raw_text": "second", "doc_id": "b"}},
+        "sort": [0.8741, "b"],
+    },
+]
+
+
+def test_next_page_starts_after_the_sort_values_of_the_last_hit():
+    usecase = make_usecase(RECORDED_HITS)
+    page = usecase.search_page("salesforce integration", k=2)
+    assert page["results"] == [
+        {"raw_text": "first", "source_name": None, "file_uuid": None},
+        {"raw_text": "second", "source_name": None, "file_uuid": None},
+    ]
+    assert decode_cursor(page["next_cursor"]) == {
+        "score": 0.8741,
+        "doc_id": "b",
+        "depth": 2,
+    }
+
+    usecase.search_page("salesforce integration", k=2, cursor=page["next_cursor"])
+    first, second = usecase.opensearch_service.queries
+    for query in (first, second):
+        assert query["track_scores"] is True
+        filters = query["query"]["knn"]["embedding"]["filter"]["bool"]["filter"]
+        assert {"exists": {"field": "metadata.doc_id"}} in filters
+    assert "search_after" not in first
+    assert second["search_after"] == [0.8741, "b"]
+
+
+class FakeS3Service:
+    def __init__(self, etag: str):
+        self.etag = etag
+        self.if_match = []
+
+    def get_etag(self, bucket_name, object_key):
+        return self.etag
+
+    def get_object(self, bucket_name, object_key, if_match=None):
+        self.if_match.append(if_match)
+        return [{"text": "hello", "user_id": "u", "created_at": "2023-01-01"}]
+
+
+class FakeManifestStore:
+    def __init__(self):
+        self.manifests = {}
+
+    def get(self, key):
+        return self.manifests.get(key)
+
+    def put(self, key, manifest):
+        self.manifests[key] = manifest
+
+
+class FakeIndexingService:
+    def vector_store_index(self, twin_id, source_name, channel, file_uuid, messages):
+        return f"Indexed {len(list(messages))}"
+
+
+def test_delta_ingestion_downloads_the_version_it_records():
+    s3_service = FakeS3Service('"v1"')
+    manifest_store = FakeManifestStore()
+    usecase = VectorizerUsecase(
+        s3_service,
+        FakeIndexingService(),
+        FakeOpensearchService([]),
+        logger,
+        manifest_store=manifest_store,
+    )
+    usecase.vectorize_and_index("bucket", "twin/slack/general/file")
+    # the GET is conditional on the ETag saved in the manifest
+    assert s3_service.if_match == ['"v1"']
+    assert manifest_store.get("bucket/twin/slack/general/file")["etag"] == '"v1"'
+
+    assert usecase.vectorize_and_index("bucket", "twin/slack/general/file").startswith(
+        "Skipped"
+    )
+    assert len(s3_service.if_match) == 1